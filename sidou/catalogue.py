@@ -0,0 +1,200 @@
+"""Process-wide cache of the product catalogue.
+
+Every view reads products from `product_catalogue` instead of fetching the
+whole Products table for itself. The cache is loaded once, on the database
+thread pool, then kept current row by row: product, sale and purchase
+events (see events.py) re-read only the products they touched. A full
+reload only happens when Products changed without an event, e.g. from
+another process.
+"""
+
+import threading
+
+from database.database import (
+    DataVersionTracker,
+    get_all_categories,
+    get_all_products,
+    get_product_by_name,
+    get_products_by_ids,
+    normalize_search_key,
+)
+from events import (
+    event_bus,
+    product_ids_of,
+    ProductChanged,
+    PurchaseRecorded,
+    SaleRecorded,
+)
+
+
+def _index(by_id, by_name, by_category, product):
+    by_id[product["id"]] = product
+    by_name[product["name"]] = product
+    by_category.setdefault(product["category"] or "", {})[product["id"]] = product
+
+
+def _sort_key(product):
+    # Same order as get_all_products(): ORDER BY name_key, id
+    return (normalize_search_key(product["name"]), product["id"])
+
+
+class ProductCatalogue:
+    """Products indexed by id, name and category, with O(1) lookups.
+
+    Rows are the sqlite3.Row objects returned by get_all_products(). The
+    catalogue is safe to use from the GUI thread and from loader threads.
+    Full reads (reload(), refresh_if_changed(), current_products()) belong
+    on the database thread pool. They build the new indexes without holding
+    the lock the lookups take, so a lookup never waits for one; until the
+    first load finishes, get(), get_many(), get_by_name() and categories()
+    read just what they need from the database instead.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()  # Guards the indexes, never held during a full read
+        self._reload_lock = threading.Lock()  # One full reload at a time
+        self._tracker = DataVersionTracker("Products")
+        self._by_id = None
+        self._by_name = {}
+        self._by_category = {}
+        self._sorted = None
+        self._refreshed_during_reload = None
+
+    def reload(self):
+        """Re-reads the whole Products table."""
+        with self._reload_lock:
+            with self._lock:
+                self._refreshed_during_reload = set()
+            self._tracker.has_changed()  # Baseline taken before the read
+            by_id, by_name, by_category = {}, {}, {}
+            for product in get_all_products():
+                _index(by_id, by_name, by_category, product)
+            with self._lock:
+                self._by_id = by_id
+                self._by_name = by_name
+                self._by_category = by_category
+                self._sorted = None
+                # Rows an event refreshed while the table was being read may
+                # be older in the read than in the database.
+                refreshed, self._refreshed_during_reload = self._refreshed_during_reload, None
+                if refreshed:
+                    self._refresh_rows_locked(refreshed)
+
+    def refresh_if_changed(self):
+        """Reloads if Products changed without an event (e.g. another process)."""
+        if self._by_id is None or self._tracker.has_changed():
+            self.reload()
+
+    def refresh_rows(self, product_ids):
+        """Re-reads only the given products; deleted ones are dropped."""
+        product_ids = list(product_ids)
+        if not product_ids:
+            return
+        with self._lock:
+            # The write being applied is this thread's last commit (events
+            # are published right after it): take it off what the tracker
+            # will report, without hiding changes made by anything else.
+            self._tracker.absorb_last_commit()
+            if self._refreshed_during_reload is not None:
+                self._refreshed_during_reload.update(product_ids)
+            if self._by_id is None:
+                return  # Not loaded yet: the first load reads everything
+            self._refresh_rows_locked(product_ids)
+
+    def _refresh_rows_locked(self, product_ids):
+        products = {product["id"]: product for product in get_products_by_ids(product_ids)}
+        for product_id in product_ids:
+            self._remove(product_id)
+            if product_id in products:
+                self._add(products[product_id])
+
+    def _add(self, product):
+        _index(self._by_id, self._by_name, self._by_category, product)
+        self._sorted = None
+
+    def _remove(self, product_id):
+        product = self._by_id.pop(product_id, None)
+        if product is None:
+            return
+        if self._by_name.get(product["name"]) is product:
+            del self._by_name[product["name"]]
+        category = product["category"] or ""
+        members = self._by_category.get(category)
+        if members is not None:
+            members.pop(product_id, None)
+            if not members:
+                del self._by_category[category]
+        self._sorted = None
+
+    def get(self, product_id):
+        """Returns the product with this id, or None."""
+        with self._lock:
+            if self._by_id is not None:
+                return self._by_id.get(product_id)
+        products = get_products_by_ids([product_id])
+        return products[0] if products else None
+
+    def get_many(self, product_ids):
+        """Returns the known products among `product_ids`, in the given order."""
+        with self._lock:
+            if self._by_id is not None:
+                return [self._by_id[i] for i in product_ids if i in self._by_id]
+        products = {product["id"]: product for product in get_products_by_ids(product_ids)}
+        return [products[i] for i in product_ids if i in products]
+
+    def get_by_name(self, name):
+        """Returns the product with exactly this name, or None."""
+        with self._lock:
+            if self._by_id is not None:
+                return self._by_name.get(name)
+        return get_product_by_name(name)
+
+    def categories(self):
+        """Returns the non-empty categories, sorted like get_all_categories()."""
+        with self._lock:
+            if self._by_id is not None:
+                return sorted(category for category in self._by_category if category)
+        return get_all_categories()
+
+    def in_category(self, category):
+        """Returns the products of a category, loading the catalogue if needed."""
+        if self._by_id is None:
+            self.reload()
+        with self._lock:
+            return list(self._by_category.get(category or "", {}).values())
+
+    def all_products(self):
+        """Returns every product, ordered like get_all_products(), loading if needed."""
+        if self._by_id is None:
+            self.reload()
+        with self._lock:
+            if self._sorted is None:
+                self._sorted = sorted(self._by_id.values(), key=_sort_key)
+            return list(self._sorted)
+
+    def current_products(self):
+        """all_products(), reloading first if Products changed without an event.
+
+        Reads the database when needed: meant to run on the database pool.
+        """
+        self.refresh_if_changed()
+        return self.all_products()
+
+    def current_categories(self):
+        """categories(), reloading first if Products changed without an event.
+
+        Reads the database when needed: meant to run on the database pool.
+        """
+        self.refresh_if_changed()
+        return self.categories()
+
+    def on_event(self, event):
+        self.refresh_rows(product_ids_of(event))
+
+
+product_catalogue = ProductCatalogue()
+
+# Subscribed at import, before any view: handlers run in subscription order,
+# so views reacting to the same event already see the refreshed rows.
+for _event_type in (ProductChanged, PurchaseRecorded, SaleRecorded):
+    event_bus.subscribe(_event_type, product_catalogue.on_event)
@@ -0,0 +1,344 @@
+"""Streaming CSV import of products, customers and purchases.
+
+Rows are read one at a time, validated, and written `chunk_size` per
+transaction, so memory stays bounded whatever the size of the file. Rows
+that fail validation or hit a constraint are copied to a reject file
+with their line number and the reason.
+
+Command line (from the sidou directory):
+
+    python -m database.csv_import products products.csv --rejects rejects.csv
+
+Expected columns (header row required, unknown columns are ignored; a row
+with more fields than the header is rejected):
+    products:  name, purchase_price, selling_price
+               [description, category, quantity_in_stock, barcodes]
+    customers: name [address, phone, email]
+    purchases: product_id | product_name | barcode, quantity, cost_per_unit
+               [purchase_date, supplier]
+
+Products are matched on their name and customers on their phone or email,
+or on their name when the row has neither: existing ones are updated, the
+others added. A product's quantity_in_stock only applies when it is
+created; stock then moves through purchases and sales. Barcodes within
+the cell are separated by "," (as in the product form) or "|".
+"""
+
+import csv
+import datetime
+import os
+import re
+import sqlite3
+from itertools import islice
+
+from database.database import (
+    add_purchases_chunk,
+    initialize_database,
+    normalize_search_key,
+    replace_product_barcodes,
+    set_database_profile,
+    transaction,
+)
+
+
+class RejectedRow(ValueError):
+    """A row that cannot be imported; the message says why."""
+
+
+def read_csv_rows(path, progress_file=None):
+    """Yields (line number, row dict) for each data row of a CSV file.
+
+    The file may start with a UTF-8 BOM (Excel) and use "," or ";" as
+    separator. When `progress_file` is a list, the open binary file is
+    stored in it so the caller can read its position.
+    """
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        if progress_file is not None:
+            progress_file.append(f.buffer)
+        sample = f.readline()
+        delimiter = ";" if sample.count(";") > sample.count(",") else ","
+        f.seek(0)
+        reader = csv.DictReader(f, delimiter=delimiter)
+        reader.fieldnames = [name.strip().lower() for name in reader.fieldnames or []]
+        for row in reader:
+            yield reader.line_num, row
+
+
+def _check_field_count(row):
+    # csv.DictReader stores the fields beyond the header under the None key
+    extra = row.get(None)
+    if extra:
+        raise RejectedRow(f"{len(extra)} more field(s) than the header: {extra!r}")
+
+
+def _text(row, column, required=False):
+    value = (row.get(column) or "").strip()
+    if required and not value:
+        raise RejectedRow(f"{column} is required")
+    return value or None
+
+
+def _number(row, column, required=False, default=None, minimum=None, integer=False):
+    value = _text(row, column, required)
+    if value is None:
+        return default
+    try:
+        number = int(value) if integer else float(value.replace(",", ".").replace(" ", ""))
+    except ValueError:
+        raise RejectedRow(f"{column} is not a {'whole ' if integer else ''}number: {value!r}")
+    if minimum is not None and number < minimum:
+        raise RejectedRow(f"{column} must be at least {minimum}: {value!r}")
+    return number
+
+
+def _date(row, column):
+    value = _text(row, column)
+    if value is None:
+        return None
+    for date_format in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d"):
+        try:
+            return datetime.datetime.strptime(value, date_format).strftime("%Y-%m-%d %H:%M:%S")
+        except ValueError:
+            pass
+    raise RejectedRow(f"{column} is not a YYYY-MM-DD[ HH:MM:SS] date: {value!r}")
+
+
+def _write_product(conn, row):
+    name = _text(row, "name", required=True)
+    purchase_price = _number(row, "purchase_price", required=True, minimum=0)
+    selling_price = _number(row, "selling_price", required=True, minimum=0)
+    initial_stock = _number(row, "quantity_in_stock", default=0, minimum=0, integer=True)
+    barcodes = _text(row, "barcodes")
+    product_id = conn.execute(
+        """INSERT INTO Products (name, name_key, description, category, purchase_price, selling_price, quantity_in_stock)
+           VALUES (?, ?, ?, ?, ?, ?, ?)
+           ON CONFLICT (name) DO UPDATE SET
+               description = excluded.description,
+               category = excluded.category,
+               purchase_price = excluded.purchase_price,
+               selling_price = excluded.selling_price
+           RETURNING id""",
+        (
+            name,
+            normalize_search_key(name),
+            _text(row, "description"),
+            _text(row, "category"),
+            purchase_price,
+            selling_price,
+            initial_stock,
+        ),
+    ).fetchone()[0]
+    if barcodes:
+        replace_product_barcodes(conn, product_id, re.split(r"[,|]", barcodes))
+
+
+def _write_customer(conn, row):
+    email = _text(row, "email")
+    if email is not None and "@" not in email:
+        raise RejectedRow(f"email is not valid: {email!r}")
+    name = _text(row, "name", required=True)
+    name_key = normalize_search_key(name)
+    address = _text(row, "address")
+    phone = _text(row, "phone")
+    if phone is None and email is None:
+        # Nothing unique to match on: the name decides, if it is unambiguous
+        matches = conn.execute(
+            "SELECT id FROM Customers WHERE name_key = ? LIMIT 2", (name_key,)
+        ).fetchall()
+        if len(matches) > 1:
+            raise RejectedRow(f"several customers are named {name!r}: add a phone or email")
+        if matches:
+            conn.execute(
+                "UPDATE Customers SET name = ?, name_key = ?, address = ? WHERE id = ?",
+                (name, name_key, address, matches[0][0]),
+            )
+            return
+    conn.execute(
+        """INSERT INTO Customers (name, name_key, address, phone, email)
+           VALUES (?, ?, ?, ?, ?)
+           ON CONFLICT (phone) DO UPDATE SET
+               name = excluded.name, name_key = excluded.name_key,
+               address = excluded.address, email = excluded.email
+           ON CONFLICT (email) DO UPDATE SET
+               name = excluded.name, name_key = excluded.name_key,
+               address = excluded.address, phone = excluded.phone""",
+        (name, name_key, address, phone, email),
+    )
+
+
+def _resolve_product_id(conn, row):
+    product_id = _number(row, "product_id", integer=True)
+    if product_id is not None:
+        return product_id
+    name = _text(row, "product_name")
+    if name is not None:
+        found = conn.execute("SELECT id FROM Products WHERE name = ?", (name,)).fetchone()
+        if found is None:
+            raise RejectedRow(f"unknown product: {name!r}")
+        return found[0]
+    barcode = _text(row, "barcode")
+    if barcode is not None:
+        found = conn.execute(
+            "SELECT product_id FROM ProductBarcodes WHERE barcode = ?", (barcode,)
+        ).fetchone()
+        if found is None:
+            raise RejectedRow(f"unknown barcode: {barcode!r}")
+        return found[0]
+    raise RejectedRow("product_id, product_name or barcode is required")
+
+
+def _import_products_chunk(conn, rows, reject):
+    return _write_each(conn, rows, _write_product, reject)
+
+
+def _import_customers_chunk(conn, rows, reject):
+    return _write_each(conn, rows, _write_customer, reject)
+
+
+def _import_purchases_chunk(conn, rows, reject):
+    purchases = []
+    lines = []
+    for line, row in rows:
+        try:
+            _check_field_count(row)
+            purchases.append(
+                {
+                    "product_id": _resolve_product_id(conn, row),
+                    "quantity": _number(row, "quantity", required=True, minimum=1, integer=True),
+                    "cost_per_unit": _number(row, "cost_per_unit", required=True, minimum=0),
+                    "purchase_date": _date(row, "purchase_date"),
+                    "supplier": _text(row, "supplier"),
+                }
+            )
+            lines.append((line, row))
+        except RejectedRow as e:
+            reject(line, row, str(e))
+    default_date = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    _purchase_ids, failures = add_purchases_chunk(
+        conn, purchases, default_date, set_based_stock=True
+    )
+    for position, error in failures:
+        reject(*lines[position], error)
+    return len(purchases) - len(failures)
+
+
+def _write_each(conn, rows, write, reject):
+    imported = 0
+    for line, row in rows:
+        try:
+            _check_field_count(row)
+            with transaction():  # Savepoint: a failing row undoes only itself
+                write(conn, row)
+        except (RejectedRow, sqlite3.Error) as e:
+            reject(line, row, str(e))
+            continue
+        imported += 1
+    return imported
+
+
+IMPORTERS = {
+    "products": _import_products_chunk,
+    "customers": _import_customers_chunk,
+    "purchases": _import_purchases_chunk,
+}
+
+
+class _RejectFile:
+    """Reject CSV, created on the first rejected row.
+
+    Each rejected row keeps its fields in the input's order, including the
+    ones beyond the header.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+        self._writer = None
+        self.count = 0
+
+    def __call__(self, line, row, error):
+        self.count += 1
+        if self.path is None:
+            print(f"Line {line} rejected: {error}")
+            return
+        if self._writer is None:
+            self._file = open(self.path, "w", encoding="utf-8", newline="")
+            self._writer = csv.writer(self._file)
+            self._fieldnames = [name for name in row if name is not None]
+            self._writer.writerow(["line", "error"] + self._fieldnames)
+        self._writer.writerow(
+            [line, error] + [row.get(name) for name in self._fieldnames] + (row.get(None) or [])
+        )
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+
+def import_csv(kind, path, rejects_path=None, chunk_size=1000, progress=None):
+    """Imports a CSV file of `kind` ("products", "customers" or "purchases").
+
+    `progress(rows_read, bytes_read, total_bytes)` is called after each
+    chunk; it runs on the importing thread, so a Qt view should relay it
+    through a signal. Rejected rows go to `rejects_path` (printed when
+    None).
+
+    Returns a dict with the "read", "imported" and "rejected" row counts.
+    """
+    if kind not in IMPORTERS:
+        raise ValueError(f"Unknown import kind '{kind}'. Available: {', '.join(IMPORTERS)}")
+    import_chunk = IMPORTERS[kind]
+    total_bytes = os.path.getsize(path)
+    progress_file = []
+    rows = read_csv_rows(path, progress_file)
+    reject = _RejectFile(rejects_path)
+    read = imported = 0
+    try:
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+            with transaction() as conn:
+                imported += import_chunk(conn, chunk, reject)
+            read += len(chunk)
+            if progress is not None:
+                # The reader closes the file as soon as it runs out of rows.
+                source = progress_file[0]
+                progress(read, total_bytes if source.closed else source.tell(), total_bytes)
+    finally:
+        rows.close()
+        reject.close()
+
+    print(f"Import {kind} from {path}: {read} rows, {imported} imported, {reject.count} rejected.")
+    return {"read": read, "imported": imported, "rejected": reject.count}
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Streaming CSV import.")
+    parser.add_argument("kind", choices=sorted(IMPORTERS))
+    parser.add_argument("path", help="CSV file with a header row")
+    parser.add_argument("--rejects", help="CSV file receiving the rejected rows")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument(
+        "--profile",
+        default="bulk-import",
+        help="database PRAGMA profile (default: bulk-import)",
+    )
+    args = parser.parse_args()
+    if not os.path.isfile(args.path):
+        parser.error(f"no such file: {args.path}")
+
+    set_database_profile(args.profile)
+    initialize_database()
+
+    def print_progress(rows_read, bytes_read, total_bytes):
+        percent = 100 * bytes_read / total_bytes if total_bytes else 100
+        done = bytes_read >= total_bytes
+        print(f"\r{rows_read} rows ({percent:.0f}%)", end="\n" if done else "", flush=True)
+
+    result = import_csv(
+        args.kind, args.path, args.rejects, args.chunk_size, print_progress
+    )
+    raise SystemExit(1 if result["rejected"] else 0)
@@ -1,22 +1,328 @@
+import atexit
 import sqlite3
 import os
+import threading
+import unicodedata
+from contextlib import contextmanager, nullcontext
 
 DATABASE_NAME = "gestion_commerciale.db"
 DATABASE_PATH = os.path.join(os.path.dirname(__file__), "..", DATABASE_NAME)
 
+# Named PRAGMA profiles applied to every new connection. The active profile
+# is taken from the GESTION_DB_PROFILE environment variable and can be
+# changed at runtime with set_database_profile().
+#   pos-terminal: WAL so readers never block the cashier's writes, and
+#                 synchronous=NORMAL (one fsync per checkpoint, not per commit).
+#   reporting:    larger page cache and memory map for long read queries.
+#   bulk-import:  durability traded for speed while replaying large batches.
+DATABASE_PROFILES = {
+    "pos-terminal": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -16000,
+        "mmap_size": 64 * 1024 * 1024,
+        "temp_store": "MEMORY",
+        "busy_timeout": 5000,
+    },
+    "reporting": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -64000,
+        "mmap_size": 256 * 1024 * 1024,
+        "temp_store": "MEMORY",
+        "busy_timeout": 5000,
+    },
+    "bulk-import": {
+        "journal_mode": "WAL",
+        "synchronous": "OFF",
+        "cache_size": -200000,
+        "mmap_size": 256 * 1024 * 1024,
+        "temp_store": "MEMORY",
+        "busy_timeout": 30000,
+    },
+}
+DEFAULT_DATABASE_PROFILE = "pos-terminal"
+DATABASE_PROFILE = os.environ.get("GESTION_DB_PROFILE", DEFAULT_DATABASE_PROFILE)
+if DATABASE_PROFILE not in DATABASE_PROFILES:
+    print(
+        f"Warning: unknown database profile '{DATABASE_PROFILE}', "
+        f"using '{DEFAULT_DATABASE_PROFILE}'."
+    )
+    DATABASE_PROFILE = DEFAULT_DATABASE_PROFILE
+
+# One long-lived connection per thread. Every connection handed out is also
+# kept in _open_connections so close_all_connections() can shut them down
+# when the application exits. Bumping _generation invalidates the
+# connections cached in each thread's local storage.
+_local = threading.local()
+_open_connections = []
+_connections_lock = threading.Lock()
+_generation = 0
+# Outermost transactions committed by this process. Together with the
+# per-connection PRAGMA data_version (which only moves for commits made on
+# *other* connections) it tells cheaply whether anything was written.
+# Incremented from every database thread, hence the lock.
+_commit_count = 0
+_commit_count_lock = threading.Lock()
+
+
+def normalize_search_key(text):
+    """Folds text into its search/sort key: no accents, case-folded, single spaces.
+
+    "Crème Brûlée" and "creme  brulee" both give "creme brulee", and the keys
+    sort in French dictionary order (e/é/è/ê together).
+    """
+    if text is None:
+        return None
+    text = text.replace("œ", "oe").replace("Œ", "OE").replace("æ", "ae").replace("Æ", "AE")
+    decomposed = unicodedata.normalize("NFKD", text)
+    stripped = "".join(char for char in decomposed if not unicodedata.combining(char))
+    return " ".join(stripped.casefold().split())
 
-def get_db_connection():
-    """Establishes a connection to the SQLite database."""
-    conn = sqlite3.connect(DATABASE_PATH)
+
+def _configure_connection(conn):
+    """Applies the per-connection settings shared by every connection."""
     conn.row_factory = sqlite3.Row
+    # Used by refresh_missing_name_keys(); the write functions compute
+    # name_key in Python, so other writers need nothing.
+    conn.create_function(
+        "search_key", 1, normalize_search_key, deterministic=True
+    )
     conn.execute("PRAGMA foreign_keys = ON;")
+    for pragma, value in DATABASE_PROFILES[DATABASE_PROFILE].items():
+        conn.execute(f"PRAGMA {pragma} = {value};")
     return conn
 
 
-def initialize_database():
-    conn = get_db_connection()
-    cursor = conn.cursor()
+def set_database_profile(name):
+    """Selects the PRAGMA profile used by connections opened from now on.
+
+    Shared connections are closed so that every thread reopens its
+    connection with the new settings on its next call.
+    """
+    global DATABASE_PROFILE
+    if name not in DATABASE_PROFILES:
+        raise ValueError(
+            f"Unknown database profile '{name}'. "
+            f"Available profiles: {', '.join(DATABASE_PROFILES)}"
+        )
+    DATABASE_PROFILE = name
+    close_all_connections()
+
+
+def get_database_profile_report():
+    """Returns the active profile name and the PRAGMA values in effect."""
+    with managed_connection() as conn:
+        settings = {
+            pragma: conn.execute(f"PRAGMA {pragma};").fetchone()[0]
+            for pragma in DATABASE_PROFILES[DATABASE_PROFILE]
+        }
+    return DATABASE_PROFILE, settings
+
+
+def get_db_connection():
+    """Establishes a new, standalone connection to the SQLite database.
+
+    The caller owns the returned connection and must close it. Database
+    functions use the shared per-thread connection instead, see
+    managed_connection() and transaction().
+    """
+    conn = sqlite3.connect(DATABASE_PATH)
+    return _configure_connection(conn)
+
+
+def get_thread_connection():
+    """Returns the long-lived connection owned by the calling thread.
+
+    The connection runs in autocommit mode (isolation_level=None): writes
+    must go through transaction(), which issues BEGIN/COMMIT explicitly.
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is not None and getattr(_local, "generation", None) == _generation:
+        return conn
+
+    # check_same_thread is disabled only so close_all_connections() can close
+    # it from the main thread at shutdown; the connection is never shared.
+    conn = sqlite3.connect(
+        DATABASE_PATH, isolation_level=None, check_same_thread=False
+    )
+    _configure_connection(conn)
+    with _connections_lock:
+        _open_connections.append(conn)
+    _local.conn = conn
+    _local.generation = _generation
+    _local.depth = 0
+    _local.tables = {}
+    _local.last_commit = None
+    return conn
+
+
+def _has_table(conn, name):
+    """Tells whether a table exists, caching the answer per connection."""
+    tables = _local.tables
+    if name not in tables:
+        row = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)
+        ).fetchone()
+        tables[name] = row is not None
+    return tables[name]
+
+
+@contextmanager
+def managed_connection():
+    """Context manager yielding the calling thread's shared connection.
 
+    Used for reads. The connection stays open after the block; statements
+    run in autocommit mode unless an enclosing transaction() is active.
+    """
+    yield get_thread_connection()
+
+
+@contextmanager
+def transaction():
+    """Context manager running its block as one unit of work.
+
+    The outermost block issues BEGIN IMMEDIATE and commits on success or
+    rolls back on error. Nested blocks (e.g. add_sale() called inside a
+    caller's transaction()) reuse the same connection through a SAVEPOINT,
+    so a failing inner call only undoes its own changes and nothing is
+    committed before the outermost block finishes.
+    """
+    conn = get_thread_connection()
+    depth = _local.depth
+    savepoint = f"sp_{depth}"
+    conn.execute("BEGIN IMMEDIATE;" if depth == 0 else f"SAVEPOINT {savepoint};")
+    if depth == 0:
+        # The write lock is held from here: no other connection commits
+        # until COMMIT, so the counters read now and just before it bound
+        # exactly this transaction's changes.
+        versions_before = _read_all_table_versions(conn)
+    _local.depth = depth + 1
+    try:
+        yield conn
+    except BaseException:
+        # SQLite may already have rolled the whole transaction back (disk
+        # full, interrupted write): rolling back again would raise "no
+        # transaction is active" and hide the original error.
+        if conn.in_transaction:
+            if depth == 0:
+                conn.execute("ROLLBACK;")
+            else:
+                conn.execute(f"ROLLBACK TO {savepoint};")
+                conn.execute(f"RELEASE {savepoint};")
+        raise
+    else:
+        if depth == 0:
+            global _commit_count
+            versions_after = _read_all_table_versions(conn)
+            conn.execute("COMMIT;")
+            with _commit_count_lock:
+                _commit_count += 1
+            _local.last_commit = (versions_before, versions_after)
+        else:
+            conn.execute(f"RELEASE {savepoint};")
+    finally:
+        _local.depth = depth
+
+
+def _read_all_table_versions(conn):
+    """Returns {table: change counter}, or None before the DataVersions migration."""
+    try:
+        rows = conn.execute("SELECT table_name, version FROM DataVersions").fetchall()
+    except sqlite3.OperationalError:
+        return None
+    return {row["table_name"]: row["version"] for row in rows}
+
+
+def get_last_commit_versions():
+    """Returns the change counters around the calling thread's last commit.
+
+    The result is a (before, after) pair of {table: version} dicts, or None
+    if this thread has not committed a transaction yet.
+    """
+    last_commit = getattr(_local, "last_commit", None)
+    if last_commit is None or None in last_commit:
+        return None
+    return last_commit
+
+
+@contextmanager
+def _stock_triggers_suspended(conn):
+    """Turns the per-row stock triggers off for the block.
+
+    The flag is a row of StockTriggerSuspension, written inside the
+    caller's transaction and deleted before it commits: the transaction
+    holds the write lock, so no other connection ever sees it. The caller
+    must apply the stock changes itself, within the same transaction.
+    """
+    if not conn.in_transaction:
+        raise ValueError("stock triggers can only be suspended inside a transaction")
+    conn.execute("INSERT INTO StockTriggerSuspension (id) VALUES (1);")
+    try:
+        yield
+    finally:
+        conn.execute("DELETE FROM StockTriggerSuspension;")
+
+
+@contextmanager
+def read_snapshot():
+    """Context manager running several reads against one consistent snapshot.
+
+    Opens a deferred read transaction on the thread's connection, so every
+    query in the block (including ones made by other database functions)
+    sees the database as of the first read. Inside an existing transaction
+    the block simply joins it.
+    """
+    conn = get_thread_connection()
+    if _local.depth > 0:
+        yield conn
+        return
+    conn.execute("BEGIN;")
+    _local.depth = 1
+    try:
+        yield conn
+    except BaseException:
+        if conn.in_transaction:  # See transaction()
+            conn.execute("ROLLBACK;")
+        raise
+    else:
+        conn.execute("COMMIT;")
+    finally:
+        _local.depth = 0
+
+
+def close_thread_connection():
+    """Closes the calling thread's shared connection, if it has one."""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        return
+    with _connections_lock:
+        if conn in _open_connections:
+            _open_connections.remove(conn)
+    conn.close()
+    _local.conn = None
+
+
+def close_all_connections():
+    """Closes every shared connection. Called once when the app exits."""
+    global _generation
+    with _connections_lock:
+        connections = list(_open_connections)
+        _open_connections.clear()
+        _generation += 1
+    for conn in connections:
+        try:
+            conn.close()
+        except sqlite3.Error as e:
+            print(f"Error closing database connection: {e}")
+
+
+atexit.register(close_all_connections)
+
+
+def _migration_1_initial_schema(cursor):
+    # Uses IF NOT EXISTS so databases created before migrations existed
+    # (user_version 0 but tables present) are adopted as-is.
     cursor.execute(
         """
     CREATE TABLE IF NOT EXISTS Customers (
@@ -124,77 +430,602 @@ def initialize_database():
         "CREATE INDEX IF NOT EXISTS idx_sales_customer_id ON Sales(customer_id);"
     )
 
-    conn.commit()
-    conn.close()
-    print("Database initialized successfully.")
+
+def _migration_2_product_search_index(cursor):
+    # External-content FTS5 index over Products, kept in sync by triggers.
+    # The stock triggers only touch quantity_in_stock, so the UPDATE trigger
+    # is restricted to the indexed columns. Skipped when SQLite was built
+    # without FTS5; search_products() then matches name prefixes and LIKE.
+    try:
+        cursor.execute(
+            """
+        CREATE VIRTUAL TABLE IF NOT EXISTS ProductsFTS USING fts5(
+            name,
+            description,
+            category,
+            content='Products',
+            content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2',
+            prefix='1 2 3'
+        );
+        """
+        )
+    except sqlite3.OperationalError as e:
+        print(f"Warning: FTS5 unavailable, product search will use name prefixes and LIKE: {e}")
+        return
+
+    cursor.execute(
+        """
+    CREATE TRIGGER IF NOT EXISTS products_fts_insert
+    AFTER INSERT ON Products
+    BEGIN
+        INSERT INTO ProductsFTS (rowid, name, description, category)
+        VALUES (NEW.id, NEW.name, NEW.description, NEW.category);
+    END;
+    """
+    )
+
+    cursor.execute(
+        """
+    CREATE TRIGGER IF NOT EXISTS products_fts_delete
+    AFTER DELETE ON Products
+    BEGIN
+        INSERT INTO ProductsFTS (ProductsFTS, rowid, name, description, category)
+        VALUES ('delete', OLD.id, OLD.name, OLD.description, OLD.category);
+    END;
+    """
+    )
+
+    cursor.execute(
+        """
+    CREATE TRIGGER IF NOT EXISTS products_fts_update
+    AFTER UPDATE OF name, description, category ON Products
+    BEGIN
+        INSERT INTO ProductsFTS (ProductsFTS, rowid, name, description, category)
+        VALUES ('delete', OLD.id, OLD.name, OLD.description, OLD.category);
+        INSERT INTO ProductsFTS (rowid, name, description, category)
+        VALUES (NEW.id, NEW.name, NEW.description, NEW.category);
+    END;
+    """
+    )
+
+    cursor.execute("INSERT INTO ProductsFTS (ProductsFTS) VALUES ('rebuild');")
+
+
+def _migration_3_name_search_keys(cursor):
+    # name_key holds normalize_search_key(name) and the index serves both
+    # ORDER BY and accent-insensitive prefix lookups. The write functions
+    # set it themselves, so other writers (sqlite3 shell, repair scripts)
+    # need no application function; keys they leave NULL are filled in by
+    # refresh_missing_name_keys(), which also does the backfill here.
+    for table, prefix in (("Products", "product"), ("Customers", "customer")):
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN name_key TEXT;")
+        cursor.execute(
+            f"CREATE INDEX IF NOT EXISTS idx_{prefix}_name_key ON {table}(name_key);"
+        )
+    refresh_missing_name_keys(cursor.connection)
+
+
+def _migration_4_history_keyset_indexes(cursor):
+    # Serve the (date, id) keyset pagination of the history screens.
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_sales_date_id ON Sales(sale_date, id);"
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_purchases_date_id ON Purchases(purchase_date, id);"
+    )
+
+
+def _migration_5_customer_sales_date_index(cursor):
+    # get_sales_by_customer() filters on customer_id and orders by date;
+    # the composite index also serves the ON DELETE SET NULL lookups, so it
+    # replaces the single-column one.
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_sales_customer_date ON Sales(customer_id, sale_date);"
+    )
+    cursor.execute("DROP INDEX IF EXISTS idx_sales_customer_id;")
+
+
+def _migration_6_sales_daily_rollup(cursor):
+    # One row per day with the number and total of its sales, maintained
+    # incrementally by the Sales triggers below so dashboard totals never
+    # scan Sales. Monthly figures are derived by grouping these rows.
+    cursor.execute(
+        """
+    CREATE TABLE IF NOT EXISTS SalesDaily (
+        sale_day TEXT PRIMARY KEY,
+        sale_count INTEGER NOT NULL DEFAULT 0,
+        total_amount REAL NOT NULL DEFAULT 0
+    ) WITHOUT ROWID;
+    """
+    )
+
+    cursor.execute(
+        """
+    CREATE TRIGGER IF NOT EXISTS sales_daily_on_insert
+    AFTER INSERT ON Sales
+    BEGIN
+        INSERT INTO SalesDaily (sale_day, sale_count, total_amount)
+        VALUES (substr(NEW.sale_date, 1, 10), 1, NEW.total_amount)
+        ON CONFLICT (sale_day) DO UPDATE
+        SET sale_count = sale_count + 1,
+            total_amount = total_amount + excluded.total_amount;
+    END;
+    """
+    )
+
+    cursor.execute(
+        """
+    CREATE TRIGGER IF NOT EXISTS sales_daily_on_delete
+    AFTER DELETE ON Sales
+    BEGIN
+        UPDATE SalesDaily
+        SET sale_count = sale_count - 1,
+            total_amount = total_amount - OLD.total_amount
+        WHERE sale_day = substr(OLD.sale_date, 1, 10);
+        DELETE FROM SalesDaily
+        WHERE sale_day = substr(OLD.sale_date, 1, 10) AND sale_count <= 0;
+    END;
+    """
+    )
+
+    cursor.execute(
+        """
+    CREATE TRIGGER IF NOT EXISTS sales_daily_on_update
+    AFTER UPDATE OF sale_date, total_amount ON Sales
+    BEGIN
+        UPDATE SalesDaily
+        SET sale_count = sale_count - 1,
+            total_amount = total_amount - OLD.total_amount
+        WHERE sale_day = substr(OLD.sale_date, 1, 10);
+        DELETE FROM SalesDaily
+        WHERE sale_day = substr(OLD.sale_date, 1, 10) AND sale_count <= 0;
+        INSERT INTO SalesDaily (sale_day, sale_count, total_amount)
+        VALUES (substr(NEW.sale_date, 1, 10), 1, NEW.total_amount)
+        ON CONFLICT (sale_day) DO UPDATE
+        SET sale_count = sale_count + 1,
+            total_amount = total_amount + excluded.total_amount;
+    END;
+    """
+    )
+
+    _rebuild_sales_rollups(cursor)
+
+
+def _rebuild_sales_rollups(cursor):
+    cursor.execute("DELETE FROM SalesDaily;")
+    cursor.execute(
+        """
+    INSERT INTO SalesDaily (sale_day, sale_count, total_amount)
+    SELECT substr(sale_date, 1, 10), COUNT(*), SUM(total_amount)
+    FROM Sales
+    GROUP BY substr(sale_date, 1, 10);
+    """
+    )
+
+
+def _migration_7_product_sales_counters(cursor):
+    # Per-product sold quantity and revenue, lifetime (ProductSalesTotals)
+    # and per day (ProductSalesDaily), maintained by triggers so top-seller
+    # queries read a few ordered index entries instead of all SaleItems.
+    # A counter row is removed when its quantity drops to zero, so a product
+    # appears exactly when it has sale items, as in the raw SaleItems query.
+    cursor.execute(
+        """
+    CREATE TABLE IF NOT EXISTS ProductSalesTotals (
+        product_id INTEGER PRIMARY KEY,
+        quantity_sold INTEGER NOT NULL DEFAULT 0,
+        revenue REAL NOT NULL DEFAULT 0,
+        FOREIGN KEY (product_id) REFERENCES Products(id) ON DELETE CASCADE
+    );
+    """
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_product_sales_totals_quantity ON ProductSalesTotals(quantity_sold DESC, product_id);"
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_product_sales_totals_revenue ON ProductSalesTotals(revenue DESC, product_id);"
+    )
+
+    cursor.execute(
+        """
+    CREATE TABLE IF NOT EXISTS ProductSalesDaily (
+        sale_day TEXT NOT NULL,
+        product_id INTEGER NOT NULL,
+        quantity_sold INTEGER NOT NULL DEFAULT 0,
+        revenue REAL NOT NULL DEFAULT 0,
+        PRIMARY KEY (sale_day, product_id),
+        FOREIGN KEY (product_id) REFERENCES Products(id) ON DELETE CASCADE
+    ) WITHOUT ROWID;
+    """
+    )
+
+    # Trigger bodies shared by the SaleItems and Sales triggers. `day` is an
+    # expression giving the sale day; when the sale row no longer exists it
+    # is NULL and the daily statements match nothing.
+    def add_totals(row):
+        return f"""
+        INSERT INTO ProductSalesTotals (product_id, quantity_sold, revenue)
+        VALUES ({row}.product_id, {row}.quantity, {row}.quantity * {row}.price_at_sale)
+        ON CONFLICT (product_id) DO UPDATE
+        SET quantity_sold = quantity_sold + excluded.quantity_sold,
+            revenue = revenue + excluded.revenue;
+        """
+
+    def subtract_totals(row):
+        return f"""
+        UPDATE ProductSalesTotals
+        SET quantity_sold = quantity_sold - {row}.quantity,
+            revenue = revenue - {row}.quantity * {row}.price_at_sale
+        WHERE product_id = {row}.product_id;
+        DELETE FROM ProductSalesTotals
+        WHERE product_id = {row}.product_id AND quantity_sold <= 0;
+        """
+
+    def add_daily(row, day):
+        return f"""
+        INSERT INTO ProductSalesDaily (sale_day, product_id, quantity_sold, revenue)
+        SELECT {day}, {row}.product_id, {row}.quantity, {row}.quantity * {row}.price_at_sale
+        WHERE {day} IS NOT NULL
+        ON CONFLICT (sale_day, product_id) DO UPDATE
+        SET quantity_sold = quantity_sold + excluded.quantity_sold,
+            revenue = revenue + excluded.revenue;
+        """
+
+    def subtract_daily(row, day):
+        return f"""
+        UPDATE ProductSalesDaily
+        SET quantity_sold = quantity_sold - {row}.quantity,
+            revenue = revenue - {row}.quantity * {row}.price_at_sale
+        WHERE sale_day = {day} AND product_id = {row}.product_id;
+        DELETE FROM ProductSalesDaily
+        WHERE sale_day = {day} AND product_id = {row}.product_id AND quantity_sold <= 0;
+        """
+
+    def sale_day(row):
+        return f"(SELECT substr(sale_date, 1, 10) FROM Sales WHERE id = {row}.sale_id)"
+
+    cursor.execute(
+        f"""
+    CREATE TRIGGER IF NOT EXISTS product_sales_on_item_insert
+    AFTER INSERT ON SaleItems
+    BEGIN
+        {add_totals("NEW")}
+        {add_daily("NEW", sale_day("NEW"))}
+    END;
+    """
+    )
+
+    cursor.execute(
+        f"""
+    CREATE TRIGGER IF NOT EXISTS product_sales_on_item_delete
+    AFTER DELETE ON SaleItems
+    BEGIN
+        {subtract_totals("OLD")}
+        {subtract_daily("OLD", sale_day("OLD"))}
+    END;
+    """
+    )
+
+    cursor.execute(
+        f"""
+    CREATE TRIGGER IF NOT EXISTS product_sales_on_item_update
+    AFTER UPDATE OF sale_id, product_id, quantity, price_at_sale ON SaleItems
+    BEGIN
+        {subtract_totals("OLD")}
+        {subtract_daily("OLD", sale_day("OLD"))}
+        {add_totals("NEW")}
+        {add_daily("NEW", sale_day("NEW"))}
+    END;
+    """
+    )
+
+    # Deleting a sale cascades to its items only after the Sales row is
+    # gone, so the daily counters are released here while the day is known.
+    cursor.execute(
+        """
+    CREATE TRIGGER IF NOT EXISTS product_sales_on_sale_delete
+    BEFORE DELETE ON Sales
+    BEGIN
+        UPDATE ProductSalesDaily
+        SET quantity_sold = quantity_sold - items.item_quantity,
+            revenue = revenue - items.item_revenue
+        FROM (
+            SELECT product_id, SUM(quantity) AS item_quantity, SUM(quantity * price_at_sale) AS item_revenue
+            FROM SaleItems WHERE sale_id = OLD.id GROUP BY product_id
+        ) AS items
+        WHERE ProductSalesDaily.sale_day = substr(OLD.sale_date, 1, 10)
+          AND ProductSalesDaily.product_id = items.product_id;
+        DELETE FROM ProductSalesDaily
+        WHERE sale_day = substr(OLD.sale_date, 1, 10) AND quantity_sold <= 0;
+    END;
+    """
+    )
+
+    cursor.execute(
+        """
+    CREATE TRIGGER IF NOT EXISTS product_sales_on_sale_date_update
+    AFTER UPDATE OF sale_date ON Sales
+    WHEN substr(OLD.sale_date, 1, 10) IS NOT substr(NEW.sale_date, 1, 10)
+    BEGIN
+        UPDATE ProductSalesDaily
+        SET quantity_sold = quantity_sold - items.item_quantity,
+            revenue = revenue - items.item_revenue
+        FROM (
+            SELECT product_id, SUM(quantity) AS item_quantity, SUM(quantity * price_at_sale) AS item_revenue
+            FROM SaleItems WHERE sale_id = NEW.id GROUP BY product_id
+        ) AS items
+        WHERE ProductSalesDaily.sale_day = substr(OLD.sale_date, 1, 10)
+          AND ProductSalesDaily.product_id = items.product_id;
+        DELETE FROM ProductSalesDaily
+        WHERE sale_day = substr(OLD.sale_date, 1, 10) AND quantity_sold <= 0;
+        INSERT INTO ProductSalesDaily (sale_day, product_id, quantity_sold, revenue)
+        SELECT substr(NEW.sale_date, 1, 10), product_id, SUM(quantity), SUM(quantity * price_at_sale)
+        FROM SaleItems WHERE sale_id = NEW.id GROUP BY product_id
+        ON CONFLICT (sale_day, product_id) DO UPDATE
+        SET quantity_sold = quantity_sold + excluded.quantity_sold,
+            revenue = revenue + excluded.revenue;
+    END;
+    """
+    )
+
+    _rebuild_product_sales_counters(cursor)
+
+
+def _rebuild_product_sales_counters(cursor):
+    cursor.execute("DELETE FROM ProductSalesTotals;")
+    cursor.execute(
+        """
+    INSERT INTO ProductSalesTotals (product_id, quantity_sold, revenue)
+    SELECT product_id, SUM(quantity), SUM(quantity * price_at_sale)
+    FROM SaleItems
+    GROUP BY product_id;
+    """
+    )
+    cursor.execute("DELETE FROM ProductSalesDaily;")
+    cursor.execute(
+        """
+    INSERT INTO ProductSalesDaily (sale_day, product_id, quantity_sold, revenue)
+    SELECT substr(s.sale_date, 1, 10), si.product_id, SUM(si.quantity), SUM(si.quantity * si.price_at_sale)
+    FROM SaleItems si
+    JOIN Sales s ON s.id = si.sale_id
+    GROUP BY substr(s.sale_date, 1, 10), si.product_id;
+    """
+    )
+
+
+# Tables whose changes are counted in DataVersions.
+TRACKED_TABLES = ("Customers", "Products", "Purchases", "Sales", "SaleItems")
+
+
+def _migration_8_data_versions(cursor):
+    # One change counter per table, bumped by triggers on every row written,
+    # so views can tell whether the data they show is stale.
+    cursor.execute(
+        """
+    CREATE TABLE IF NOT EXISTS DataVersions (
+        table_name TEXT PRIMARY KEY,
+        version INTEGER NOT NULL DEFAULT 0
+    ) WITHOUT ROWID;
+    """
+    )
+    for table in TRACKED_TABLES:
+        cursor.execute(
+            "INSERT OR IGNORE INTO DataVersions (table_name, version) VALUES (?, 0);",
+            (table,),
+        )
+        for event in ("INSERT", "UPDATE", "DELETE"):
+            cursor.execute(
+                f"""
+            CREATE TRIGGER IF NOT EXISTS data_version_{table.lower()}_{event.lower()}
+            AFTER {event} ON {table}
+            BEGIN
+                UPDATE DataVersions SET version = version + 1 WHERE table_name = '{table}';
+            END;
+            """
+            )
+
+
+def _migration_9_product_stock_index(cursor):
+    # Stock-level filters (out of stock, low stock) read an index range
+    # instead of scanning Products; "out of stock" also comes back already
+    # ordered by name.
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_product_stock ON Products (quantity_in_stock, name_key);"
+    )
+
+
+def _migration_10_product_barcodes(cursor):
+    # Barcodes and SKUs read by the till scanner. The primary key keeps each
+    # code unique across products and is the index a scan looks up; a
+    # product may have several codes (pack, unit, supplier SKU...).
+    cursor.execute(
+        """
+    CREATE TABLE IF NOT EXISTS ProductBarcodes (
+        barcode TEXT PRIMARY KEY,
+        product_id INTEGER NOT NULL,
+        FOREIGN KEY (product_id) REFERENCES Products (id) ON DELETE CASCADE
+    ) WITHOUT ROWID;
+    """
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_product_barcodes_product ON ProductBarcodes (product_id);"
+    )
+
+
+def _migration_11_suspendable_stock_triggers(cursor):
+    # Bulk writers (add_sales_bulk(), add_purchases_bulk()) switch the stock
+    # triggers off and apply one set-based update per product instead. The
+    # switch is a row of StockTriggerSuspension, present only inside the
+    # bulk writer's transaction (see _stock_triggers_suspended()); the
+    # triggers run while the table is empty, for every connection.
+    cursor.execute(
+        """
+    CREATE TABLE IF NOT EXISTS StockTriggerSuspension (
+        id INTEGER PRIMARY KEY CHECK (id = 1)
+    );
+    """
+    )
+    cursor.execute("DROP TRIGGER IF EXISTS increase_stock_on_purchase;")
+    cursor.execute(
+        """
+    CREATE TRIGGER increase_stock_on_purchase
+    AFTER INSERT ON Purchases
+    WHEN NOT EXISTS (SELECT 1 FROM StockTriggerSuspension)
+    BEGIN
+        UPDATE Products
+        SET quantity_in_stock = quantity_in_stock + NEW.quantity
+        WHERE id = NEW.product_id;
+    END;
+    """
+    )
+    cursor.execute("DROP TRIGGER IF EXISTS decrease_stock_on_sale;")
+    cursor.execute(
+        """
+    CREATE TRIGGER decrease_stock_on_sale
+    AFTER INSERT ON SaleItems
+    WHEN NOT EXISTS (SELECT 1 FROM StockTriggerSuspension)
+    BEGIN
+        UPDATE Products
+        SET quantity_in_stock = quantity_in_stock - NEW.quantity
+        WHERE id = NEW.product_id;
+    END;
+    """
+    )
+
+
+# Ordered schema migrations: (version, description, function(cursor)).
+# initialize_database() applies every migration whose version is above the
+# database's PRAGMA user_version, then stores the new version. Append new
+# migrations at the end; never edit one that has already shipped.
+MIGRATIONS = [
+    (1, "initial schema", _migration_1_initial_schema),
+    (2, "FTS5 product search index", _migration_2_product_search_index),
+    (3, "normalized name search keys", _migration_3_name_search_keys),
+    (4, "history keyset pagination indexes", _migration_4_history_keyset_indexes),
+    (5, "customer sales date index", _migration_5_customer_sales_date_index),
+    (6, "daily sales rollup", _migration_6_sales_daily_rollup),
+    (7, "per-product sales counters", _migration_7_product_sales_counters),
+    (8, "per-table data versions", _migration_8_data_versions),
+    (9, "product stock level index", _migration_9_product_stock_index),
+    (10, "product barcodes", _migration_10_product_barcodes),
+    (11, "suspendable stock triggers", _migration_11_suspendable_stock_triggers),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def get_schema_version(conn):
+    """Returns the schema version stored in the database header."""
+    return conn.execute("PRAGMA user_version;").fetchone()[0]
+
+
+def refresh_missing_name_keys(conn):
+    """Fills in the name_key of rows added without one (e.g. by the sqlite3 shell).
+
+    Returns the number of rows fixed. Reads the name_key indexes only, so
+    it is cheap when nothing is missing.
+    """
+    fixed = 0
+    for table in ("Products", "Customers"):
+        fixed += conn.execute(
+            f"UPDATE {table} SET name_key = search_key(name) WHERE name_key IS NULL"
+        ).rowcount
+    return fixed
+
+
+def initialize_database():
+    """Brings the schema up to date by applying the pending migrations.
+
+    An up-to-date database costs a PRAGMA read and the name_key check of
+    refresh_missing_name_keys(). Otherwise all missing migrations run in
+    one transaction, together with the user_version bump.
+    """
+    with managed_connection() as conn:
+        if get_schema_version(conn) == SCHEMA_VERSION:
+            _refresh_missing_name_keys_if_any(conn)
+            return
+
+    with transaction() as conn:
+        # Re-read inside the write lock in case another process migrated.
+        current_version = get_schema_version(conn)
+        if current_version > SCHEMA_VERSION:
+            print(
+                f"Warning: database schema version {current_version} is newer "
+                f"than this application ({SCHEMA_VERSION})."
+            )
+            return
+        cursor = conn.cursor()
+        for version, description, migrate in MIGRATIONS:
+            if version > current_version:
+                print(f"Applying migration {version}: {description}")
+                migrate(cursor)
+        cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION};")
+        refresh_missing_name_keys(conn)
+
+    print(f"Database initialized successfully (schema version {SCHEMA_VERSION}).")
+
+
+def _refresh_missing_name_keys_if_any(conn):
+    # Checked before taking the write lock: normally nothing is missing.
+    missing = conn.execute(
+        """SELECT EXISTS (SELECT 1 FROM Products WHERE name_key IS NULL)
+               OR EXISTS (SELECT 1 FROM Customers WHERE name_key IS NULL)"""
+    ).fetchone()[0]
+    if missing:
+        with transaction() as conn:
+            print(f"Filled in {refresh_missing_name_keys(conn)} missing name keys.")
 
 
 def add_customer(name, address=None, phone=None, email=None):
     """Adds a new customer to the database."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
     try:
-        cursor.execute(
-            "INSERT INTO Customers (name, address, phone, email) VALUES (?, ?, ?, ?)",
-            (name, address, phone, email),
-        )
-        conn.commit()
+        with transaction() as conn:
+            cursor = conn.execute(
+                "INSERT INTO Customers (name, name_key, address, phone, email) VALUES (?, ?, ?, ?, ?)",
+                (name, normalize_search_key(name), address, phone, email),
+            )
         print(f"Customer '{name}' added successfully.")
         return cursor.lastrowid
     except sqlite3.IntegrityError as e:
         print(f"Error adding customer: {e}")
         return None
-    finally:
-        conn.close()
 
 
 def get_all_customers():
     """Retrieves all customers from the database."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        "SELECT id, name, address, phone, email FROM Customers ORDER BY name"
-    )
-    customers = cursor.fetchall()
-    conn.close()
-    return customers
+    with managed_connection() as conn:
+        return conn.execute(
+            "SELECT id, name, address, phone, email FROM Customers ORDER BY name_key, id"
+        ).fetchall()
 
 
 def update_customer(customer_id, name, address=None, phone=None, email=None):
     """Updates an existing customer's details."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
     try:
-        cursor.execute(
-            """UPDATE Customers
-               SET name = ?, address = ?, phone = ?, email = ?
-               WHERE id = ?""",
-            (name, address, phone, email, customer_id),
-        )
-        conn.commit()
+        with transaction() as conn:
+            conn.execute(
+                """UPDATE Customers
+                   SET name = ?, name_key = ?, address = ?, phone = ?, email = ?
+                   WHERE id = ?""",
+                (name, normalize_search_key(name), address, phone, email, customer_id),
+            )
         print(f"Customer ID {customer_id} updated successfully.")
         return True
     except sqlite3.IntegrityError as e:
         print(f"Error updating customer {customer_id}: {e}")
         return False
-    finally:
-        conn.close()
 
 
 def delete_customer(customer_id):
     """Deletes a customer from the database."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
     try:
-        cursor.execute("DELETE FROM Customers WHERE id = ?", (customer_id,))
-        conn.commit()
+        with transaction() as conn:
+            conn.execute("DELETE FROM Customers WHERE id = ?", (customer_id,))
         print(f"Customer ID {customer_id} deleted successfully.")
         return True
     except sqlite3.Error as e:
         print(f"Error deleting customer {customer_id}: {e}")
         return False
-    finally:
-        conn.close()
 
 
 def add_product(
@@ -204,17 +1035,26 @@ def add_product(
     purchase_price=0.0,
     selling_price=0.0,
     initial_stock=0,
+    barcodes=(),
 ):
-    """Adds a new product to the database."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    """Adds a new product to the database, with its barcodes/SKUs if given."""
     try:
-        cursor.execute(
-            """INSERT INTO Products (name, description, category, purchase_price, selling_price, quantity_in_stock)
-               VALUES (?, ?, ?, ?, ?, ?)""",
-            (name, description, category, purchase_price, selling_price, initial_stock),
-        )
-        conn.commit()
+        with transaction() as conn:
+            cursor = conn.execute(
+                """INSERT INTO Products (name, name_key, description, category, purchase_price, selling_price, quantity_in_stock)
+                   VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                (
+                    name,
+                    normalize_search_key(name),
+                    description,
+                    category,
+                    purchase_price,
+                    selling_price,
+                    initial_stock,
+                ),
+            )
+            if barcodes:
+                replace_product_barcodes(conn, cursor.lastrowid, barcodes)
         print(f"Product '{name}' added successfully.")
         return cursor.lastrowid
     except sqlite3.IntegrityError as e:
@@ -223,30 +1063,44 @@ def add_product(
     except sqlite3.Error as e:
         print(f"Database error adding product: {e}")
         return None
-    finally:
-        conn.close()
 
 
 def get_all_products():
     """Retrieves all products from the database."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        "SELECT id, name, description, category, purchase_price, selling_price, quantity_in_stock FROM Products ORDER BY name"
-    )
-    products = cursor.fetchall()
-    conn.close()
-    return products
+    with managed_connection() as conn:
+        return conn.execute(
+            "SELECT id, name, description, category, purchase_price, selling_price, quantity_in_stock FROM Products ORDER BY name_key, id"
+        ).fetchall()
 
 
 def get_product_by_id(product_id):
     """Retrieves a single product by its ID."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM Products WHERE id = ?", (product_id,))
-    product = cursor.fetchone()
-    conn.close()
-    return product
+    with managed_connection() as conn:
+        return conn.execute(
+            "SELECT * FROM Products WHERE id = ?", (product_id,)
+        ).fetchone()
+
+
+def get_products_by_ids(product_ids):
+    """Retrieves the given products (missing ids are skipped), ordered by name."""
+    product_ids = list(product_ids)
+    if not product_ids:
+        return []
+    placeholders = ", ".join("?" for _ in product_ids)
+    with managed_connection() as conn:
+        return conn.execute(
+            f"SELECT id, name, description, category, purchase_price, selling_price, quantity_in_stock FROM Products WHERE id IN ({placeholders}) ORDER BY name_key, id",
+            product_ids,
+        ).fetchall()
+
+
+def get_product_by_name(name):
+    """Retrieves the product with exactly this name (names are unique), or None."""
+    with managed_connection() as conn:
+        return conn.execute(
+            "SELECT id, name, description, category, purchase_price, selling_price, quantity_in_stock FROM Products WHERE name = ?",
+            (name,),
+        ).fetchone()
 
 
 def update_product(
@@ -256,17 +1110,27 @@ def update_product(
     category=None,
     purchase_price=0.0,
     selling_price=0.0,
+    barcodes=None,
 ):
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    """Updates a product; `barcodes`, unless None, replaces its barcodes/SKUs."""
     try:
-        cursor.execute(
-            """UPDATE Products
-               SET name = ?, description = ?, category = ?, purchase_price = ?, selling_price = ?
-               WHERE id = ?""",
-            (name, description, category, purchase_price, selling_price, product_id),
-        )
-        conn.commit()
+        with transaction() as conn:
+            conn.execute(
+                """UPDATE Products
+                   SET name = ?, name_key = ?, description = ?, category = ?, purchase_price = ?, selling_price = ?
+                   WHERE id = ?""",
+                (
+                    name,
+                    normalize_search_key(name),
+                    description,
+                    category,
+                    purchase_price,
+                    selling_price,
+                    product_id,
+                ),
+            )
+            if barcodes is not None:
+                replace_product_barcodes(conn, product_id, barcodes)
         print(f"Product ID {product_id} updated successfully.")
         return True
     except sqlite3.IntegrityError as e:
@@ -275,18 +1139,49 @@ def update_product(
     except sqlite3.Error as e:
         print(f"Database error updating product {product_id}: {e}")
         return False
-    finally:
-        conn.close()
+
+
+def replace_product_barcodes(conn, product_id, barcodes):
+    """Makes `barcodes` the codes of a product; raises IntegrityError if one belongs to another product."""
+    conn.execute("DELETE FROM ProductBarcodes WHERE product_id = ?", (product_id,))
+    codes = dict.fromkeys(code.strip() for code in barcodes if code and code.strip())
+    conn.executemany(
+        "INSERT INTO ProductBarcodes (barcode, product_id) VALUES (?, ?)",
+        [(code, product_id) for code in codes],
+    )
+
+
+def get_product_barcodes(product_id):
+    """Returns the barcodes/SKUs of a product, sorted."""
+    with managed_connection() as conn:
+        rows = conn.execute(
+            "SELECT barcode FROM ProductBarcodes WHERE product_id = ? ORDER BY barcode",
+            (product_id,),
+        ).fetchall()
+    return [row["barcode"] for row in rows]
+
+
+def find_product_by_barcode(barcode):
+    """Returns the product with this barcode or SKU, or None.
+
+    A single primary-key lookup, cheap enough to run on every scan.
+    """
+    with managed_connection() as conn:
+        return conn.execute(
+            """SELECT p.id, p.name, p.description, p.category, p.purchase_price, p.selling_price, p.quantity_in_stock
+               FROM ProductBarcodes b
+               JOIN Products p ON p.id = b.product_id
+               WHERE b.barcode = ?""",
+            (barcode.strip(),),
+        ).fetchone()
 
 
 def delete_product(product_id):
     """Deletes a product from the database."""
 
-    conn = get_db_connection()
-    cursor = conn.cursor()
     try:
-        cursor.execute("DELETE FROM Products WHERE id = ?", (product_id,))
-        conn.commit()
+        with transaction() as conn:
+            conn.execute("DELETE FROM Products WHERE id = ?", (product_id,))
         print(f"Product ID {product_id} deleted successfully.")
         return True
     except sqlite3.IntegrityError as e:
@@ -298,89 +1193,329 @@ def delete_product(product_id):
     except sqlite3.Error as e:
         print(f"Database error deleting product {product_id}: {e}")
         return False
-    finally:
-        conn.close()
 
 
-def search_products(query="", category_filter=None):
-    """Searches products by name, description, or category."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    sql = "SELECT id, name, description, category, purchase_price, selling_price, quantity_in_stock FROM Products WHERE 1=1"
+def _fts_match_expression(query):
+    """Turns free text into an FTS5 query: every word, as a prefix, must match."""
+    terms = [term.replace('"', '""') for term in query.split()]
+    return " ".join(f'"{term}"*' for term in terms)
+
+
+def _key_prefix_range(key):
+    """Returns (low, high) bounds matching every key starting with `key`."""
+    return key, key + "\U0010ffff"
+
+
+def _limit_clause(limit, offset):
+    """Returns the LIMIT/OFFSET suffix and its parameters for a paged query."""
+    if limit is None:
+        return "", []
+    return " LIMIT ? OFFSET ?", [limit, offset]
+
+
+# Stock-level filters accepted by search_products(): (predicate on the stock
+# column, whether it takes the low-stock threshold as parameter).
+STOCK_LEVEL_FILTERS = {
+    "low": ("{column} <= ?", True),
+    "in_stock": ("{column} > 0", False),
+    "out_of_stock": ("{column} = 0", False),
+}
+
+
+def _stock_level_clause(stock_level, low_stock_threshold, column="quantity_in_stock"):
+    """Returns the AND predicate and parameters of a stock-level filter."""
+    if not stock_level:
+        return "", []
+    if stock_level not in STOCK_LEVEL_FILTERS:
+        raise ValueError(f"Unknown stock level filter: {stock_level!r}")
+    predicate, uses_threshold = STOCK_LEVEL_FILTERS[stock_level]
+    sql = " AND " + predicate.format(column=column)
+    return sql, [low_stock_threshold] if uses_threshold else []
+
+
+def search_products(
+    query="",
+    category_filter=None,
+    limit=None,
+    offset=0,
+    stock_level=None,
+    low_stock_threshold=5,
+    after=None,
+):
+    """Searches products by name, description, or category.
+
+    Uses the ProductsFTS index when it exists (word-prefix matching, best
+    matches first, then by name). Otherwise falls back to the names starting
+    with `query` (accent-insensitive, from the name_key index), followed by
+    the other products containing it in their name or description (LIKE).
+    With `limit`, returns only that many rows, so a table can fetch its rows
+    batch by batch: `after` is the (name_key, id) of the last row already
+    read, and the name-ordered paths continue from it (keyset) so rows
+    written meanwhile are neither repeated nor skipped. The ranked FTS path
+    skips `offset` rows instead. `stock_level` is one of the
+    STOCK_LEVEL_FILTERS keys ("low" means at most `low_stock_threshold`).
+    Rows end with the name_key column, for `after`.
+    """
+    with managed_connection() as conn:
+        if query.strip() and _has_table(conn, "ProductsFTS"):
+            limit_sql, limit_params = _limit_clause(limit, offset)
+            sql = """
+                SELECT p.id, p.name, p.description, p.category, p.purchase_price, p.selling_price, p.quantity_in_stock, p.name_key
+                FROM ProductsFTS
+                JOIN Products p ON p.id = ProductsFTS.rowid
+                WHERE ProductsFTS MATCH ?
+            """
+            params = [_fts_match_expression(query)]
+            if category_filter:
+                sql += " AND p.category = ?"
+                params.append(category_filter)
+            stock_sql, stock_params = _stock_level_clause(
+                stock_level, low_stock_threshold, "p.quantity_in_stock"
+            )
+            sql += stock_sql
+            params.extend(stock_params)
+            # Name matches weigh most, then category, then description.
+            sql += " ORDER BY bm25(ProductsFTS, 10.0, 1.0, 2.0), p.name_key, p.id"
+            try:
+                return conn.execute(sql + limit_sql, params + limit_params).fetchall()
+            except sqlite3.OperationalError as e:
+                if "interrupted" in str(e):
+                    raise  # Cancelled by the caller, not an FTS problem
+                print(f"Full-text search failed, falling back to name prefix and LIKE: {e}")
+
+        limit_sql, limit_params = _limit_clause(limit, 0 if after is not None else offset)
+        sql = "SELECT id, name, description, category, purchase_price, selling_price, quantity_in_stock, name_key FROM Products WHERE 1=1"
+        params = []
+        order_sql = " ORDER BY name_key, id"
+
+        key = normalize_search_key(query)
+        if key:
+            prefix_range = _key_prefix_range(key)
+            prefix_sql = "name_key >= ? AND name_key < ?"
+            sql += f" AND ({prefix_sql} OR name_key LIKE ? OR description LIKE ?)"
+            params.extend(prefix_range + (f"%{key}%", f"%{query.strip()}%"))
+            # Name prefix matches first, then the substring matches.
+            order_sql = f" ORDER BY NOT ({prefix_sql}), name_key, id"
+            if after is not None:
+                if prefix_range[0] <= after[0] < prefix_range[1]:
+                    # Still among the prefix matches: the rest of them, then every substring match.
+                    sql += f" AND (NOT ({prefix_sql}) OR (name_key, id) > (?, ?))"
+                else:
+                    sql += f" AND NOT ({prefix_sql}) AND (name_key, id) > (?, ?)"
+                params.extend(prefix_range + tuple(after))
+        elif after is not None:
+            sql += " AND (name_key, id) > (?, ?)"
+            params.extend(after)
+
+        if category_filter:
+            sql += " AND category = ?"
+            params.append(category_filter)
+
+        stock_sql, stock_params = _stock_level_clause(stock_level, low_stock_threshold)
+        sql += stock_sql
+        params.extend(stock_params)
+
+        sql += order_sql
+        if key:
+            params.extend(prefix_range)
+        return conn.execute(sql + limit_sql, params + limit_params).fetchall()
+
+
+def suggest_products(query="", limit=20, in_stock_only=False):
+    """Returns at most `limit` products for a type-ahead picker.
+
+    Names starting with `query` come first, in name order, from the
+    name_key index. Only when they are fewer than `limit` is the rest
+    taken from ProductsFTS (any word of name, category or description),
+    unranked: ranking every match of a one-letter prefix would cost a
+    full scan, while the picker only needs a few rows per keystroke.
+    """
+    product_columns = "p.id, p.name, p.description, p.category, p.purchase_price, p.selling_price, p.quantity_in_stock"
+    stock_sql = " AND p.quantity_in_stock > 0" if in_stock_only else ""
+    with managed_connection() as conn:
+        sql = f"SELECT {product_columns} FROM Products p WHERE 1=1"
+        params = []
+        key = normalize_search_key(query)
+        if key:
+            sql += " AND p.name_key >= ? AND p.name_key < ?"
+            params.extend(_key_prefix_range(key))
+        sql += stock_sql + " ORDER BY p.name_key, p.id LIMIT ?"
+        rows = conn.execute(sql, params + [limit]).fetchall()
+
+        if len(rows) >= limit or not query.strip() or not _has_table(conn, "ProductsFTS"):
+            return rows
+        found = [row["id"] for row in rows]
+        sql = f"""
+            SELECT {product_columns}
+            FROM ProductsFTS
+            JOIN Products p ON p.id = ProductsFTS.rowid
+            WHERE ProductsFTS MATCH ?{stock_sql}
+        """
+        if found:
+            sql += f" AND p.id NOT IN ({', '.join('?' * len(found))})"
+        sql += " LIMIT ?"
+        try:
+            more = conn.execute(
+                sql, [_fts_match_expression(query)] + found + [limit - len(rows)]
+            ).fetchall()
+        except sqlite3.OperationalError as e:
+            if "interrupted" in str(e):
+                raise
+            print(f"Full-text suggestion failed, keeping name prefix matches: {e}")
+            return rows
+        return rows + sorted(more, key=lambda row: (normalize_search_key(row["name"]), row["id"]))
+
+
+def search_customers(query="", limit=None, offset=0, after=None):
+    """Searches customers whose name starts with `query`, ignoring accents and case.
+
+    With `limit`, returns only that many rows, in name order straight from
+    the name_key index, continuing after the (name_key, id) pair `after`
+    when given, else skipping `offset` rows. Rows end with the name_key
+    column, for `after`.
+    """
+    sql = "SELECT id, name, address, phone, email, name_key FROM Customers WHERE 1=1"
     params = []
+    key = normalize_search_key(query)
+    if key:
+        sql += " AND name_key >= ? AND name_key < ?"
+        params.extend(_key_prefix_range(key))
+    if after is not None:
+        sql += " AND (name_key, id) > (?, ?)"
+        params.extend(after)
+        offset = 0
+    sql += " ORDER BY name_key, id"
+    limit_sql, limit_params = _limit_clause(limit, offset)
+    with managed_connection() as conn:
+        return conn.execute(sql + limit_sql, params + limit_params).fetchall()
+
+
+def find_customers_by_contact(contact):
+    """Returns the customers whose phone or email is exactly `contact` (UNIQUE indexes)."""
+    contact = contact.strip()
+    if not contact:
+        return []
+    with managed_connection() as conn:
+        return conn.execute(
+            """SELECT id, name, address, phone, email FROM Customers WHERE phone = ?
+               UNION
+               SELECT id, name, address, phone, email FROM Customers WHERE email = ?""",
+            (contact, contact),
+        ).fetchall()
 
-    if query:
-        sql += " AND (name LIKE ? OR description LIKE ?)"
-        params.extend([f"%{query}%", f"%{query}%"])
 
-    if category_filter:
-        sql += " AND category = ?"
-        params.append(category_filter)
+def suggest_customers(query="", limit=20):
+    """Returns at most `limit` customers for a type-ahead picker.
 
-    sql += " ORDER BY name"
-    cursor.execute(sql, params)
-    products = cursor.fetchall()
-    conn.close()
-    return products
+    An exact phone or email match comes first, then the customers whose
+    name starts with `query`. Both are index lookups, so the cost does
+    not grow with the number of customers.
+    """
+    rows = find_customers_by_contact(query)
+    found = {row["id"] for row in rows}
+    for row in search_customers(query, limit=limit + len(found)):
+        if len(rows) >= limit:
+            break
+        if row["id"] not in found:
+            rows.append(row)
+    return rows
 
 
 def get_all_categories():
     """Retrieves a list of unique product categories."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        "SELECT DISTINCT category FROM Products WHERE category IS NOT NULL AND category != '' ORDER BY category"
-    )
-    categories = [row["category"] for row in cursor.fetchall()]
-    conn.close()
-    return categories
+    with managed_connection() as conn:
+        cursor = conn.execute(
+            "SELECT DISTINCT category FROM Products WHERE category IS NOT NULL AND category != '' ORDER BY category"
+        )
+        return [row["category"] for row in cursor.fetchall()]
 
 
 def add_purchase(
     product_id, quantity, cost_per_unit, supplier=None, purchase_date=None
 ):
     """Records a new purchase and updates stock via trigger."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
     if purchase_date is None:
         import datetime
 
         purchase_date = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
     try:
-        cursor.execute(
-            """INSERT INTO Purchases (product_id, quantity, purchase_date, cost_per_unit, supplier)
-               VALUES (?, ?, ?, ?, ?)""",
-            (product_id, quantity, purchase_date, cost_per_unit, supplier),
-        )
-        conn.commit()
+        with transaction() as conn:
+            cursor = conn.execute(
+                """INSERT INTO Purchases (product_id, quantity, purchase_date, cost_per_unit, supplier)
+                   VALUES (?, ?, ?, ?, ?)""",
+                (product_id, quantity, purchase_date, cost_per_unit, supplier),
+            )
         print(f"Purchase recorded for product ID {product_id}, quantity {quantity}.")
         return cursor.lastrowid
     except sqlite3.Error as e:
         print(f"Database error recording purchase: {e}")
         return None
-    finally:
-        conn.close()
 
 
-def get_purchase_history(limit=100):
-    """Retrieves recent purchase history, joining with product names."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+def _fetch_keyset_page(
+    select_sql, date_column, id_column, limit, after, before, start_date, end_date
+):
+    """Runs one page of a newest-first (date, id) keyset pagination.
 
-    cursor.execute(
+    `after` is the (date, id) key of the last row of the current page and
+    returns the next, older page; `before` is the key of the first row and
+    returns the previous, newer page. Dates are filtered as
+    start_date <= date < end_date. Rows always come back newest first.
+    """
+    conditions = []
+    params = []
+    if start_date:
+        conditions.append(f"{date_column} >= ?")
+        params.append(start_date)
+    if end_date:
+        conditions.append(f"{date_column} < ?")
+        params.append(end_date)
+    if after is not None:
+        conditions.append(f"({date_column}, {id_column}) < (?, ?)")
+        params.extend(after)
+    if before is not None:
+        conditions.append(f"({date_column}, {id_column}) > (?, ?)")
+        params.extend(before)
+
+    # A backward page is read oldest-first from the cursor, then reversed.
+    direction = "ASC" if before is not None else "DESC"
+    sql = select_sql
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    sql += f" ORDER BY {date_column} {direction}, {id_column} {direction} LIMIT ?"
+    params.append(limit)
+
+    with managed_connection() as conn:
+        rows = conn.execute(sql, params).fetchall()
+    if before is not None:
+        rows.reverse()
+    return rows
+
+
+def get_purchase_page(
+    limit=100, after=None, before=None, start_date=None, end_date=None
+):
+    """Retrieves one newest-first page of purchases, see _fetch_keyset_page()."""
+    return _fetch_keyset_page(
         """
         SELECT p.id, p.purchase_date, pr.name AS product_name, p.quantity, p.cost_per_unit, p.supplier
         FROM Purchases p
         JOIN Products pr ON p.product_id = pr.id
-        ORDER BY p.purchase_date DESC
-        LIMIT ?
-    """,
-        (limit,),
+        """,
+        "p.purchase_date",
+        "p.id",
+        limit,
+        after,
+        before,
+        start_date,
+        end_date,
     )
-    purchases = cursor.fetchall()
-    conn.close()
-    return purchases
+
+
+def get_purchase_history(limit=100):
+    """Retrieves recent purchase history, joining with product names."""
+    return get_purchase_page(limit)
 
 
 def add_sale(sale_items, customer_id=None, sale_date=None):
@@ -388,9 +1523,6 @@ def add_sale(sale_items, customer_id=None, sale_date=None):
         print("Error: Cannot add a sale with no items.")
         return None
 
-    conn = get_db_connection()
-    cursor = conn.cursor()
-
     if sale_date is None:
         import datetime
 
@@ -399,93 +1531,351 @@ def add_sale(sale_items, customer_id=None, sale_date=None):
     total_amount = sum(item["quantity"] * item["price_at_sale"] for item in sale_items)
 
     try:
-        conn.execute("BEGIN TRANSACTION;")
-
-        cursor.execute(
-            "INSERT INTO Sales (customer_id, sale_date, total_amount) VALUES (?, ?, ?)",
-            (customer_id, sale_date, total_amount),
-        )
-        sale_id = cursor.lastrowid
-        if not sale_id:
-            raise sqlite3.Error("Failed to get sale_id after insert.")
-
-        for item in sale_items:
+        with transaction() as conn:
+            cursor = conn.cursor()
             cursor.execute(
-                """INSERT INTO SaleItems (sale_id, product_id, quantity, price_at_sale)
-                   VALUES (?, ?, ?, ?)""",
-                (sale_id, item["product_id"], item["quantity"], item["price_at_sale"]),
+                "INSERT INTO Sales (customer_id, sale_date, total_amount) VALUES (?, ?, ?)",
+                (customer_id, sale_date, total_amount),
             )
+            sale_id = cursor.lastrowid
+            if not sale_id:
+                raise sqlite3.Error("Failed to get sale_id after insert.")
+
+            for item in sale_items:
+                cursor.execute(
+                    """INSERT INTO SaleItems (sale_id, product_id, quantity, price_at_sale)
+                       VALUES (?, ?, ?, ?)""",
+                    (sale_id, item["product_id"], item["quantity"], item["price_at_sale"]),
+                )
 
-        conn.commit()
         print(
             f"Sale ID {sale_id} recorded successfully with {len(sale_items)} item(s)."
         )
         return sale_id
 
     except (sqlite3.Error, ValueError) as e:
-        print(f"Database error recording sale: {e}. Rolling back transaction.")
-        conn.rollback()
+        print(f"Database error recording sale: {e}. Transaction rolled back.")
         return None
-    finally:
-        conn.close()
 
 
-def get_sales_history(limit=100):
-    """Retrieves recent sales history, joining with customer names."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+def _insert_sale(conn, sale, default_date):
+    """Inserts one sale and its items; returns the sale id. Raises on invalid input."""
+    items = sale["items"]
+    if not items:
+        raise ValueError("sale has no items")
+    rows = [
+        (item["product_id"], item["quantity"], item["price_at_sale"]) for item in items
+    ]
+    total_amount = sum(quantity * price for _product_id, quantity, price in rows)
+    sale_id = conn.execute(
+        "INSERT INTO Sales (customer_id, sale_date, total_amount) VALUES (?, ?, ?)",
+        (sale.get("customer_id"), sale.get("sale_date") or default_date, total_amount),
+    ).lastrowid
+    conn.executemany(
+        """INSERT INTO SaleItems (sale_id, product_id, quantity, price_at_sale)
+           VALUES (?, ?, ?, ?)""",
+        [(sale_id,) + row for row in rows],
+    )
+    return sale_id
+
+
+def _get_stock_levels(conn, product_ids):
+    """Returns {product id: quantity in stock} for the given products."""
+    product_ids = list(product_ids)
+    if not product_ids:
+        return {}
+    placeholders = ", ".join("?" for _ in product_ids)
+    return dict(
+        conn.execute(
+            f"SELECT id, quantity_in_stock FROM Products WHERE id IN ({placeholders})",
+            product_ids,
+        ).fetchall()
+    )
 
-    cursor.execute(
+
+def _sale_quantities(sale):
+    """Returns {product id: quantity} of a sale, or None if its items are malformed."""
+    quantities = {}
+    try:
+        for item in sale["items"]:
+            quantities[item["product_id"]] = quantities.get(item["product_id"], 0) + item["quantity"]
+    except (KeyError, TypeError):
+        return None
+    return quantities
+
+
+def add_sales_bulk(sales, chunk_size=500, set_based_stock=False):
+    """Records many sales, e.g. replayed from an offline till.
+
+    `sales` is any iterable of dicts with "items" (as for add_sale()) and
+    optionally "customer_id" and "sale_date". Sales are written
+    `chunk_size` per transaction, items with executemany(). Each sale runs
+    in its own savepoint, so an invalid sale (unknown product, stock too
+    low, no items...) is skipped without undoing the others.
+
+    With `set_based_stock`, the per-row stock trigger is switched off: the
+    stock each sale needs is checked against the chunk's running stock
+    levels, and each chunk ends with one UPDATE per product sold. The
+    sales rejected and the resulting stock are the same as with the
+    trigger, and the CHECK constraint still guards the final update.
+
+    Returns (sale_ids, failures): sale_ids has one entry per input sale,
+    None for a failed one, and failures lists (position, error message).
+    """
+    import datetime
+    from itertools import islice
+
+    default_date = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    sale_ids = []
+    failures = []
+    sales = iter(sales)
+    while True:
+        chunk = list(islice(sales, chunk_size))
+        if not chunk:
+            break
+        with transaction() as conn:
+            if set_based_stock:
+                _add_sales_chunk_set_based(conn, chunk, default_date, sale_ids, failures)
+                continue
+            for sale in chunk:
+                position = len(sale_ids)
+                try:
+                    with transaction():
+                        sale_ids.append(_insert_sale(conn, sale, default_date))
+                except (sqlite3.Error, ValueError, KeyError, TypeError) as e:
+                    sale_ids.append(None)
+                    failures.append((position, str(e)))
+
+    print(
+        f"Bulk sales: {len(sale_ids) - len(failures)} recorded, {len(failures)} failed."
+    )
+    return sale_ids, failures
+
+
+def _add_sales_chunk_set_based(conn, chunk, default_date, sale_ids, failures):
+    quantities = [_sale_quantities(sale) for sale in chunk]
+    stock = _get_stock_levels(
+        conn, {product_id for sale in quantities if sale for product_id in sale}
+    )
+    first_id = last_id = None
+    with _stock_triggers_suspended(conn):
+        for sale, needed in zip(chunk, quantities):
+            position = len(sale_ids)
+            # What the trigger's UPDATE would hit: the CHECK on quantity_in_stock
+            if needed and any(
+                product_id in stock and stock[product_id] < quantity
+                for product_id, quantity in needed.items()
+            ):
+                sale_ids.append(None)
+                failures.append((position, "CHECK constraint failed: quantity_in_stock >= 0"))
+                continue
+            try:
+                with transaction():
+                    sale_id = _insert_sale(conn, sale, default_date)
+            except (sqlite3.Error, ValueError, KeyError, TypeError) as e:
+                sale_ids.append(None)
+                failures.append((position, str(e)))
+                continue
+            sale_ids.append(sale_id)
+            for product_id, quantity in needed.items():
+                stock[product_id] -= quantity
+            first_id = sale_id if first_id is None else first_id
+            last_id = sale_id
+
+    if first_id is not None:
+        # The chunk holds the write lock: its sales are the only ones in this id range.
+        conn.execute(
+            """UPDATE Products
+               SET quantity_in_stock = quantity_in_stock - sold.quantity
+               FROM (
+                   SELECT product_id, SUM(quantity) AS quantity
+                   FROM SaleItems WHERE sale_id BETWEEN ? AND ?
+                   GROUP BY product_id
+               ) AS sold
+               WHERE Products.id = sold.product_id""",
+            (first_id, last_id),
+        )
+
+
+def add_purchases_bulk(purchases, chunk_size=500, set_based_stock=False):
+    """Records many purchases, `chunk_size` per transaction.
+
+    `purchases` is any iterable of dicts with the arguments of
+    add_purchase(). Each purchase runs in its own savepoint, so an invalid
+    one is skipped without undoing the others. With `set_based_stock`, the
+    per-row stock trigger is switched off and each chunk ends with one
+    UPDATE per product bought.
+
+    Returns (purchase_ids, failures) like add_sales_bulk().
+    """
+    import datetime
+    from itertools import islice
+
+    default_date = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    purchase_ids = []
+    failures = []
+    purchases = iter(purchases)
+    while True:
+        chunk = list(islice(purchases, chunk_size))
+        if not chunk:
+            break
+        with transaction() as conn:
+            chunk_ids, chunk_failures = add_purchases_chunk(
+                conn, chunk, default_date, set_based_stock
+            )
+        failures.extend((len(purchase_ids) + i, error) for i, error in chunk_failures)
+        purchase_ids.extend(chunk_ids)
+
+    print(
+        f"Bulk purchases: {len(purchase_ids) - len(failures)} recorded, {len(failures)} failed."
+    )
+    return purchase_ids, failures
+
+
+def add_purchases_chunk(conn, purchases, default_date, set_based_stock=False):
+    """Inserts purchases inside the caller's transaction; see add_purchases_bulk().
+
+    Returns (purchase_ids, failures) for this chunk, positions counted from 0.
+    """
+    purchase_ids = []
+    failures = []
+    first_id = last_id = None
+    with _stock_triggers_suspended(conn) if set_based_stock else nullcontext():
+        for position, purchase in enumerate(purchases):
+            try:
+                with transaction():
+                    purchase_id = conn.execute(
+                        """INSERT INTO Purchases (product_id, quantity, purchase_date, cost_per_unit, supplier)
+                           VALUES (?, ?, ?, ?, ?)""",
+                        (
+                            purchase["product_id"],
+                            purchase["quantity"],
+                            purchase.get("purchase_date") or default_date,
+                            purchase["cost_per_unit"],
+                            purchase.get("supplier"),
+                        ),
+                    ).lastrowid
+            except (sqlite3.Error, KeyError, TypeError) as e:
+                purchase_ids.append(None)
+                failures.append((position, str(e)))
+                continue
+            purchase_ids.append(purchase_id)
+            first_id = purchase_id if first_id is None else first_id
+            last_id = purchase_id
+
+    if set_based_stock and first_id is not None:
+        # The caller holds the write lock: these purchases are the only ones in this id range.
+        conn.execute(
+            """UPDATE Products
+               SET quantity_in_stock = quantity_in_stock + bought.quantity
+               FROM (
+                   SELECT product_id, SUM(quantity) AS quantity
+                   FROM Purchases WHERE id BETWEEN ? AND ?
+                   GROUP BY product_id
+               ) AS bought
+               WHERE Products.id = bought.product_id""",
+            (first_id, last_id),
+        )
+    return purchase_ids, failures
+
+
+def get_sales_page(limit=100, after=None, before=None, start_date=None, end_date=None):
+    """Retrieves one newest-first page of sales, see _fetch_keyset_page()."""
+    return _fetch_keyset_page(
         """
         SELECT s.id, s.sale_date, c.name AS customer_name, s.total_amount
         FROM Sales s
         LEFT JOIN Customers c ON s.customer_id = c.id
-        ORDER BY s.sale_date DESC
-        LIMIT ?
-    """,
-        (limit,),
+        """,
+        "s.sale_date",
+        "s.id",
+        limit,
+        after,
+        before,
+        start_date,
+        end_date,
     )
-    sales = cursor.fetchall()
-    conn.close()
-    return sales
+
+
+def get_sales_history(limit=100):
+    """Retrieves recent sales history, joining with customer names."""
+    return get_sales_page(limit)
+
+
+def get_sale_header(sale_id):
+    """Retrieves a sale's header row together with its customer details."""
+    with managed_connection() as conn:
+        return conn.execute(
+            """
+            SELECT s.id, s.sale_date, s.customer_id, s.total_amount,
+                   c.name AS customer_name, c.address AS customer_address,
+                   c.phone AS customer_phone
+            FROM Sales s
+            LEFT JOIN Customers c ON s.customer_id = c.id
+            WHERE s.id = ?
+        """,
+            (sale_id,),
+        ).fetchone()
 
 
 def get_sale_items(sale_id):
     """Retrieves all items associated with a specific sale ID."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-
-    cursor.execute(
-        """
-        SELECT si.id, si.product_id, p.name AS product_name, si.quantity, si.price_at_sale
-        FROM SaleItems si
-        JOIN Products p ON si.product_id = p.id
-        WHERE si.sale_id = ?
-        ORDER BY p.name
-    """,
-        (sale_id,),
-    )
-    items = cursor.fetchall()
-    conn.close()
-    return items
+    with managed_connection() as conn:
+        return conn.execute(
+            """
+            SELECT si.id, si.product_id, p.name AS product_name, si.quantity, si.price_at_sale
+            FROM SaleItems si
+            JOIN Products p ON si.product_id = p.id
+            WHERE si.sale_id = ?
+            ORDER BY p.name_key, p.id
+        """,
+            (sale_id,),
+        ).fetchall()
 
 
 def get_sales_by_customer(customer_id):
     """Retrieves sales history for a specific customer."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        """
-        SELECT id, sale_date, total_amount
-        FROM Sales
-        WHERE customer_id = ?
-        ORDER BY sale_date DESC
-    """,
-        (customer_id,),
-    )
-    sales = cursor.fetchall()
-    conn.close()
-    return sales
+    with managed_connection() as conn:
+        return conn.execute(
+            """
+            SELECT id, sale_date, total_amount
+            FROM Sales
+            WHERE customer_id = ?
+            ORDER BY sale_date DESC
+        """,
+            (customer_id,),
+        ).fetchall()
+
+
+def month_date_range(day):
+    """Returns the ('YYYY-MM-01', first day of next month) bounds of day's month.
+
+    Meant for sargable predicates: sale_date >= start AND sale_date < end.
+    """
+    start = day.replace(day=1)
+    if start.month == 12:
+        end = start.replace(year=start.year + 1, month=1)
+    else:
+        end = start.replace(month=start.month + 1)
+    return start.strftime("%Y-%m-%d"), end.strftime("%Y-%m-%d")
+
+
+def rebuild_sales_rollups():
+    """Recomputes SalesDaily and the per-product sales counters from scratch."""
+    with transaction() as conn:
+        _rebuild_sales_rollups(conn.cursor())
+        _rebuild_product_sales_counters(conn.cursor())
+    print("Sales rollups rebuilt successfully.")
+
+
+def get_sales_total_between(start_date, end_date):
+    """Returns the sales total for start_date <= day < end_date ('YYYY-MM-DD')."""
+    with managed_connection() as conn:
+        result = conn.execute(
+            "SELECT SUM(total_amount) FROM SalesDaily WHERE sale_day >= ? AND sale_day < ?",
+            (start_date, end_date),
+        ).fetchone()
+    return result[0] if result[0] is not None else 0.0
 
 
 def get_monthly_sales_trend(limit=12):
@@ -494,63 +1884,199 @@ def get_monthly_sales_trend(limit=12):
     Returns a list of tuples: (month_year_str, total_sales)
     Example: [('2024-03', 1500.50), ('2024-04', 2100.00)]
     """
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    try:
+        return _fetch_monthly_sales_trend(limit)
+    except sqlite3.Error as e:
+        print(f"Error fetching monthly sales trend: {e}")
+        return []
 
+
+def _fetch_monthly_sales_trend(limit):
+    # Raises: get_dashboard_snapshot() must fail (or be cancelled) as a whole.
     query = """
         SELECT
-            strftime('%Y-%m', sale_date) AS sale_month,
+            substr(sale_day, 1, 7) AS sale_month,
             SUM(total_amount) AS monthly_total
-        FROM Sales
-        WHERE date(sale_date) >= date('now', '-' || ? || ' months') -- Filter for the relevant period
+        FROM SalesDaily
+        WHERE sale_day >= date('now', '-' || ? || ' months')
         GROUP BY sale_month
         ORDER BY sale_month ASC;
-        -- LIMIT ?; -- Removed limit here, filter by date instead
     """
-    try:
-
-        cursor.execute(query, (limit,))
-        trend_data = cursor.fetchall()
+    with managed_connection() as conn:
+        trend_data = conn.execute(query, (limit,)).fetchall()
+    return [(row["sale_month"], row["monthly_total"]) for row in trend_data]
 
-        return [(row["sale_month"], row["monthly_total"]) for row in trend_data]
-    except sqlite3.Error as e:
-        print(f"Error fetching monthly sales trend: {e}")
-        return []
-    finally:
-        conn.close()
 
-
-def get_top_selling_products(limit=5):
+def get_top_selling_products(limit=5, days=None, by_revenue=False):
     """
     Retrieves the top selling products based on total quantity sold.
     Returns a list of tuples: (product_name, total_quantity_sold)
-    """
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    query = """
-        SELECT
-            p.name AS product_name,
-            SUM(si.quantity) AS total_quantity_sold
-        FROM SaleItems si
-        JOIN Products p ON si.product_id = p.id
-        GROUP BY si.product_id, p.name -- Group by both ID and name
-        ORDER BY total_quantity_sold DESC
-        LIMIT ?;
+
+    `days` restricts the ranking to the last N days (today included), and
+    by_revenue=True ranks by revenue instead, returning (product_name,
+    revenue). Ties are broken by product id. Reads the trigger-maintained
+    counters instead of aggregating SaleItems.
     """
     try:
-        cursor.execute(query, (limit,))
-        top_products = cursor.fetchall()
-        return [
-            (row["product_name"], row["total_quantity_sold"]) for row in top_products
-        ]
+        return _fetch_top_selling_products(limit, days, by_revenue)
     except sqlite3.Error as e:
         print(f"Error fetching top selling products: {e}")
         return []
-    finally:
-        conn.close()
+
+
+def _fetch_top_selling_products(limit, days, by_revenue):
+    # Raises, like _fetch_monthly_sales_trend().
+    metric = "revenue" if by_revenue else "quantity_sold"
+    if days is None:
+        # Ordered read of idx_product_sales_totals_*: stops after `limit` rows.
+        query = f"""
+            SELECT p.name AS product_name, t.{metric} AS total
+            FROM ProductSalesTotals t
+            JOIN Products p ON p.id = t.product_id
+            ORDER BY t.{metric} DESC, t.product_id
+            LIMIT ?;
+        """
+        params = (limit,)
+    else:
+        import datetime
+
+        start_day = datetime.date.today() - datetime.timedelta(days=days - 1)
+        query = f"""
+            SELECT p.name AS product_name, SUM(d.{metric}) AS total
+            FROM ProductSalesDaily d
+            JOIN Products p ON p.id = d.product_id
+            WHERE d.sale_day >= ?
+            GROUP BY d.product_id
+            ORDER BY total DESC, d.product_id
+            LIMIT ?;
+        """
+        params = (start_day.strftime("%Y-%m-%d"), limit)
+    with managed_connection() as conn:
+        top_products = conn.execute(query, params).fetchall()
+    return [(row["product_name"], row["total"]) for row in top_products]
+
+
+def get_data_fingerprint():
+    """Returns a value that changes whenever any connection commits a write."""
+    with managed_connection() as conn:
+        data_version = conn.execute("PRAGMA data_version;").fetchone()[0]
+    return data_version, _commit_count
+
+
+def get_table_versions(tables):
+    """Returns {table: change counter} for the given tracked tables."""
+    placeholders = ", ".join("?" for _ in tables)
+    with managed_connection() as conn:
+        rows = conn.execute(
+            f"SELECT table_name, version FROM DataVersions WHERE table_name IN ({placeholders})",
+            tuple(tables),
+        ).fetchall()
+    versions = dict.fromkeys(tables, 0)
+    versions.update((row["table_name"], row["version"]) for row in rows)
+    return versions
+
+
+class DataVersionTracker:
+    """Tells a view whether the tables it shows changed since it last looked.
+
+    Changes are judged on the DataVersions counters, which read the same
+    from every connection. An idle database is detected first with a single
+    PRAGMA read; since PRAGMA data_version only means something for the
+    connection that read it, one fingerprint is kept per thread connection.
+    A tracker can therefore be shared by the GUI and the loader threads.
+    """
+
+    def __init__(self, *tables):
+        self.tables = tables
+        self._lock = threading.Lock()
+        self._fingerprints = {}  # thread id -> (connection, fingerprint)
+        self._versions = None
+
+    def has_changed(self):
+        """Returns True on the first call and whenever a tracked table changed."""
+        conn = get_thread_connection()
+        fingerprint = (conn, get_data_fingerprint())
+        thread_id = threading.get_ident()
+        with self._lock:
+            if self._fingerprints.get(thread_id) == fingerprint:
+                return False
+        versions = get_table_versions(self.tables)
+        with self._lock:
+            self._fingerprints[thread_id] = fingerprint
+            if self._versions is None:
+                self._versions = versions
+                return True
+            # Counters only grow; a thread holding an older read must not
+            # move the baseline back.
+            changed = False
+            for table, version in versions.items():
+                if version > self._versions[table]:
+                    self._versions[table] = version
+                    changed = True
+            return changed
+
+    def absorb_last_commit(self):
+        """Counts the calling thread's last commit as already seen.
+
+        For a view that applied that write itself (e.g. from its event). A
+        table only moves forward if its baseline is where the commit
+        started: a change committed in between by anything else is still
+        reported by has_changed().
+        """
+        last_commit = get_last_commit_versions()
+        if last_commit is None:
+            return
+        before, after = last_commit
+        with self._lock:
+            if self._versions is None:
+                return
+            for table in self.tables:
+                if table in before and self._versions[table] == before[table]:
+                    self._versions[table] = after[table]
+
+
+def get_dashboard_snapshot(low_stock_threshold=5, trend_months=12, top_limit=5):
+    """
+    Retrieves every dashboard value from a single read snapshot.
+    Returns a dict with the card values (total_clients, total_products,
+    sales_current_month, low_stock_count) and the chart series
+    (sales_trend as returned by get_monthly_sales_trend(), top_products as
+    returned by get_top_selling_products()). Errors propagate, so a
+    failed or interrupted read is never shown as partial data.
+    """
+    import datetime
+
+    month_start, month_end = month_date_range(datetime.date.today())
+    with read_snapshot() as conn:
+        cards = conn.execute(
+            """
+            SELECT
+                (SELECT COUNT(*) FROM Customers) AS total_clients,
+                (SELECT COUNT(*) FROM Products) AS total_products,
+                (SELECT SUM(total_amount) FROM SalesDaily
+                 WHERE sale_day >= ? AND sale_day < ?) AS sales_current_month,
+                (SELECT COUNT(*) FROM Products
+                 WHERE quantity_in_stock < ?) AS low_stock_count
+        """,
+            (month_start, month_end, low_stock_threshold),
+        ).fetchone()
+        sales_trend = _fetch_monthly_sales_trend(trend_months)
+        top_products = _fetch_top_selling_products(top_limit, None, False)
+
+    return {
+        "total_clients": cards["total_clients"],
+        "total_products": cards["total_products"],
+        "sales_current_month": cards["sales_current_month"] or 0.0,
+        "low_stock_count": cards["low_stock_count"],
+        "sales_trend": sales_trend,
+        "top_products": top_products,
+    }
 
 
 if __name__ == "__main__":
+    import sys
 
     print(f"Initializing database at: {DATABASE_PATH}")
     initialize_database()
+    if "--rebuild-rollups" in sys.argv[1:]:
+        rebuild_sales_rollups()
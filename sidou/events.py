@@ -0,0 +1,71 @@
+"""Domain events published after a successful write.
+
+Views publish an event once the database write succeeded and subscribe to
+the events about the entities they display. A visible view updates only the
+affected rows; a hidden one ignores the event and reloads lazily through its
+DataVersionTracker the next time it is shown.
+"""
+
+from dataclasses import dataclass, field
+
+
+@dataclass(frozen=True)
+class SaleRecorded:
+    sale_id: int
+    product_ids: tuple = field(default_factory=tuple)
+
+
+@dataclass(frozen=True)
+class PurchaseRecorded:
+    purchase_id: int
+    product_id: int
+
+
+@dataclass(frozen=True)
+class ProductChanged:
+    """A product was added, updated or deleted (see `deleted`)."""
+
+    product_id: int
+    deleted: bool = False
+
+
+@dataclass(frozen=True)
+class CustomerChanged:
+    """A customer was added, updated or deleted (see `deleted`)."""
+
+    customer_id: int
+    deleted: bool = False
+
+
+class EventBus:
+    """Synchronous publish/subscribe keyed on the event class."""
+
+    def __init__(self):
+        self._handlers = {}
+
+    def subscribe(self, event_type, handler):
+        self._handlers.setdefault(event_type, []).append(handler)
+
+    def unsubscribe(self, event_type, handler):
+        handlers = self._handlers.get(event_type, [])
+        if handler in handlers:
+            handlers.remove(handler)
+
+    def publish(self, event):
+        for handler in list(self._handlers.get(type(event), [])):
+            try:
+                handler(event)
+            except Exception as e:
+                print(f"Error handling {type(event).__name__}: {e}")
+
+
+event_bus = EventBus()
+
+
+def product_ids_of(event):
+    """Returns the ids of the products whose stock or details an event changed."""
+    if isinstance(event, SaleRecorded):
+        return tuple(event.product_ids)
+    if isinstance(event, (PurchaseRecorded, ProductChanged)):
+        return (event.product_id,)
+    return ()
@@ -1,4 +1,9 @@
+import time  # Mesure du temps de démarrage (option --profile-startup)
+
+_PROCESS_START = time.perf_counter()  # Instant zéro, avant les imports lourds
+
 import sys  # Module système utilisé pour accéder aux arguments de la ligne de commande et quitter l'application
+import importlib  # Import des modules de vues à la première navigation
 
 # Importation des composants de l'interface utilisateur de PyQt6
 from PyQt6.QtWidgets import (
@@ -12,27 +17,66 @@ from PyQt6.QtWidgets import (
     QStackedWidget,  # Conteneur qui empile les vues (comme des onglets sans barre d'onglet)
     QListWidgetItem,  # Élément de la liste (utilisé pour chaque entrée de navigation)
 )
-from PyQt6.QtCore import Qt, QSize  # Qt contient des constantes et QSize gère les dimensions
+from PyQt6.QtCore import Qt, QSize, QTimer  # Qt contient des constantes, QSize gère les dimensions, QTimer planifie les tâches
 from PyQt6.QtGui import QIcon  # (Non utilisé ici, mais permettrait de mettre des icônes)
 
+_PYQT_IMPORTED = time.perf_counter()
+
 # Importation de fonctions utilitaires pour la base de données
-from database.database import initialize_database, get_db_connection
+from database.database import (
+    initialize_database,
+    close_all_connections,
+    get_database_profile_report,
+)
+
+# Pool de threads des lectures en arrière-plan des vues
+from views.async_loader import database_thread_pool, shutdown_database_pool
+
+# Catalogue des produits partagé par toutes les vues
+from catalogue import product_catalogue
+
+_DATABASE_IMPORTED = time.perf_counter()
+
+# Pages de l'application : (titre, module de la vue, classe, attribut de MainWindow).
+# Les modules ne sont importés et les vues construites qu'à la première navigation.
+PAGES = [
+    ("Dashboard", "views.dashboard_view", "DashboardView", "dashboard_view"),
+    ("Clients", "views.customer_view", "CustomerView", "customer_view"),
+    ("Produits", "views.product_view", "ProductView", "product_view"),
+    ("Achats", "views.purchase_view", "PurchaseView", "purchase_view"),
+    ("Ventes", "views.sale_view", "SaleView", "sale_view"),
+    ("Stock", "views.stock_view", "StockView", "stock_view"),
+]
+
+# Durées mesurées au démarrage : liste de (étape, secondes)
+STARTUP_TIMINGS = [
+    ("import PyQt6", _PYQT_IMPORTED - _PROCESS_START),
+    ("import database.database", _DATABASE_IMPORTED - _PYQT_IMPORTED),
+]
+
+
+def print_startup_report(time_to_first_window, time_to_first_page):
+    """Affiche le temps jusqu'à la première fenêtre et le détail des étapes"""
+    print("Startup profile:")
+    print(f"  time to first window: {time_to_first_window * 1000:.1f} ms")
+    print(f"  time to first page:   {time_to_first_page * 1000:.1f} ms")
+    for label, seconds in STARTUP_TIMINGS:
+        print(f"  {label:<40} {seconds * 1000:8.1f} ms")
+    print("  (python -X importtime sidou/main.py gives a per-module import breakdown)")
 
-# Importation des vues personnalisées (chaque vue gère un domaine de l'application)
-from views.customer_view import CustomerView
-from views.product_view import ProductView
-from views.purchase_view import PurchaseView
-from views.sale_view import SaleView
-from views.stock_view import StockView
-from views.dashboard_view import DashboardView
 
 # Classe principale de la fenêtre de l'application
 class MainWindow(QMainWindow):
-    def __init__(self):
+    def __init__(self, prewarm=False, profile_startup=False):
         super().__init__()  # Appelle le constructeur de QMainWindow
         self.setWindowTitle("Gestion Commerciale et de Stock")  # Titre de la fenêtre
         self.setGeometry(100, 100, 1000, 700)  # Position et taille initiale de la fenêtre
 
+        self.prewarm = prewarm  # Construire les autres vues pendant les temps morts après l'affichage
+        self.profile_startup = profile_startup  # Afficher les mesures de démarrage puis quitter
+        self.first_frame_painted = False
+        self.views = {}  # Vues déjà construites (index -> vue)
+
         self.init_ui()  # Appel à la méthode qui construit l’interface utilisateur
 
     def init_ui(self):
@@ -43,35 +87,27 @@ class MainWindow(QMainWindow):
 
         self.nav_list = QListWidget()  # Création de la liste de navigation
         self.nav_list.setFixedWidth(180)  # Largeur fixe pour la navigation
-        self.nav_list.currentRowChanged.connect(self.change_page)  # Changement de page lors de la sélection d’un élément
         main_layout.addWidget(self.nav_list)  # Ajout de la liste au layout
 
         self.stacked_widget = QStackedWidget()  # Widget empilé contenant les différentes vues
         main_layout.addWidget(self.stacked_widget)  # Ajout au layout principal
 
-        # Création de chaque vue
-        self.dashboard_view = DashboardView()
-        self.customer_view = CustomerView()
-        self.product_view = ProductView()
-        self.purchase_view = PurchaseView()
-        self.sale_view = SaleView()
-        self.stock_view = StockView()
-
-        # Connexion des signaux pour mettre à jour les vues dynamiques
-        self.sale_view.sale_recorded.connect(self.refresh_all_views)  # Mise à jour lors d'une nouvelle vente
-        self.product_view.product_updated.connect(self.refresh_all_views)  # Mise à jour lors d’un changement de produit
-        self.purchase_view.purchase_recorded.connect(self.refresh_all_views)  # Mise à jour lors d’un nouvel achat
-        self.customer_view.customer_updated.connect(self.refresh_customer_views)  # Mise à jour lors d’un client modifié
-
-        # Ajout des vues au menu de navigation et au QStackedWidget
-        self.add_page("Dashboard", self.dashboard_view)
-        self.add_page("Clients", self.customer_view)
-        self.add_page("Produits", self.product_view)
-        self.add_page("Achats", self.purchase_view)
-        self.add_page("Ventes", self.sale_view)
-        self.add_page("Stock", self.stock_view)
-
-        self.nav_list.setCurrentRow(0)  # Sélectionne la première vue (Dashboard) au démarrage
+        # Ajout des pages au menu de navigation ; chaque vue est remplacée par
+        # un simple libellé jusqu'à sa première ouverture
+        for title, _module, _class, _attribute in PAGES:
+            self.add_page(title, self._create_placeholder())
+
+        # Les vues s'abonnent elles-mêmes aux événements métier (events.event_bus) :
+        # une vue visible met à jour les lignes concernées, une vue masquée se
+        # recharge seulement lorsqu'elle est affichée (voir change_page)
+
+        # La première page n'est construite qu'après le premier affichage de la fenêtre
+        self.nav_list.currentRowChanged.connect(self.change_page)  # Changement de page lors de la sélection d’un élément
+
+    def _create_placeholder(self):
+        placeholder = QLabel("Chargement...")  # Affiché tant que la vue n'est pas construite
+        placeholder.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        return placeholder
 
     def add_page(self, name, widget):
         item = QListWidgetItem(name)  # Création d’un item pour la liste de navigation
@@ -79,44 +115,89 @@ class MainWindow(QMainWindow):
         self.nav_list.addItem(item)  # Ajout à la liste de navigation
         self.stacked_widget.addWidget(widget)  # Ajout de la vue correspondante au QStackedWidget
 
+    def get_view(self, index):
+        """Retourne la vue de la page, en l'important et la construisant au premier appel"""
+        if index in self.views:
+            return self.views[index]
+
+        _title, module_name, class_name, attribute = PAGES[index]
+        start = time.perf_counter()
+        module = importlib.import_module(module_name)  # Import différé du module de la vue
+        imported = time.perf_counter()
+        view = getattr(module, class_name)()  # Construction de la vue (premiers accès à la base)
+        built = time.perf_counter()
+        STARTUP_TIMINGS.append((f"import {module_name}", imported - start))
+        STARTUP_TIMINGS.append((f"build {class_name}", built - imported))
+
+        # Remplacement du libellé provisoire par la vue, sans changer la page affichée
+        current_index = self.stacked_widget.currentIndex()
+        placeholder = self.stacked_widget.widget(index)
+        self.stacked_widget.insertWidget(index, view)
+        self.stacked_widget.removeWidget(placeholder)
+        placeholder.deleteLater()
+        self.stacked_widget.setCurrentIndex(current_index)
+
+        self.views[index] = view
+        setattr(self, attribute, view)  # Accès direct (self.sale_view, ...) comme auparavant
+        return view
+
     def change_page(self, index):
+        if index < 0:
+            return
+        current_widget = self.get_view(index)  # Construit la vue si c'est sa première ouverture
         self.stacked_widget.setCurrentIndex(index)  # Affiche la vue correspondant à l’index sélectionné
-        current_widget = self.stacked_widget.widget(index)  # Récupère la vue actuelle
-        self.refresh_all_views()  # Recharge les données dynamiques
-
-    def refresh_all_views(self):
-        """Actualise toutes les vues ayant des données dynamiques"""
-        print("Refreshing all views...")
-        if hasattr(self.dashboard_view, "load_data"):
-            self.dashboard_view.load_data()  # Recharge le tableau de bord
-        if hasattr(self.product_view, "load_products"):
-            self.product_view.load_products()  # Recharge les produits
-            self.product_view.load_categories()  # Recharge les catégories
-        if hasattr(self.purchase_view, "load_products_for_combo"):
-            self.purchase_view.load_products_for_combo()  # Recharge les produits dans la vue d'achat
-        if hasattr(self.stock_view, "load_stock_data"):
-            self.stock_view.load_stock_data()  # Recharge les données de stock
-            self.stock_view.load_categories_filter()  # Recharge les filtres de catégories
-        if hasattr(self.sale_view, "load_products_for_sale"):
-            self.sale_view.load_products_for_sale()  # Recharge les produits dans la vue de vente
-            self.sale_view.load_sales_history()  # Recharge l'historique des ventes
-
-    def refresh_customer_views(self):
-        """Actualise les vues contenant des données clients"""
-        print("Refreshing customer-related views...")
-        if hasattr(self.customer_view, "load_customers"):
-            self.customer_view.load_customers()  # Recharge la liste des clients
-        if hasattr(self.sale_view, "load_customers_for_sale"):
-            self.sale_view.load_customers_for_sale()  # Recharge les clients dans la vue de vente
+        current_widget.refresh_if_changed()  # Recharge la vue affichée si ses tables ont changé pendant qu'elle était masquée
+
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if not self.first_frame_painted:
+            self.first_frame_painted = True
+            # Poursuivre le démarrage une fois la première image affichée
+            QTimer.singleShot(0, self.on_first_frame)
+
+    def on_first_frame(self):
+        time_to_first_window = time.perf_counter() - _PROCESS_START
+        self.nav_list.setCurrentRow(0)  # Sélectionne et construit la première vue (Dashboard)
+        time_to_first_page = time.perf_counter() - _PROCESS_START
+
+        if self.profile_startup:
+            print_startup_report(time_to_first_window, time_to_first_page)
+            QApplication.instance().quit()  # Mode mesure : on quitte après le rapport
+            return
+
+        # Chargement du catalogue produits hors du thread de l'interface,
+        # avant que les vues Produits, Achats, Ventes ou Stock ne le lisent
+        database_thread_pool().start(product_catalogue.refresh_if_changed)
+        if self.prewarm:
+            QTimer.singleShot(0, self.prewarm_next_view)
+
+    def prewarm_next_view(self):
+        """Construit une vue restante par passage dans la boucle d'événements"""
+        for index in range(len(PAGES)):
+            if index not in self.views:
+                self.get_view(index)
+                QTimer.singleShot(0, self.prewarm_next_view)  # L'interface reste réactive entre deux vues
+                return
 
 
 # Point d’entrée principal de l’application
 if __name__ == "__main__":
+    profile_startup = "--profile-startup" in sys.argv  # Mesure du démarrage à froid
+    prewarm = "--prewarm" in sys.argv  # Préparation des autres vues après l'affichage
+
     print("Initializing database...")  # Message de débogage
+    start = time.perf_counter()
     initialize_database()  # Initialisation de la base de données (création des tables si nécessaire)
+    STARTUP_TIMINGS.append(("initialize_database()", time.perf_counter() - start))
     print("Database check complete.")  # Message de confirmation
+    profile_name, profile_settings = get_database_profile_report()  # Profil PRAGMA actif (GESTION_DB_PROFILE)
+    print(f"Database profile: {profile_name} {profile_settings}")
 
+    start = time.perf_counter()
     app = QApplication(sys.argv)  # Création de l'application PyQt
-    main_win = MainWindow()  # Instanciation de la fenêtre principale
+    app.aboutToQuit.connect(shutdown_database_pool)  # Attendre les chargements en cours
+    app.aboutToQuit.connect(close_all_connections)  # Fermeture propre des connexions à la base
+    main_win = MainWindow(prewarm=prewarm, profile_startup=profile_startup)  # Instanciation de la fenêtre principale
     main_win.show()  # Affichage de la fenêtre
+    STARTUP_TIMINGS.append(("QApplication + MainWindow", time.perf_counter() - start))
     sys.exit(app.exec())  # Lancement de la boucle événementielle (l'application tourne jusqu'à fermeture)
@@ -0,0 +1,133 @@
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+from database.database import get_thread_connection
+
+# Threads of the shared pool; each one keeps its own database connection.
+# View loads, table batches and the type-ahead searches all run here, so a
+# search still gets a thread while a long load (catalogue, dashboard) runs.
+DATABASE_THREADS = 3
+
+_pool = None
+
+
+def database_thread_pool():
+    """Returns the pool running the views' database reads.
+
+    Its threads never expire, so the per-thread connections they open are
+    reused instead of being left behind by retired threads.
+    """
+    global _pool
+    if _pool is None:
+        _pool = QThreadPool()
+        _pool.setMaxThreadCount(DATABASE_THREADS)
+        _pool.setExpiryTimeout(-1)
+    return _pool
+
+
+def shutdown_database_pool(timeout_ms=2000):
+    """Drops queued loads and waits for running ones; called at exit, before the connections close."""
+    if _pool is not None:
+        _pool.clear()
+        _pool.waitForDone(timeout_ms)
+
+
+class LoadRequest:
+    """Cancellation token of one load."""
+
+    def __init__(self):
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class _LoadSignals(QObject):
+    succeeded = pyqtSignal(object)
+    failed = pyqtSignal(object)
+
+
+class _LoadTask(QRunnable):
+    def __init__(self, request, function):
+        super().__init__()
+        self.request = request
+        self.function = function
+        self.signals = _LoadSignals()
+
+    def run(self):
+        if self.request.cancelled:
+            return
+        # A cancelled load aborts its running statement.
+        conn = get_thread_connection()
+        conn.set_progress_handler(lambda: self.request.cancelled, 1000)
+        try:
+            result = self.function()
+        except Exception as e:
+            if not self.request.cancelled:
+                self.signals.failed.emit(e)
+            return
+        finally:
+            conn.set_progress_handler(None, 0)
+        if not self.request.cancelled:
+            self.signals.succeeded.emit(result)
+
+
+class AsyncLoader(QObject):
+    """Runs a view's database reads on the shared pool, one load per name.
+
+    load() cancels the previous load of the same name: its result is
+    dropped and its running query interrupted. Results and errors are
+    delivered on the GUI thread. loading_changed(bool) tells whether any
+    load of this loader is in flight, for the view's loading state.
+    """
+
+    loading_changed = pyqtSignal(bool)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._loads = {}
+
+    def load(self, name, function, on_result, on_error=None):
+        """Runs `function()` on the pool; calls on_result(result) or on_error(exception)."""
+        self._cancel(name)
+        request = LoadRequest()
+        task = _LoadTask(request, function)
+        task.signals.succeeded.connect(
+            lambda result: self._finish(name, request, on_result, result)
+        )
+        task.signals.failed.connect(
+            lambda error: self._finish(name, request, on_error, error)
+        )
+        was_loading = self.is_loading()
+        self._loads[name] = (request, task)
+        if not was_loading:
+            self.loading_changed.emit(True)
+        database_thread_pool().start(task)
+        return request
+
+    def cancel(self, name=None):
+        """Cancels the load called `name`, or every load of this loader."""
+        was_loading = self.is_loading()
+        for load_name in list(self._loads) if name is None else [name]:
+            self._cancel(load_name)
+        if was_loading and not self.is_loading():
+            self.loading_changed.emit(False)
+
+    def is_loading(self):
+        return bool(self._loads)
+
+    def _cancel(self, name):
+        entry = self._loads.pop(name, None)
+        if entry is not None:
+            entry[0].cancel()
+
+    def _finish(self, name, request, callback, value):
+        entry = self._loads.get(name)
+        if entry is None or entry[0] is not request:
+            return  # Superseded or cancelled meanwhile
+        del self._loads[name]
+        if not self._loads:
+            self.loading_changed.emit(False)
+        if callback is not None:
+            callback(value)
+        elif isinstance(value, Exception):
+            print(f"Error loading {name}: {value}")
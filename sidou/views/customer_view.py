@@ -6,6 +6,7 @@ from PyQt6.QtWidgets import (
     QLabel,
     QLineEdit,
     QPushButton,
+    QTableView,
     QTableWidget,
     QTableWidgetItem,
     QMessageBox,
@@ -16,10 +17,16 @@ from PyQt6.QtWidgets import (
     QGridLayout,
 )
 from PyQt6.QtCore import Qt, pyqtSignal
+from functools import partial
 
 
+from events import event_bus, CustomerChanged
+from views.async_loader import AsyncLoader
+from views.search_controller import SearchController
+from views.table_models import CustomerTableModel
 from database.database import (
-    get_all_customers,
+    DataVersionTracker,
+    search_customers,
     add_customer,
     update_customer,
     delete_customer,
@@ -35,8 +42,15 @@ class CustomerView(QWidget):
     def __init__(self):
         super().__init__()
         self.current_customer_id = None
+        self.change_tracker = DataVersionTracker("Customers")
+        self.customer_model = CustomerTableModel()
+        self.loader = AsyncLoader(self)  # Sales history loads on the database pool
+        # Searches run debounced on the database pool; results come back here
+        self.search_controller = SearchController(self._search_first_batch, parent=self)
+        self.search_controller.results_ready.connect(self.on_search_results)
         self.init_ui()
-        self.load_customers()
+        self.refresh_if_changed()
+        event_bus.subscribe(CustomerChanged, self.on_customer_changed)
 
     def init_ui(self):
         main_layout = QVBoxLayout(self)
@@ -48,6 +62,14 @@ class CustomerView(QWidget):
         )
         main_layout.addWidget(title_label)
 
+        search_layout = QHBoxLayout()
+        self.search_input = QLineEdit()
+        self.search_input.setPlaceholderText("Rechercher par nom...")
+        self.search_input.textChanged.connect(self.filter_customers)
+        search_layout.addWidget(QLabel("Rechercher:"))
+        search_layout.addWidget(self.search_input)
+        main_layout.addLayout(search_layout)
+
         form_layout = QHBoxLayout()
         self.name_input = QLineEdit()
         self.name_input.setPlaceholderText("Nom du client*")
@@ -92,11 +114,9 @@ class CustomerView(QWidget):
         button_layout.addWidget(self.clear_button)
         main_layout.addLayout(button_layout)
 
-        self.customer_table = QTableWidget()
-        self.customer_table.setColumnCount(5)
-        self.customer_table.setHorizontalHeaderLabels(
-            ["ID", "Nom", "Adresse", "Téléphone", "Email"]
-        )
+        # Rows are served on demand by the model and fetched as the table scrolls
+        self.customer_table = QTableView()
+        self.customer_table.setModel(self.customer_model)
         self.customer_table.setEditTriggers(
             QAbstractItemView.EditTrigger.NoEditTriggers
         )
@@ -113,59 +133,70 @@ class CustomerView(QWidget):
         self.customer_table.horizontalHeader().setSectionResizeMode(
             0, QHeaderView.ResizeMode.ResizeToContents
         )
-        self.customer_table.itemSelectionChanged.connect(self.on_row_selected)
+        self.customer_table.selectionModel().selectionChanged.connect(
+            self.on_row_selected
+        )
 
         main_layout.addWidget(self.customer_table)
 
         self.setLayout(main_layout)
 
+    def refresh_if_changed(self):
+        """Reloads the customer table only if Customers changed since the last load."""
+        if self.change_tracker.has_changed():
+            self.search_controller.clear_cache()
+            self.load_customers()
+
+    def on_customer_changed(self, event):
+        """Reloads the table if visible; a hidden view reloads when shown."""
+        if self.isVisible():
+            self.refresh_if_changed()
+
+    def _search_first_batch(self, search_query):
+        """Runs on the database thread pool: first batch of the table."""
+        return search_customers(search_query, limit=self.customer_model.batch_size)
+
     def load_customers(self):
-        """Loads customer data from the database into the table."""
-        self.customer_table.setRowCount(0)
-        try:
-            customers = get_all_customers()
-            if customers:
-                self.customer_table.setRowCount(len(customers))
-                for row_idx, customer in enumerate(customers):
-                    self.customer_table.setItem(
-                        row_idx, 0, QTableWidgetItem(str(customer["id"]))
-                    )
-                    self.customer_table.setItem(
-                        row_idx, 1, QTableWidgetItem(customer["name"])
-                    )
-                    self.customer_table.setItem(
-                        row_idx, 2, QTableWidgetItem(customer["address"] or "")
-                    )
-                    self.customer_table.setItem(
-                        row_idx, 3, QTableWidgetItem(customer["phone"] or "")
-                    )
-                    self.customer_table.setItem(
-                        row_idx, 4, QTableWidgetItem(customer["email"] or "")
-                    )
+        """Searches right away with the current query (data reload)."""
+        self.search_controller.request(
+            (self.search_input.text().strip(),), immediate=True
+        )
+
+    def filter_customers(self):
+        """Searches once typing pauses, without blocking the interface."""
+        self.search_controller.request((self.search_input.text().strip(),))
+
+    def on_search_results(self, key, rows):
+        """Shows the first batch of a search; further rows are fetched on scroll.
+
+        The selected customer stays selected while the results still show
+        it; the form is only cleared once that customer drops out.
+        """
+        self.customer_model.reset(partial(search_customers, *key), first_rows=rows)
+        row_idx = self.customer_model.row_of(self.current_customer_id)
+        if row_idx is None:
             self.clear_form()
-        except Exception as e:
-            QMessageBox.critical(
-                self, "Erreur", f"Erreur lors du chargement des clients: {e}"
-            )
+        else:
+            self.customer_table.selectRow(row_idx)
 
     def on_row_selected(self):
-        """Handles actions when a table row is selected."""
-        selected_items = self.customer_table.selectedItems()
-        if selected_items:
-            selected_row = self.customer_table.currentRow()
-            self.current_customer_id = int(
-                self.customer_table.item(selected_row, 0).text()
-            )
-            self.name_input.setText(self.customer_table.item(selected_row, 1).text())
-            self.address_input.setText(self.customer_table.item(selected_row, 2).text())
-            self.phone_input.setText(self.customer_table.item(selected_row, 3).text())
-            self.email_input.setText(self.customer_table.item(selected_row, 4).text())
-            self.update_button.setEnabled(True)
-            self.delete_button.setEnabled(True)
-            self.history_button.setEnabled(True)
-            self.add_button.setEnabled(False)
-        else:
+        """Populates the form when a table row is selected."""
+        selected_rows = self.customer_table.selectionModel().selectedRows()
+        customer = self.customer_model.row_at(selected_rows[0].row()) if selected_rows else None
+        if customer is None:
             self.clear_form()
+            return
+
+        model = self.customer_model
+        self.current_customer_id = customer[model.ID]
+        self.name_input.setText(customer[model.NAME])
+        self.address_input.setText(customer[model.ADDRESS] or "")
+        self.phone_input.setText(customer[model.PHONE] or "")
+        self.email_input.setText(customer[model.EMAIL] or "")
+        self.update_button.setEnabled(True)
+        self.delete_button.setEnabled(True)
+        self.history_button.setEnabled(True)
+        self.add_button.setEnabled(False)
 
     def clear_form(self):
         """Clears the input fields and resets selection state."""
@@ -192,9 +223,10 @@ class CustomerView(QWidget):
             return
 
         try:
-            add_customer(name, address, phone, email)
+            customer_id = add_customer(name, address, phone, email)
             self.clear_form()
-            self.load_customers()
+            if customer_id:
+                event_bus.publish(CustomerChanged(customer_id))
             self.customer_updated.emit()  # Emit signal when customer is added
             QMessageBox.information(
                 self, "Succès", "Le client a été ajouté avec succès."
@@ -222,8 +254,8 @@ class CustomerView(QWidget):
             return
 
         try:
-            update_customer(self.current_customer_id, name, address, phone, email)
-            self.load_customers()
+            if update_customer(self.current_customer_id, name, address, phone, email):
+                event_bus.publish(CustomerChanged(self.current_customer_id))
             self.customer_updated.emit()  # Emit signal when customer is updated
             QMessageBox.information(
                 self, "Succès", "Le client a été modifié avec succès."
@@ -251,9 +283,11 @@ class CustomerView(QWidget):
 
         if reply == QMessageBox.StandardButton.Yes:
             try:
-                delete_customer(self.current_customer_id)
+                customer_id = self.current_customer_id
+                deleted = delete_customer(customer_id)
                 self.clear_form()
-                self.load_customers()
+                if deleted:
+                    event_bus.publish(CustomerChanged(customer_id, deleted=True))
                 self.customer_updated.emit()  # Emit signal when customer is deleted
                 QMessageBox.information(
                     self, "Succès", "Le client a été supprimé avec succès."
@@ -273,19 +307,20 @@ class CustomerView(QWidget):
             )
             return
 
+        customer_id = self.current_customer_id
         customer_name = self.name_input.text()
-        try:
-            sales_history = get_sales_by_customer(self.current_customer_id)
-            dialog = CustomerHistoryDialog(
-                self.current_customer_id, customer_name, sales_history, self
-            )
-            dialog.exec()
-        except Exception as e:
-            QMessageBox.critical(
+        self.loader.load(
+            "history",
+            partial(get_sales_by_customer, customer_id),
+            lambda sales_history: CustomerHistoryDialog(
+                customer_id, customer_name, sales_history, self
+            ).exec(),
+            lambda e: QMessageBox.critical(
                 self,
                 "Erreur Historique Client",
                 f"Impossible de charger l'historique: {e}",
-            )
+            ),
+        )
 
 
 class CustomerHistoryDialog(QDialog):
@@ -296,6 +331,7 @@ class CustomerHistoryDialog(QDialog):
         )
         self.setMinimumWidth(600)
         self.selected_sale_id = None
+        self.loader = AsyncLoader(self)  # Sale details load on the database pool
 
         layout = QVBoxLayout(self)
 
@@ -382,24 +418,27 @@ class CustomerHistoryDialog(QDialog):
             self.selected_sale_id = int(self.history_table.item(selected_row, 0).text())
 
         if self.selected_sale_id is not None:
-            try:
-
-                items = get_sale_items(self.selected_sale_id)
-
-                from views.sale_view import SaleDetailsDialog
-
-                details_dialog = SaleDetailsDialog(self.selected_sale_id, items, self)
-                details_dialog.exec()
-            except ImportError:
-                QMessageBox.critical(
-                    self, "Erreur Import", "Impossible d'importer SaleDetailsDialog."
-                )
-            except Exception as e:
-                QMessageBox.critical(
+            sale_id = self.selected_sale_id
+            self.loader.load(
+                "details",
+                partial(get_sale_items, sale_id),
+                partial(self._show_sale_details, sale_id),
+                lambda e: QMessageBox.critical(
                     self,
                     "Erreur Détails Vente",
                     f"Impossible de charger les détails: {e}",
-                )
+                ),
+            )
+
+    def _show_sale_details(self, sale_id, items):
+        try:
+            from views.sale_view import SaleDetailsDialog
+        except ImportError:
+            QMessageBox.critical(
+                self, "Erreur Import", "Impossible d'importer SaleDetailsDialog."
+            )
+            return
+        SaleDetailsDialog(sale_id, items, self).exec()
 
 
 if __name__ == "__main__":
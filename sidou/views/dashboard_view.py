@@ -1,6 +1,7 @@
 import os
 import sys
 import datetime
+from functools import partial
 from PyQt6.QtWidgets import (
     QApplication,
     QWidget,
@@ -15,22 +16,37 @@ from PyQt6.QtWidgets import (
 from PyQt6.QtCore import Qt, pyqtProperty
 from PyQt6.QtGui import QFont, QColor, QPalette
 
+from events import (
+    event_bus,
+    CustomerChanged,
+    ProductChanged,
+    PurchaseRecorded,
+    SaleRecorded,
+)
+from views.async_loader import AsyncLoader
+from database.database import DataVersionTracker, get_dashboard_snapshot
 
-try:
-    import pyqtgraph as pg
-    from pyqtgraph import DateAxisItem, BarGraphItem
 
-    PYQTGRAPH_AVAILABLE = True
-except ImportError:
-    PYQTGRAPH_AVAILABLE = False
-    print("Warning: pyqtgraph not found. Graphs will not be displayed.")
+_pyqtgraph = None
+_pyqtgraph_checked = False
 
 
-from database.database import (
-    get_db_connection,
-    get_monthly_sales_trend,
-    get_top_selling_products,
-)
+def load_pyqtgraph():
+    """Imports pyqtgraph on first use; returns the module, or None if not installed.
+
+    pyqtgraph is slow to import and only the dashboard needs it, so it is not
+    imported with this module.
+    """
+    global _pyqtgraph, _pyqtgraph_checked
+    if not _pyqtgraph_checked:
+        _pyqtgraph_checked = True
+        try:
+            import pyqtgraph
+
+            _pyqtgraph = pyqtgraph
+        except ImportError:
+            print("Warning: pyqtgraph not found. Graphs will not be displayed.")
+    return _pyqtgraph
 
 
 class AnimatedWidget(QWidget):
@@ -57,7 +73,15 @@ class DashboardView(QWidget):
         self.setAutoFillBackground(True)
         self.setPalette(palette)
 
+        self.change_tracker = DataVersionTracker(
+            "Customers", "Products", "Sales", "SaleItems"
+        )
+        self.pg = load_pyqtgraph()
+        self.loader = AsyncLoader(self)
         self.init_ui()
+        self.loader.loading_changed.connect(self.loading_label.setVisible)
+        for event_type in (CustomerChanged, ProductChanged, PurchaseRecorded, SaleRecorded):
+            event_bus.subscribe(event_type, self.on_data_event)
 
     def init_ui(self):
         main_layout = QVBoxLayout(self)
@@ -74,6 +98,11 @@ class DashboardView(QWidget):
         title_label.setStyleSheet("color: #E0E0E0;")
         main_layout.addWidget(title_label)
 
+        self.loading_label = QLabel("Chargement...")
+        self.loading_label.setStyleSheet("color: #AAAAAA; font-style: italic;")
+        self.loading_label.setVisible(False)
+        main_layout.addWidget(self.loading_label)
+
         summary_grid = QGridLayout()
         summary_grid.setSpacing(20)
         main_layout.addLayout(summary_grid)
@@ -104,7 +133,7 @@ class DashboardView(QWidget):
         ]:
             card.setGraphicsEffect(None)
 
-        if PYQTGRAPH_AVAILABLE:
+        if self.pg is not None:
             charts_layout = QHBoxLayout()
             charts_layout.setSpacing(20)
             main_layout.addLayout(charts_layout)
@@ -219,12 +248,12 @@ class DashboardView(QWidget):
         )
         container_layout.addWidget(title_label)
 
-        if PYQTGRAPH_AVAILABLE:
+        if self.pg is not None:
 
-            pg.setConfigOption("background", "#393A3B")
-            pg.setConfigOption("foreground", "w")
+            self.pg.setConfigOption("background", "#393A3B")
+            self.pg.setConfigOption("foreground", "w")
 
-            plot_widget = pg.PlotWidget()
+            plot_widget = self.pg.PlotWidget()
             plot_widget.showGrid(x=True, y=True, alpha=0.3)
             plot_widget.getPlotItem().getViewBox().setBackgroundColor(None)
             container_layout.addWidget(plot_widget)
@@ -239,9 +268,32 @@ class DashboardView(QWidget):
         chart_container.setLayout(container_layout)
         return chart_container
 
+    def refresh_if_changed(self):
+        """Reloads the dashboard only if one of the tables it summarises changed."""
+        if self.change_tracker.has_changed():
+            self.load_data()
+
+    def on_data_event(self, event):
+        """Reloads if visible; a hidden dashboard reloads when shown."""
+        if self.isVisible():
+            self.refresh_if_changed()
+
     def load_data(self):
 
         print("Loading dashboard data...")
+        # The snapshot is read on the database thread pool.
+        self.loader.load(
+            "snapshot",
+            partial(get_dashboard_snapshot, low_stock_threshold=5),
+            self._show_data,
+            self._on_load_error,
+        )
+
+    def _on_load_error(self, e):
+        print(f"Error loading dashboard data: {e}")
+        self._show_data(None)
+
+    def _show_data(self, snapshot):
         total_clients = 0
         total_products = 0
         total_sales_current_month = 0.0
@@ -249,42 +301,16 @@ class DashboardView(QWidget):
         sales_trend_data = []
         top_products_data = []
 
-        try:
-            conn = get_db_connection()
-            cursor = conn.cursor()
-
-            cursor.execute("SELECT COUNT(id) FROM Customers")
-            result = cursor.fetchone()
-            total_clients = result[0] if result else 0
+        if snapshot is not None:
+            total_clients = snapshot["total_clients"]
+            total_products = snapshot["total_products"]
+            total_sales_current_month = snapshot["sales_current_month"]
+            low_stock_count = snapshot["low_stock_count"]
+            sales_trend_data = snapshot["sales_trend"]
+            top_products_data = snapshot["top_products"]
 
-            cursor.execute("SELECT COUNT(id) FROM Products")
-            result = cursor.fetchone()
-            total_products = result[0] if result else 0
-
-            current_month = datetime.datetime.now().strftime("%Y-%m")
-            cursor.execute(
-                "SELECT SUM(total_amount) FROM Sales WHERE strftime('%Y-%m', sale_date) = ?",
-                (current_month,),
-            )
-            result = cursor.fetchone()
-            total_sales_current_month = (
-                result[0] if result and result[0] is not None else 0.0
-            )
-
-            cursor.execute("SELECT COUNT(id) FROM Products WHERE quantity_in_stock < 5")
-            result = cursor.fetchone()
-            low_stock_count = result[0] if result else 0
-
-            if PYQTGRAPH_AVAILABLE:
-                sales_trend_data = get_monthly_sales_trend(limit=12)
-                top_products_data = get_top_selling_products(limit=5)
-
-            conn.close()
             print("Data fetched successfully.")
 
-        except Exception as e:
-            print(f"Error loading dashboard data: {e}")
-
         try:
             self.total_clients_card.value_label.setText(str(total_clients))
             self.total_products_card.value_label.setText(str(total_products))
@@ -293,7 +319,7 @@ class DashboardView(QWidget):
             )
             self.low_stock_card.value_label.setText(str(low_stock_count))
 
-            if PYQTGRAPH_AVAILABLE:
+            if self.pg is not None:
                 self._plot_sales_trend(sales_trend_data)
                 self._plot_top_products(top_products_data)
 
@@ -305,7 +331,7 @@ class DashboardView(QWidget):
     def _plot_sales_trend(self, data):
 
         if (
-            not PYQTGRAPH_AVAILABLE
+            self.pg is None
             or not hasattr(self.sales_trend_plot, "plot_widget")
             or not self.sales_trend_plot.plot_widget
         ):
@@ -313,7 +339,7 @@ class DashboardView(QWidget):
         if not data:
             self.sales_trend_plot.plot_widget.clear()
             self.sales_trend_plot.plot_widget.addItem(
-                pg.TextItem("Aucune donnée de vente disponible.", color="gray")
+                self.pg.TextItem("Aucune donnée de vente disponible.", color="gray")
             )
             return
 
@@ -330,13 +356,13 @@ class DashboardView(QWidget):
             print(f"Error parsing date for sales trend: {e}")
             return
 
-        axis = DateAxisItem(orientation="bottom")
+        axis = self.pg.DateAxisItem(orientation="bottom")
         plot_item.setAxisItems({"bottom": axis})
 
         plot_item.plot(
             timestamps,
             values,
-            pen=pg.mkPen(color="#3498DB", width=2),
+            pen=self.pg.mkPen(color="#3498DB", width=2),
             symbol="o",
             symbolBrush="#3498DB",
             symbolSize=5,
@@ -349,7 +375,7 @@ class DashboardView(QWidget):
     def _plot_top_products(self, data):
 
         if (
-            not PYQTGRAPH_AVAILABLE
+            self.pg is None
             or not hasattr(self.top_products_plot, "plot_widget")
             or not self.top_products_plot.plot_widget
         ):
@@ -360,7 +386,7 @@ class DashboardView(QWidget):
 
         if not data:
             plot_item.addItem(
-                pg.TextItem("Aucune donnée de produit disponible.", color="gray")
+                self.pg.TextItem("Aucune donnée de produit disponible.", color="gray")
             )
             return
 
@@ -369,9 +395,9 @@ class DashboardView(QWidget):
         x_values = list(range(len(product_names)))
 
         colors = ["#2ECC71", "#3498DB", "#9B59B6", "#F1C40F", "#E74C3C"]
-        brushes = [pg.mkBrush(colors[i % len(colors)]) for i in range(len(data))]
+        brushes = [self.pg.mkBrush(colors[i % len(colors)]) for i in range(len(data))]
 
-        bg = BarGraphItem(x=x_values, height=quantities, width=0.6, brushes=brushes)
+        bg = self.pg.BarGraphItem(x=x_values, height=quantities, width=0.6, brushes=brushes)
         plot_item.addItem(bg)
 
         axis = plot_item.getAxis("bottom")
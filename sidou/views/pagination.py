@@ -0,0 +1,85 @@
+from functools import partial
+
+
+class KeysetPager:
+    """Keeps the cursor state of a newest-first (date, id) paginated history.
+
+    `fetch_page` is a database function such as get_sales_page(); only the
+    rows of the current page are held, whatever the size of the table.
+
+    first()/next()/previous() fetch and move in one call. For loading on
+    another thread, request_*() return the query to run (or None) without
+    touching the state, and show_*() apply its rows afterwards.
+    """
+
+    def __init__(self, fetch_page, date_key, page_size=100):
+        self.fetch_page = fetch_page
+        self.date_key = date_key
+        self.page_size = page_size
+        self.rows = []
+        self.page_number = 1
+        self.has_next = False
+        self.has_previous = False
+
+    def _key(self, row):
+        return (row[self.date_key], row["id"])
+
+    def request_first(self):
+        return partial(self.fetch_page, limit=self.page_size + 1)
+
+    def request_next(self):
+        if not self.has_next or not self.rows:
+            return None
+        return partial(
+            self.fetch_page, limit=self.page_size + 1, after=self._key(self.rows[-1])
+        )
+
+    def request_previous(self):
+        if not self.has_previous or not self.rows:
+            return None
+        return partial(
+            self.fetch_page, limit=self.page_size + 1, before=self._key(self.rows[0])
+        )
+
+    def show_first(self, rows):
+        """Makes `rows` (from request_first()) the newest page."""
+        self.has_next = len(rows) > self.page_size
+        self.has_previous = False
+        self.page_number = 1
+        self.rows = rows[: self.page_size]
+        return self.rows
+
+    def show_next(self, rows):
+        """Makes `rows` (from request_next()) the current, older page."""
+        self.has_next = len(rows) > self.page_size
+        self.has_previous = True
+        self.page_number += 1
+        self.rows = rows[: self.page_size]
+        return self.rows
+
+    def show_previous(self, rows):
+        """Makes `rows` (from request_previous()) the current, newer page."""
+        # Rows come back newest first: the extra row is the newest one.
+        self.has_previous = len(rows) > self.page_size
+        self.has_next = True
+        self.page_number = max(1, self.page_number - 1)
+        self.rows = rows[-self.page_size :]
+        return self.rows
+
+    def first(self):
+        """Loads the newest page."""
+        return self.show_first(self.request_first()())
+
+    def next(self):
+        """Loads the next, older page."""
+        request = self.request_next()
+        if request is None:
+            return self.rows
+        return self.show_next(request())
+
+    def previous(self):
+        """Loads the previous, newer page."""
+        request = self.request_previous()
+        if request is None:
+            return self.rows
+        return self.show_previous(request())
@@ -0,0 +1,131 @@
+from PyQt6.QtCore import Qt
+from PyQt6.QtWidgets import QComboBox, QCompleter
+
+from catalogue import product_catalogue
+from database.database import suggest_customers, suggest_products
+from views.search_controller import SearchController
+
+
+def product_name(product):
+    return product["name"]
+
+
+def customer_label(customer):
+    if customer["phone"]:
+        return f"{customer['name']} ({customer['phone']})"
+    return customer["name"]
+
+
+class SearchPicker(QComboBox):
+    """Editable combo holding only the top matches of what is typed.
+
+    Each keystroke runs `search(query, max_results)` on the database thread
+    pool, and the matches replace the items of the combo. The combo never
+    holds the whole table, so it fills instantly whatever its size.
+
+    Item 0 is an empty "nothing selected" item (data -1), shown with the
+    `placeholder` hint: callers keep using currentIndex() and itemData()
+    as with a plain QComboBox. `item_text(row)` gives the text of an item.
+    """
+
+    def __init__(
+        self,
+        placeholder,
+        search,
+        item_text,
+        max_results=20,
+        debounce_ms=150,
+        parent=None,
+    ):
+        super().__init__(parent)
+        self.search = search
+        self.item_text = item_text
+        self.max_results = max_results
+        self._query = ""
+
+        self.setEditable(True)
+        self.setInsertPolicy(QComboBox.InsertPolicy.NoInsert)
+        self.lineEdit().setPlaceholderText(placeholder)
+        # The combo's own items are already the matches: show them unfiltered.
+        completer = QCompleter(self.model(), self)
+        completer.setCompletionMode(QCompleter.CompletionMode.UnfilteredPopupCompletion)
+        completer.setCaseSensitivity(Qt.CaseSensitivity.CaseInsensitive)
+        self.setCompleter(completer)
+
+        self.addItem("", -1)
+        self.search_controller = SearchController(
+            self._search, debounce_ms=debounce_ms, parent=self
+        )
+        self.search_controller.results_ready.connect(self._show_matches)
+        self.lineEdit().textEdited.connect(self.on_text_edited)
+
+    def _search(self, query):
+        # Runs on the database thread pool.
+        return self.search(query, self.max_results)
+
+    def on_text_edited(self, text):
+        self._query = text
+        if self.currentIndex() > 0:
+            # Typing starts a new search: nothing is selected meanwhile.
+            self.setCurrentIndex(0)
+            self.setEditText(text)
+        self.search_controller.request((text,))
+
+    def refresh(self):
+        """Re-runs the last search now, e.g. after the searched table changed."""
+        self.search_controller.clear_cache()
+        self.search_controller.request((self._query,), immediate=True)
+
+    def _show_matches(self, key, rows):
+        selected_id = self.currentData()
+        self.blockSignals(True)
+        try:
+            self.clear()
+            self.addItem("", -1)
+            for row in rows:
+                self.addItem(self.item_text(row), row["id"])
+            index = self.findData(selected_id) if selected_id != -1 else -1
+            self.setCurrentIndex(max(index, 0))
+            if index <= 0:
+                self.setEditText(self._query)  # Keep what is being typed
+        finally:
+            self.blockSignals(False)
+        if index <= 0 and selected_id not in (None, -1):
+            self.currentIndexChanged.emit(0)  # The selected row is no longer listed
+        if rows and self.lineEdit().hasFocus():
+            self.completer().complete()
+            self.completer().popup().setRowHidden(0, True)  # "Nothing selected" item
+
+
+class ProductPicker(SearchPicker):
+    """Product picker backed by suggest_products() (indexed name prefix, then FTS).
+
+    With `in_stock_only`, products out of stock are left out.
+    """
+
+    def __init__(self, placeholder, item_text=product_name, in_stock_only=False, **kwargs):
+        self.in_stock_only = in_stock_only
+        super().__init__(placeholder, self._suggest, item_text, **kwargs)
+
+    def _suggest(self, query, limit):
+        return suggest_products(query, limit, self.in_stock_only)
+
+    def update_products(self, product_ids):
+        """Refreshes the items of the given products, if shown, from the catalogue."""
+        self.search_controller.clear_cache()
+        for product_id in product_ids:
+            index = self.findData(product_id)
+            if index <= 0:
+                continue  # Not among the matches: the next search finds it
+            product = product_catalogue.get(product_id)
+            if product is None or (self.in_stock_only and product["quantity_in_stock"] <= 0):
+                self.removeItem(index)
+            else:
+                self.setItemText(index, self.item_text(product))
+
+
+class CustomerPicker(SearchPicker):
+    """Customer picker backed by suggest_customers(): exact phone/email, then name prefix."""
+
+    def __init__(self, placeholder, item_text=customer_label, **kwargs):
+        super().__init__(placeholder, suggest_customers, item_text, **kwargs)
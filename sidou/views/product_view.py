@@ -6,8 +6,7 @@ from PyQt6.QtWidgets import (
     QLineEdit,
     QPushButton,
     QTextEdit,
-    QTableWidget,
-    QTableWidgetItem,
+    QTableView,
     QMessageBox,
     QHeaderView,
     QAbstractItemView,
@@ -16,15 +15,27 @@ from PyQt6.QtWidgets import (
     QGridLayout,
 )
 from PyQt6.QtCore import Qt, pyqtSignal
-
-
+from functools import partial
+
+from views.async_loader import AsyncLoader
+from views.search_controller import SearchController
+from views.table_models import ProductTableModel
+
+from catalogue import product_catalogue
+from events import (
+    event_bus,
+    product_ids_of,
+    ProductChanged,
+    PurchaseRecorded,
+    SaleRecorded,
+)
 from database.database import (
-    get_all_products,
+    DataVersionTracker,
     add_product,
     update_product,
     delete_product,
+    get_product_barcodes,
     search_products,
-    get_all_categories,
 )
 
 
@@ -35,9 +46,16 @@ class ProductView(QWidget):
     def __init__(self):
         super().__init__()
         self.current_product_id = None
+        self.change_tracker = DataVersionTracker("Products")
+        self.product_model = ProductTableModel()
+        self.loader = AsyncLoader(self)  # Categories and barcodes load on the database pool
+        # Searches run debounced on the database pool; results come back here
+        self.search_controller = SearchController(self._search_first_batch, parent=self)
+        self.search_controller.results_ready.connect(self.on_search_results)
         self.init_ui()
-        self.load_products()
-        self.load_categories()
+        self.refresh_if_changed()
+        for event_type in (ProductChanged, PurchaseRecorded, SaleRecorded):
+            event_bus.subscribe(event_type, self.on_products_event)
 
     def init_ui(self):
         main_layout = QVBoxLayout(self)
@@ -55,7 +73,7 @@ class ProductView(QWidget):
         self.search_input.textChanged.connect(self.filter_products)
         self.category_filter_combo = QComboBox()
         self.category_filter_combo.addItem("Toutes les catégories")
-        self.category_filter_combo.currentIndexChanged.connect(self.filter_products)
+        self.category_filter_combo.currentIndexChanged.connect(self.load_products)
 
         search_filter_layout.addWidget(QLabel("Rechercher:"))
         search_filter_layout.addWidget(self.search_input)
@@ -96,6 +114,11 @@ class ProductView(QWidget):
         self.selling_price_input.setSuffix(" DA")
         form_layout.addWidget(self.selling_price_input, 2, 3)
 
+        form_layout.addWidget(QLabel("Codes-barres / SKU:"), 3, 0)
+        self.barcodes_input = QLineEdit()
+        self.barcodes_input.setPlaceholderText("Un ou plusieurs codes, séparés par des virgules")
+        form_layout.addWidget(self.barcodes_input, 3, 1, 1, 3)
+
         main_layout.addWidget(form_widget)
 
         button_layout = QHBoxLayout()
@@ -117,19 +140,9 @@ class ProductView(QWidget):
         button_layout.addWidget(self.clear_button)
         main_layout.addLayout(button_layout)
 
-        self.product_table = QTableWidget()
-        self.product_table.setColumnCount(7)
-        self.product_table.setHorizontalHeaderLabels(
-            [
-                "ID",
-                "Nom",
-                "Catégorie",
-                "Description",
-                "Prix Achat",
-                "Prix Vente",
-                "Stock",
-            ]
-        )
+        # Rows are served on demand by the model and fetched as the table scrolls
+        self.product_table = QTableView()
+        self.product_table.setModel(self.product_model)
         self.product_table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
         self.product_table.setSelectionBehavior(
             QAbstractItemView.SelectionBehavior.SelectRows
@@ -148,13 +161,34 @@ class ProductView(QWidget):
             6, QHeaderView.ResizeMode.ResizeToContents
         )
         self.product_table.setColumnHidden(3, True)
-        self.product_table.itemSelectionChanged.connect(self.on_row_selected)
+        self.product_table.selectionModel().selectionChanged.connect(
+            self.on_row_selected
+        )
 
         main_layout.addWidget(self.product_table)
         self.setLayout(main_layout)
 
+    def refresh_if_changed(self):
+        """Reloads categories and the (filtered) product table only if Products changed."""
+        if self.change_tracker.has_changed():
+            self.search_controller.clear_cache()
+            self.load_categories()
+            self.load_products()
+
     def load_categories(self):
-        """Loads unique categories into the filter dropdown and category input."""
+        """Loads unique categories into the filter dropdown and category input.
+
+        Read on the database pool from the shared catalogue, which is
+        reloaded there only if Products changed without an event.
+        """
+        self.loader.load(
+            "categories",
+            product_catalogue.current_categories,
+            self._show_categories,
+            self._on_categories_error,
+        )
+
+    def _show_categories(self, categories):
         current_filter = self.category_filter_combo.currentText()
         current_input = self.category_input.currentText() if self.category_input.currentText() else ""
         
@@ -170,7 +204,6 @@ class ProductView(QWidget):
         self.category_filter_combo.addItem("Toutes les catégories")
         
         try:
-            categories = get_all_categories()
             # Add categories to both combo boxes
             self.category_filter_combo.addItems(categories)
             self.category_input.addItems(categories)
@@ -186,130 +219,98 @@ class ProductView(QWidget):
             elif current_input:
                 self.category_input.setCurrentText(current_input)
                 
-        except Exception as e:
-            QMessageBox.warning(
-                self, "Erreur Catégories", f"Impossible de charger les catégories: {e}"
-            )
         finally:
             self.category_filter_combo.blockSignals(False)
             self.category_input.blockSignals(False)
 
-    def load_products(self, products_data=None):
-        """Loads product data into the table. If data is provided, uses it; otherwise, fetches all."""
-        self.product_table.setRowCount(0)
-        try:
-            if products_data is None:
-                products_data = get_all_products()
-
-            if products_data:
-                self.product_table.setRowCount(len(products_data))
-                for row_idx, product in enumerate(products_data):
-                    # ID
-                    self.product_table.setItem(
-                        row_idx, 0, QTableWidgetItem(str(product["id"]))
-                    )
-                    # Nom
-                    self.product_table.setItem(
-                        row_idx, 1, QTableWidgetItem(product["name"])
-                    )
-                    # Catégorie
-                    self.product_table.setItem(
-                        row_idx, 2, QTableWidgetItem(product["category"] or "")
-                    )
-                    # Description
-                    self.product_table.setItem(
-                        row_idx, 3, QTableWidgetItem(product["description"] or "")
-                    )
-                    # Prix d'achat
-                    self.product_table.setItem(
-                        row_idx,
-                        4,
-                        QTableWidgetItem(f"{product['purchase_price']:.2f} DA"),
-                    )
-                    # Prix de vente
-                    self.product_table.setItem(
-                        row_idx,
-                        5,
-                        QTableWidgetItem(f"{product['selling_price']:.2f} DA"),
-                    )
-                    # Stock
-                    stock_item = QTableWidgetItem(str(product["quantity_in_stock"]))
-                    self.product_table.setItem(row_idx, 6, stock_item)
-
-                    # Coloration des lignes selon le stock
-                    if product["quantity_in_stock"] == 0:
-                        color = Qt.GlobalColor.red
-                    elif product["quantity_in_stock"] <= 5:
-                        color = Qt.GlobalColor.yellow
-                    else:
-                        color = Qt.GlobalColor.white
-
-                    for col in range(7):
-                        item = self.product_table.item(row_idx, col)
-                        if item:
-                            item.setBackground(color)
-
-        except Exception as e:
-            QMessageBox.critical(
-                self, "Erreur", f"Erreur lors du chargement des produits: {e}"
-            )
+    def _on_categories_error(self, e):
+        QMessageBox.warning(
+            self, "Erreur Catégories", f"Impossible de charger les catégories: {e}"
+        )
 
-    def filter_products(self):
-        """Filters products based on search query and category selection."""
+    def _current_search_key(self):
         search_query = self.search_input.text().strip()
         category_filter = self.category_filter_combo.currentText()
         if category_filter == "Toutes les catégories":
             category_filter = None
+        return (search_query, category_filter)
+
+    def _search_first_batch(self, search_query, category_filter):
+        """Runs on the database thread pool: first batch of the table."""
+        return search_products(
+            search_query, category_filter, limit=self.product_model.batch_size
+        )
 
+    def load_products(self):
+        """Searches right away with the current filters (filter change, data reload)."""
+        self.search_controller.request(self._current_search_key(), immediate=True)
+
+    def on_search_results(self, key, rows):
+        """Shows the first batch of a search; further rows are fetched on scroll."""
         try:
-            filtered_data = search_products(search_query, category_filter)
-            self.load_products(filtered_data)
+            self.product_model.reset(partial(search_products, *key), first_rows=rows)
         except Exception as e:
             QMessageBox.critical(
-                self,
-                "Erreur Recherche",
-                f"Erreur lors de la recherche de produits: {e}",
+                self, "Erreur", f"Erreur lors du chargement des produits: {e}"
             )
 
+    def on_products_event(self, event):
+        """Updates the affected rows in place; a hidden view reloads when shown."""
+        if not self.isVisible():
+            return
+        if isinstance(event, ProductChanged):
+            # Name, category or membership may change: redo the filtered query.
+            self.refresh_if_changed()
+            return
+        # Only the rows already fetched by the model are refreshed.
+        self.product_model.update_rows(product_catalogue.get_many(product_ids_of(event)))
+
+    def filter_products(self):
+        """Searches once typing pauses, without blocking the interface."""
+        self.search_controller.request(self._current_search_key())
+
     def on_row_selected(self):
         """Populates the form when a table row is selected."""
-        selected_items = self.product_table.selectedItems()
-        if selected_items:
-            selected_row = self.product_table.currentRow()
-            
-            try:
-                # Get values from the table
-                product_id = self.product_table.item(selected_row, 0).text()  # ID
-                name = self.product_table.item(selected_row, 1).text()  # Name
-                category = self.product_table.item(selected_row, 2).text()  # Category
-                description = self.product_table.item(selected_row, 3).text()  # Description
-                purchase_price = self.product_table.item(selected_row, 4).text()  # Purchase Price
-                selling_price = self.product_table.item(selected_row, 5).text()  # Selling Price
-
-                # Set the values in the form
-                self.current_product_id = int(product_id)
-                self.name_input.setText(name)
-                self.category_input.setCurrentText(category)
-                self.description_input.setText(description)
-
-                # Process the prices
-                purchase_price_str = purchase_price.replace(" DA", "").replace(",", ".")
-                selling_price_str = selling_price.replace(" DA", "").replace(",", ".")
-                self.purchase_price_input.setValue(float(purchase_price_str))
-                self.selling_price_input.setValue(float(selling_price_str))
-
-                self.update_button.setEnabled(True)
-                self.delete_button.setEnabled(True)
-                self.add_button.setEnabled(False)
-            except (ValueError, AttributeError) as e:
-                QMessageBox.warning(
-                    self,
-                    "Erreur de Données",
-                    "Impossible de lire les données du produit sélectionné."
-                )
-                self.clear_form()
-        else:
+        selected_rows = self.product_table.selectionModel().selectedRows()
+        product = self.product_model.row_at(selected_rows[0].row()) if selected_rows else None
+        if product is None:
             self.clear_form()
+            return
+
+        model = self.product_model
+        self.current_product_id = product[model.ID]
+        self.name_input.setText(product[model.NAME])
+        self.category_input.setCurrentText(product[model.CATEGORY] or "")
+        self.description_input.setText(product[model.DESCRIPTION] or "")
+        self.purchase_price_input.setValue(product[model.PURCHASE_PRICE])
+        self.selling_price_input.setValue(product[model.SELLING_PRICE])
+        self.barcodes_input.clear()
+        # Update stays off until the barcodes are shown: saving an empty
+        # field would delete them.
+        self.update_button.setEnabled(False)
+        self.delete_button.setEnabled(True)
+        self.add_button.setEnabled(False)
+        product_id = self.current_product_id
+        self.loader.load(
+            "barcodes",
+            partial(get_product_barcodes, product_id),
+            partial(self._show_barcodes, product_id),
+            self._on_barcodes_error,
+        )
+
+    def _show_barcodes(self, product_id, barcodes):
+        if product_id != self.current_product_id:
+            return
+        self.barcodes_input.setText(", ".join(barcodes))
+        self.update_button.setEnabled(True)
+
+    def _on_barcodes_error(self, e):
+        QMessageBox.warning(
+            self, "Erreur Codes-barres", f"Impossible de charger les codes-barres: {e}"
+        )
+
+    def _barcodes_from_input(self):
+        return [code.strip() for code in self.barcodes_input.text().split(",") if code.strip()]
 
     def clear_form(self):
         """Clears the input fields and resets selection state."""
@@ -319,6 +320,8 @@ class ProductView(QWidget):
         self.category_input.setCurrentText("")
         self.purchase_price_input.setValue(0.0)
         self.selling_price_input.setValue(0.0)
+        self.barcodes_input.clear()
+        self.loader.cancel("barcodes")
         self.product_table.clearSelection()
         self.update_button.setEnabled(False)
         self.delete_button.setEnabled(False)
@@ -332,6 +335,7 @@ class ProductView(QWidget):
         description = self.description_input.toPlainText().strip()
         purchase_price = self.purchase_price_input.value()
         selling_price = self.selling_price_input.value()
+        barcodes = self._barcodes_from_input()
 
         # Validation des données
         if not name:
@@ -358,20 +362,20 @@ class ProductView(QWidget):
                 description=description,
                 purchase_price=purchase_price,
                 selling_price=selling_price,
-                initial_stock=0
+                initial_stock=0,
+                barcodes=barcodes,
             )
 
             if product_id:
                 self.clear_form()
-                self.load_products()
-                self.load_categories()
+                event_bus.publish(ProductChanged(product_id))
                 self.product_updated.emit()
                 QMessageBox.information(
                     self, "Succès", "Le produit a été ajouté avec succès."
                 )
             else:
                 QMessageBox.critical(
-                    self, "Erreur", "Impossible d'ajouter le produit. Vérifiez que le nom n'existe pas déjà."
+                    self, "Erreur", "Impossible d'ajouter le produit. Vérifiez que le nom et les codes-barres ne sont pas déjà utilisés."
                 )
         except Exception as e:
             QMessageBox.critical(
@@ -392,6 +396,7 @@ class ProductView(QWidget):
         description = self.description_input.toPlainText().strip()
         purchase_price = self.purchase_price_input.value()
         selling_price = self.selling_price_input.value()
+        barcodes = self._barcodes_from_input()
 
         # Validation des données
         if not name:
@@ -417,19 +422,19 @@ class ProductView(QWidget):
                 category=category,
                 description=description,
                 purchase_price=purchase_price,
-                selling_price=selling_price
+                selling_price=selling_price,
+                barcodes=barcodes,
             )
 
             if success:
-                self.load_products()
-                self.load_categories()
+                event_bus.publish(ProductChanged(self.current_product_id))
                 self.product_updated.emit()
                 QMessageBox.information(
                     self, "Succès", "Le produit a été modifié avec succès."
                 )
             else:
                 QMessageBox.critical(
-                    self, "Erreur", "Impossible de modifier le produit. Vérifiez que le nom n'existe pas déjà."
+                    self, "Erreur", "Impossible de modifier le produit. Vérifiez que le nom et les codes-barres ne sont pas déjà utilisés."
                 )
         except Exception as e:
             QMessageBox.critical(
@@ -454,14 +459,18 @@ class ProductView(QWidget):
 
         if reply == QMessageBox.StandardButton.Yes:
             try:
-                delete_product(self.current_product_id)
-                self.clear_form()
-                self.load_products()
-                self.load_categories()
-                self.product_updated.emit()  # Emit signal when product is deleted
-                QMessageBox.information(
-                    self, "Succès", "Le produit a été supprimé avec succès."
-                )
+                product_id = self.current_product_id
+                if delete_product(product_id):
+                    self.clear_form()
+                    event_bus.publish(ProductChanged(product_id, deleted=True))
+                    self.product_updated.emit()  # Emit signal when product is deleted
+                    QMessageBox.information(
+                        self, "Succès", "Le produit a été supprimé avec succès."
+                    )
+                else:
+                    QMessageBox.critical(
+                        self, "Erreur", "Impossible de supprimer le produit."
+                    )
             except Exception as e:
                 QMessageBox.critical(
                     self, "Erreur", f"Erreur lors de la suppression du produit: {e}"
@@ -15,7 +15,6 @@ from PyQt6.QtWidgets import (
     QMessageBox,
     QHeaderView,
     QAbstractItemView,
-    QComboBox,
     QSpinBox,
     QDoubleSpinBox,
     QLineEdit,
@@ -27,15 +26,31 @@ from PyQt6.QtWidgets import (
 # Importation des constantes et signaux depuis QtCore
 from PyQt6.QtCore import Qt, pyqtSignal
 
+# Pagination par curseur (date, id) de l'historique
+from views.pagination import KeysetPager
+
+# Lectures de la base exécutées hors du thread de l'interface
+from views.async_loader import AsyncLoader
+
+# Sélecteur de produit par recherche (seules les meilleures correspondances sont chargées)
+from views.pickers import ProductPicker
+
+# Bus d'événements métier partagé par les vues
+from events import event_bus, product_ids_of, PurchaseRecorded, ProductChanged, SaleRecorded
+
 # Import des fonctions liées à la base de données personnalisée
 from database.database import (
+    DataVersionTracker,      # Détection des changements de données
     add_purchase,            # Fonction pour ajouter un achat
-    get_purchase_history,    # Fonction pour récupérer l'historique des achats
-    get_all_products,        # Fonction pour récupérer tous les produits
+    get_purchase_page,       # Fonction pour récupérer une page de l'historique des achats
     add_product,             # Fonction pour ajouter un produit
     get_product_by_id,       # Fonction pour récupérer un produit par son ID
 )
 
+def product_with_stock(product):
+    """Texte d'un produit dans le sélecteur : nom et stock actuel"""
+    return f"{product['name']} (Stock: {product['quantity_in_stock']})"
+
 # Déclaration de la classe PurchaseView, qui hérite de QWidget
 class PurchaseView(QWidget):
     # Déclaration d'un signal émis lorsqu'un achat est enregistré
@@ -43,10 +58,15 @@ class PurchaseView(QWidget):
 
     def __init__(self):
         super().__init__()  # Appel au constructeur parent QWidget
-        self.products_data = {}  # Dictionnaire pour stocker les produits (nom -> id)
+        self.history_pager = KeysetPager(get_purchase_page, "purchase_date")  # Page courante de l'historique
+        self.change_tracker = DataVersionTracker("Products", "Purchases")  # Tables affichées par la vue
+        self.loader = AsyncLoader(self)  # Chargements en arrière-plan (QThreadPool)
         self.init_ui()  # Initialiser l'interface graphique
-        self.load_products_for_combo()  # Charger les produits dans la comboBox
-        self.load_purchase_history()  # Charger l'historique des achats
+        self.loader.loading_changed.connect(self.loading_label.setVisible)  # Indicateur de chargement
+        self.refresh_if_changed()  # Charger les produits et l'historique des achats
+        # Mise à jour ciblée lorsque le stock ou les produits changent ailleurs
+        for event_type in (PurchaseRecorded, ProductChanged, SaleRecorded):
+            event_bus.subscribe(event_type, self.on_products_event)
 
     def init_ui(self):
         main_layout = QVBoxLayout(self)  # Layout vertical principal
@@ -62,7 +82,9 @@ class PurchaseView(QWidget):
         form_layout = QGridLayout(form_widget)  # Disposition en grille
 
         form_layout.addWidget(QLabel("Produit*:"), 0, 0)  # Label produit
-        self.product_combo = QComboBox()  # ComboBox pour les produits
+        self.product_combo = ProductPicker(
+            "Rechercher un produit...", item_text=product_with_stock
+        )  # Recherche au fil de la saisie
         form_layout.addWidget(self.product_combo, 0, 1)  # Ajout au layout
 
         form_layout.addWidget(QLabel("Quantité*:"), 0, 2)  # Label quantité
@@ -100,6 +122,11 @@ class PurchaseView(QWidget):
         )  # Style
         main_layout.addWidget(history_title)  # Ajout du titre
 
+        self.loading_label = QLabel("Chargement...")  # Visible pendant un chargement
+        self.loading_label.setStyleSheet("color: #7f8c8d; font-style: italic;")
+        self.loading_label.setVisible(False)
+        main_layout.addWidget(self.loading_label)
+
         self.history_table = QTableWidget()  # Table pour afficher les achats
         self.history_table.setColumnCount(6)  # Nombre de colonnes
         self.history_table.setHorizontalHeaderLabels(
@@ -126,75 +153,113 @@ class PurchaseView(QWidget):
         self.refresh_button = QPushButton("Rafraîchir l'Historique")  # Bouton refresh
         self.refresh_button.clicked.connect(self.load_purchase_history)  # Action
         refresh_layout = QHBoxLayout()  # Layout horizontal
+        self.previous_page_button = QPushButton("◀ Précédent")  # Page plus récente
+        self.previous_page_button.setEnabled(False)
+        self.previous_page_button.clicked.connect(self.load_previous_history_page)
+        self.history_page_label = QLabel("Page 1")  # Numéro de page
+        self.next_page_button = QPushButton("Suivant ▶")  # Page plus ancienne
+        self.next_page_button.setEnabled(False)
+        self.next_page_button.clicked.connect(self.load_next_history_page)
+        refresh_layout.addWidget(self.previous_page_button)
+        refresh_layout.addWidget(self.history_page_label)
+        refresh_layout.addWidget(self.next_page_button)
         refresh_layout.addStretch()  # Espacement à gauche
         refresh_layout.addWidget(self.refresh_button)  # Ajout du bouton
         main_layout.addLayout(refresh_layout)  # Ajout au layout principal
 
         self.setLayout(main_layout)  # Appliquer le layout à la fenêtre
 
-    def load_products_for_combo(self):
-        """Charge les produits dans la comboBox"""
-        self.product_combo.clear()  # Vider la comboBox
-        self.products_data.clear()  # Vider le dictionnaire
-        self.product_combo.addItem("Sélectionner un produit...", -1)  # Élément par défaut
-        try:
-            products = get_all_products()  # Récupérer produits depuis DB
-            if products:
-                for product in products:
-                    display_text = (
-                        f"{product['name']} (Stock: {product['quantity_in_stock']})"
-                    )  # Texte affiché
-                    self.product_combo.addItem(display_text, product["id"])  # Ajout à la comboBox
-                    self.products_data[display_text] = product["id"]  # Stockage dans dictionnaire
-        except Exception as e:
-            QMessageBox.critical(
-                self,
-                "Erreur Produits",
-                f"Impossible de charger la liste des produits: {e}",  # Affichage de l'erreur
-            )
+    def refresh_if_changed(self):
+        """Recharge la vue uniquement si les produits ou les achats ont changé"""
+        if self.change_tracker.has_changed():
+            self.product_combo.refresh()  # Relancer la recherche en cours
+            self.load_purchase_history()
+
+    def on_products_event(self, event):
+        """Met à jour uniquement les produits concernés ; masquée, la vue se rechargera à l'affichage"""
+        if not self.isVisible():
+            return
+        self.product_combo.update_products(product_ids_of(event))  # Stock affiché à jour
+        if isinstance(event, PurchaseRecorded):
+            self.load_purchase_history()
 
     def load_purchase_history(self):
-        """Charge l'historique des achats dans la table"""
+        """Charge la page la plus récente de l'historique des achats"""
+        pager = self.history_pager
+        self._load_history_page(pager.request_first(), pager.show_first)
+
+    def load_next_history_page(self):
+        """Charge la page suivante (achats plus anciens)"""
+        pager = self.history_pager
+        self._load_history_page(pager.request_next(), pager.show_next)
+
+    def load_previous_history_page(self):
+        """Charge la page précédente (achats plus récents)"""
+        pager = self.history_pager
+        self._load_history_page(pager.request_previous(), pager.show_previous)
+
+    def _load_history_page(self, request, show):
+        """Exécute la requête de page en arrière-plan puis affiche la page"""
+        if request is None:  # Pas de page dans cette direction
+            return
+        self.previous_page_button.setEnabled(False)  # Pas de navigation pendant le chargement
+        self.next_page_button.setEnabled(False)
+        self.loader.load(
+            "history",
+            request,
+            lambda rows: self._show_history_page(show(rows)),
+            self._on_history_error,
+        )
+
+    def _on_history_error(self, e):
+        QMessageBox.critical(
+            self,
+            "Erreur Historique",
+            f"Impossible de charger l'historique des achats: {e}",  # Affichage erreur
+        )
+        self._update_pager_controls()
+
+    def _update_pager_controls(self):
+        """Mise à jour des boutons de navigation"""
+        self.previous_page_button.setEnabled(self.history_pager.has_previous)
+        self.next_page_button.setEnabled(self.history_pager.has_next)
+        self.history_page_label.setText(f"Page {self.history_pager.page_number}")
+
+    def _show_history_page(self, history):
+        """Affiche une page de l'historique dans la table"""
         self.history_table.setRowCount(0)  # Vider la table
-        try:
-            history = get_purchase_history()  # Récupérer l'historique
-            if history:
-                self.history_table.setRowCount(len(history))  # Définir nombre de lignes
-                for row_idx, purchase in enumerate(history):  # Pour chaque achat
-                    self.history_table.setItem(
-                        row_idx, 0, QTableWidgetItem(str(purchase["id"]))
-                    )  # ID
-
-                    date_str = purchase["purchase_date"]  # Date au format string
-                    try:
-                        dt_obj = datetime.datetime.fromisoformat(date_str)  # Convertir
-                        display_date = dt_obj.strftime("%Y-%m-%d %H:%M")  # Reformater
-                    except ValueError:
-                        display_date = date_str  # Si erreur, afficher brut
-                    self.history_table.setItem(
-                        row_idx, 1, QTableWidgetItem(display_date)
-                    )  # Date
-
-                    self.history_table.setItem(
-                        row_idx, 2, QTableWidgetItem(purchase["product_name"])
-                    )  # Produit
-                    self.history_table.setItem(
-                        row_idx, 3, QTableWidgetItem(str(purchase["quantity"]))
-                    )  # Quantité
-                    self.history_table.setItem(
-                        row_idx,
-                        4,
-                        QTableWidgetItem(f"{purchase['cost_per_unit']:.2f} €"),
-                    )  # Coût
-                    self.history_table.setItem(
-                        row_idx, 5, QTableWidgetItem(purchase["supplier"] or "")
-                    )  # Fournisseur
-        except Exception as e:
-            QMessageBox.critical(
-                self,
-                "Erreur Historique",
-                f"Impossible de charger l'historique des achats: {e}",  # Affichage erreur
-            )
+        if history:
+            self.history_table.setRowCount(len(history))  # Définir nombre de lignes
+            for row_idx, purchase in enumerate(history):  # Pour chaque achat
+                self.history_table.setItem(
+                    row_idx, 0, QTableWidgetItem(str(purchase["id"]))
+                )  # ID
+
+                date_str = purchase["purchase_date"]  # Date au format string
+                try:
+                    dt_obj = datetime.datetime.fromisoformat(date_str)  # Convertir
+                    display_date = dt_obj.strftime("%Y-%m-%d %H:%M")  # Reformater
+                except ValueError:
+                    display_date = date_str  # Si erreur, afficher brut
+                self.history_table.setItem(
+                    row_idx, 1, QTableWidgetItem(display_date)
+                )  # Date
+
+                self.history_table.setItem(
+                    row_idx, 2, QTableWidgetItem(purchase["product_name"])
+                )  # Produit
+                self.history_table.setItem(
+                    row_idx, 3, QTableWidgetItem(str(purchase["quantity"]))
+                )  # Quantité
+                self.history_table.setItem(
+                    row_idx,
+                    4,
+                    QTableWidgetItem(f"{purchase['cost_per_unit']:.2f} €"),
+                )  # Coût
+                self.history_table.setItem(
+                    row_idx, 5, QTableWidgetItem(purchase["supplier"] or "")
+                )  # Fournisseur
+        self._update_pager_controls()
 
     def add_new_purchase(self):
         """Enregistre un nouvel achat"""
@@ -223,8 +288,8 @@ class PurchaseView(QWidget):
                 self, "Succès", f"Achat pour le produit ID {product_id} enregistré."
             )
 
-            self.load_purchase_history()  # Rafraîchir l'historique
-            self.load_products_for_combo()  # Mettre à jour les stocks
+            # Publier l'événement : les vues concernées se mettent à jour
+            event_bus.publish(PurchaseRecorded(new_purchase_id, product_id))
 
             # Réinitialiser le formulaire
             self.product_combo.setCurrentIndex(0)
@@ -238,7 +303,7 @@ class PurchaseView(QWidget):
 
 # Point d'entrée principal
 if __name__ == "__main__":
-    from database.database import initialize_database
+    from database.database import initialize_database, get_all_products
 
     initialize_database()  # Crée les tables si besoin
 
@@ -1,5 +1,7 @@
 import sys
 import datetime
+import itertools
+from functools import partial
 from PyQt6.QtWidgets import (
     QWidget,
     QVBoxLayout,
@@ -11,7 +13,7 @@ from PyQt6.QtWidgets import (
     QMessageBox,
     QHeaderView,
     QAbstractItemView,
-    QComboBox,
+    QLineEdit,
     QSpinBox,
     QDoubleSpinBox,
     QGridLayout,
@@ -24,14 +26,27 @@ from PyQt6.QtWidgets import (
 from PyQt6.QtCore import Qt, pyqtSignal
 from PyQt6.QtGui import QFont
 
+from events import (
+    event_bus,
+    product_ids_of,
+    SaleRecorded,
+    PurchaseRecorded,
+    ProductChanged,
+    CustomerChanged,
+)
+from catalogue import product_catalogue
+from views.async_loader import AsyncLoader
+from views.pagination import KeysetPager
+from views.pickers import CustomerPicker, ProductPicker
 from database.database import (
+    DataVersionTracker,
     add_sale,
-    get_sales_history,
+    get_sales_page,
     get_sale_items,
-    get_all_products,
     get_all_customers,
     get_product_by_id,
-    get_db_connection,
+    get_sale_header,
+    find_product_by_barcode,
     add_product,
     add_customer,
 )
@@ -43,12 +58,20 @@ class SaleView(QWidget):
 
     def __init__(self):
         super().__init__()
-        self.products_cache = {}
-        self.customers_cache = {}
         self.current_sale_items = []
         self.selected_sale_id_for_details = None
+        self.history_pager = KeysetPager(get_sales_page, "sale_date")
+        self.products_tracker = DataVersionTracker("Products")
+        self.customers_tracker = DataVersionTracker("Customers")
+        self.history_tracker = DataVersionTracker("Sales", "Customers")
+        self.loader = AsyncLoader(self)
+        self._scan_ids = itertools.count()  # Each scan is its own load: none cancels another
         self.init_ui()
-        self.load_initial_data()
+        self.loader.loading_changed.connect(self.loading_label.setVisible)
+        self.refresh_if_changed()
+        for event_type in (SaleRecorded, PurchaseRecorded, ProductChanged):
+            event_bus.subscribe(event_type, self.on_products_event)
+        event_bus.subscribe(CustomerChanged, self.on_customers_event)
 
     def init_ui(self):
         main_layout = QHBoxLayout(self)
@@ -58,13 +81,27 @@ class SaleView(QWidget):
 
         customer_layout = QHBoxLayout()
         customer_layout.addWidget(QLabel("Client:"))
-        self.customer_combo = QComboBox()
+        self.customer_combo = CustomerPicker(
+            "Vente anonyme (ou rechercher: nom, téléphone, email)"
+        )
         customer_layout.addWidget(self.customer_combo)
         new_sale_layout.addLayout(customer_layout)
 
+        scan_layout = QHBoxLayout()
+        scan_layout.addWidget(QLabel("Scanner:"))
+        self.scan_input = QLineEdit()
+        self.scan_input.setPlaceholderText("Code-barres ou SKU, puis Entrée")
+        self.scan_input.returnPressed.connect(self.scan_barcode)
+        scan_layout.addWidget(self.scan_input)
+        self.scan_status_label = QLabel("")
+        scan_layout.addWidget(self.scan_status_label)
+        new_sale_layout.addLayout(scan_layout)
+
         add_item_layout = QGridLayout()
         add_item_layout.addWidget(QLabel("Produit:"), 0, 0)
-        self.product_combo = QComboBox()
+        self.product_combo = ProductPicker(
+            "Rechercher un produit (nom, catégorie...)", in_stock_only=True
+        )
         self.product_combo.currentIndexChanged.connect(
             self.update_price_and_stock_display
         )
@@ -164,6 +201,11 @@ class SaleView(QWidget):
         history_group = QGroupBox("Historique des Ventes")
         history_layout = QVBoxLayout()
 
+        self.loading_label = QLabel("Chargement...")
+        self.loading_label.setStyleSheet("color: #7f8c8d; font-style: italic;")
+        self.loading_label.setVisible(False)
+        history_layout.addWidget(self.loading_label)
+
         self.history_table = QTableWidget()
         self.history_table.setColumnCount(4)
         self.history_table.setHorizontalHeaderLabels(
@@ -189,6 +231,17 @@ class SaleView(QWidget):
         history_layout.addWidget(self.history_table)
 
         history_button_layout = QHBoxLayout()
+        self.previous_page_button = QPushButton("◀ Précédent")
+        self.previous_page_button.setEnabled(False)
+        self.previous_page_button.clicked.connect(self.load_previous_history_page)
+        self.history_page_label = QLabel("Page 1")
+        self.next_page_button = QPushButton("Suivant ▶")
+        self.next_page_button.setEnabled(False)
+        self.next_page_button.clicked.connect(self.load_next_history_page)
+        history_button_layout.addWidget(self.previous_page_button)
+        history_button_layout.addWidget(self.history_page_label)
+        history_button_layout.addWidget(self.next_page_button)
+
         self.view_details_button = QPushButton("Voir Détails Vente")
         self.view_details_button.setEnabled(False)
         self.view_details_button.clicked.connect(self.show_sale_details_dialog)
@@ -209,57 +262,48 @@ class SaleView(QWidget):
 
         self.setLayout(main_layout)
 
-    def load_initial_data(self):
-
-        self.load_products_for_sale()
-        self.load_customers_for_sale()
-        self.load_sales_history()
-
-    def load_products_for_sale(self):
+    def refresh_if_changed(self):
+        """Reloads only the lists whose underlying tables changed."""
+        if self.products_tracker.has_changed():
+            self.product_combo.refresh()
+        if self.customers_tracker.has_changed():
+            self.customer_combo.refresh()
+        if self.history_tracker.has_changed():
+            self.load_sales_history()
+
+    def on_products_event(self, event):
+        """Updates only the affected products; hidden, the view reloads when shown."""
+        if not self.isVisible():
+            return
+        self.product_combo.update_products(product_ids_of(event))
+        self.update_price_and_stock_display()
+        if isinstance(event, SaleRecorded):
+            self.load_sales_history()
 
-        self.product_combo.clear()
-        self.products_cache.clear()
-        self.product_combo.addItem("Sélectionner un produit...", -1)
-        try:
-            products = get_all_products()
-            if products:
-                for product in products:
-                    if product["quantity_in_stock"] > 0:
-                        self.product_combo.addItem(product["name"], product["id"])
-                        self.products_cache[product["id"]] = {
-                            "name": product["name"],
-                            "price": product["selling_price"],
-                            "stock": product["quantity_in_stock"],
-                        }
-            self.update_price_and_stock_display()
-        except Exception as e:
-            QMessageBox.critical(
-                self, "Erreur Produits", f"Impossible de charger les produits: {e}"
-            )
+    def on_customers_event(self, event):
+        if self.isVisible():
+            self.refresh_if_changed()
 
-    def load_customers_for_sale(self):
+    def _product_info(self, product_id):
+        """Name, price and stock of a product in stock, from the shared catalogue."""
+        return self._sale_info(product_catalogue.get(product_id))
 
-        self.customer_combo.clear()
-        self.customers_cache.clear()
-        self.customer_combo.addItem("Vente Anonyme", -1)
-        try:
-            customers = get_all_customers()
-            if customers:
-                for customer in customers:
-                    self.customer_combo.addItem(customer["name"], customer["id"])
-                    self.customers_cache[customer["id"]] = customer["name"]
-        except Exception as e:
-            QMessageBox.critical(
-                self, "Erreur Clients", f"Impossible de charger les clients: {e}"
-            )
+    def _sale_info(self, product):
+        if product is None or product["quantity_in_stock"] <= 0:
+            return None
+        return {
+            "name": product["name"],
+            "price": product["selling_price"],
+            "stock": product["quantity_in_stock"],
+        }
 
     def update_price_and_stock_display(self):
 
         selected_index = self.product_combo.currentIndex()
         if selected_index > 0:
             product_id = self.product_combo.itemData(selected_index)
-            if product_id in self.products_cache:
-                product_info = self.products_cache[product_id]
+            product_info = self._product_info(product_id)
+            if product_info is not None:
                 self.price_display_label.setText(
                     f"Prix Unit.: {product_info['price']:.2f} DA"
                 )
@@ -291,57 +335,98 @@ class SaleView(QWidget):
         product_id = self.product_combo.itemData(selected_product_index)
         quantity = self.quantity_spinbox.value()
 
-        if product_id in self.products_cache:
-            product_info = self.products_cache[product_id]
-
-            current_cart_qty = sum(
-                item["quantity"]
-                for item in self.current_sale_items
-                if item["product_id"] == product_id
+        product_info = self._product_info(product_id)
+        if product_info is None:
+            QMessageBox.critical(
+                self, "Erreur", "Produit sélectionné non trouvé dans le cache."
             )
-            if quantity + current_cart_qty > product_info["stock"]:
-                QMessageBox.warning(
-                    self,
-                    "Stock Insuffisant",
-                    f"Stock disponible pour '{product_info['name']}': {product_info['stock']}. "
-                    f"Quantité demandée ({quantity}) + déjà au panier ({current_cart_qty}) dépasse le stock.",
-                )
-                return
+            return
 
-            existing_item_index = -1
-            for i, item in enumerate(self.current_sale_items):
-                if item["product_id"] == product_id:
-                    existing_item_index = i
-                    break
+        error = self._add_to_cart(product_id, quantity, product_info)
+        if error:
+            QMessageBox.warning(self, "Stock Insuffisant", error)
+            return
 
-            if existing_item_index != -1:
+        self.product_combo.setCurrentIndex(0)
+        self.quantity_spinbox.setValue(1)
 
-                self.current_sale_items[existing_item_index]["quantity"] += quantity
-                self.current_sale_items[existing_item_index]["subtotal"] = (
-                    self.current_sale_items[existing_item_index]["quantity"]
-                    * product_info["price"]
-                )
-            else:
+    def scan_barcode(self):
+        """Adds one unit of the scanned product to the cart, without a dialog.
 
-                sale_item = {
-                    "product_id": product_id,
-                    "name": product_info["name"],
-                    "quantity": quantity,
-                    "price_at_sale": product_info["price"],
-                    "subtotal": quantity * product_info["price"],
-                }
-                self.current_sale_items.append(sale_item)
+        The barcode is looked up on the database pool, so a scan never
+        waits on the database lock in the GUI thread.
+        """
+        code = self.scan_input.text().strip()
+        self.scan_input.clear()
+        if not code:
+            return
 
-            self.refresh_current_sale_table()
-            self.update_total()
+        self.loader.load(
+            f"scan-{next(self._scan_ids)}",
+            partial(find_product_by_barcode, code),
+            partial(self._on_scanned_product, code),
+            lambda e: self._show_scan_status(f"Erreur de lecture: {e}", error=True),
+        )
 
-            self.product_combo.setCurrentIndex(0)
-            self.quantity_spinbox.setValue(1)
+    def _on_scanned_product(self, code, product):
+        if product is None:
+            self._show_scan_status(f"Code inconnu: {code}", error=True)
+            return
+        product_info = self._sale_info(product)
+        if product_info is None:
+            self._show_scan_status(f"Rupture de stock: {product['name']}", error=True)
+            return
 
+        error = self._add_to_cart(product["id"], 1, product_info)
+        if error:
+            self._show_scan_status(error, error=True)
         else:
-            QMessageBox.critical(
-                self, "Erreur", "Produit sélectionné non trouvé dans le cache."
+            self._show_scan_status(f"+1 {product_info['name']}")
+
+    def _show_scan_status(self, text, error=False):
+        self.scan_status_label.setStyleSheet("color: red;" if error else "color: green;")
+        self.scan_status_label.setText(text)
+
+    def _add_to_cart(self, product_id, quantity, product_info):
+        """Adds `quantity` of a product to the cart; returns an error message if the stock is short."""
+        current_cart_qty = sum(
+            item["quantity"]
+            for item in self.current_sale_items
+            if item["product_id"] == product_id
+        )
+        if quantity + current_cart_qty > product_info["stock"]:
+            return (
+                f"Stock disponible pour '{product_info['name']}': {product_info['stock']}. "
+                f"Quantité demandée ({quantity}) + déjà au panier ({current_cart_qty}) dépasse le stock."
+            )
+
+        existing_item_index = -1
+        for i, item in enumerate(self.current_sale_items):
+            if item["product_id"] == product_id:
+                existing_item_index = i
+                break
+
+        if existing_item_index != -1:
+
+            self.current_sale_items[existing_item_index]["quantity"] += quantity
+            self.current_sale_items[existing_item_index]["subtotal"] = (
+                self.current_sale_items[existing_item_index]["quantity"]
+                * product_info["price"]
             )
+        else:
+
+            sale_item = {
+                "product_id": product_id,
+                "name": product_info["name"],
+                "quantity": quantity,
+                "price_at_sale": product_info["price"],
+                "subtotal": quantity * product_info["price"],
+            }
+            self.current_sale_items.append(sale_item)
+
+        self.refresh_current_sale_table()
+        self.update_total()
+        return None
 
     def refresh_current_sale_table(self):
 
@@ -389,6 +474,7 @@ class SaleView(QWidget):
         self.customer_combo.setCurrentIndex(0)
         self.product_combo.setCurrentIndex(0)
         self.quantity_spinbox.setValue(1)
+        self.scan_status_label.clear()
 
     def finalize_current_sale(self):
 
@@ -415,7 +501,11 @@ class SaleView(QWidget):
         ]
 
         total = sum(item["subtotal"] for item in self.current_sale_items)
-        customer_name = self.customer_combo.currentText()
+        customer_name = (
+            self.customer_combo.itemText(selected_customer_index)
+            if customer_id is not None
+            else "Vente Anonyme"
+        )
         item_count = len(self.current_sale_items)
         confirm_msg = f"Confirmer la vente ?\n\nClient: {customer_name}\nNombre d'articles: {item_count}\nMontant Total: {total:.2f} DA"
 
@@ -434,8 +524,12 @@ class SaleView(QWidget):
                     self, "Succès", f"Vente ID {sale_id} enregistrée avec succès."
                 )
                 self.clear_current_sale()
-                self.load_sales_history()
-                self.load_products_for_sale()
+                event_bus.publish(
+                    SaleRecorded(
+                        sale_id,
+                        tuple(dict.fromkeys(item["product_id"] for item in items_for_db)),
+                    )
+                )
                 self.sale_recorded.emit()
 
             else:
@@ -446,39 +540,71 @@ class SaleView(QWidget):
                 )
 
     def load_sales_history(self):
+        """Loads the newest page of the sales history."""
+        pager = self.history_pager
+        self._load_history_page(pager.request_first(), pager.show_first)
+
+    def load_next_history_page(self):
+        pager = self.history_pager
+        self._load_history_page(pager.request_next(), pager.show_next)
+
+    def load_previous_history_page(self):
+        pager = self.history_pager
+        self._load_history_page(pager.request_previous(), pager.show_previous)
+
+    def _load_history_page(self, request, show):
+        """Runs a pager query off the GUI thread, then shows the page."""
+        if request is None:
+            return
+        self.previous_page_button.setEnabled(False)
+        self.next_page_button.setEnabled(False)
+        self.loader.load(
+            "history",
+            request,
+            lambda rows: self._show_history_page(show(rows)),
+            self._on_history_error,
+        )
+
+    def _on_history_error(self, e):
+        QMessageBox.critical(
+            self,
+            "Erreur Historique",
+            f"Impossible de charger l'historique des ventes: {e}",
+        )
+        self._update_pager_controls()
+
+    def _update_pager_controls(self):
+        self.previous_page_button.setEnabled(self.history_pager.has_previous)
+        self.next_page_button.setEnabled(self.history_pager.has_next)
+        self.history_page_label.setText(f"Page {self.history_pager.page_number}")
+
+    def _show_history_page(self, history):
 
         self.history_table.setRowCount(0)
         self.selected_sale_id_for_details = None
         self.view_details_button.setEnabled(False)
-        try:
-            history = get_sales_history()
-            if history:
-                self.history_table.setRowCount(len(history))
-                for row_idx, sale in enumerate(history):
-                    self.history_table.setItem(
-                        row_idx, 0, QTableWidgetItem(str(sale["id"]))
-                    )
-                    date_str = sale["sale_date"]
-                    try:
-                        dt_obj = datetime.datetime.fromisoformat(date_str)
-                        display_date = dt_obj.strftime("%Y-%m-%d %H:%M")
-                    except ValueError:
-                        display_date = date_str
-                    self.history_table.setItem(
-                        row_idx, 1, QTableWidgetItem(display_date)
-                    )
-                    self.history_table.setItem(
-                        row_idx, 2, QTableWidgetItem(sale["customer_name"] or "Anonyme")
-                    )
-                    self.history_table.setItem(
-                        row_idx, 3, QTableWidgetItem(f"{sale['total_amount']:.2f} DA")
-                    )
-        except Exception as e:
-            QMessageBox.critical(
-                self,
-                "Erreur Historique",
-                f"Impossible de charger l'historique des ventes: {e}",
-            )
+        if history:
+            self.history_table.setRowCount(len(history))
+            for row_idx, sale in enumerate(history):
+                self.history_table.setItem(
+                    row_idx, 0, QTableWidgetItem(str(sale["id"]))
+                )
+                date_str = sale["sale_date"]
+                try:
+                    dt_obj = datetime.datetime.fromisoformat(date_str)
+                    display_date = dt_obj.strftime("%Y-%m-%d %H:%M")
+                except ValueError:
+                    display_date = date_str
+                self.history_table.setItem(
+                    row_idx, 1, QTableWidgetItem(display_date)
+                )
+                self.history_table.setItem(
+                    row_idx, 2, QTableWidgetItem(sale["customer_name"] or "Anonyme")
+                )
+                self.history_table.setItem(
+                    row_idx, 3, QTableWidgetItem(f"{sale['total_amount']:.2f} DA")
+                )
+        self._update_pager_controls()
 
     def on_history_row_selected(self):
 
@@ -508,18 +634,17 @@ class SaleView(QWidget):
             )
 
         if self.selected_sale_id_for_details is not None:
-            try:
-                items = get_sale_items(self.selected_sale_id_for_details)
-                dialog = SaleDetailsDialog(
-                    self.selected_sale_id_for_details, items, self
-                )
-                dialog.exec()
-            except Exception as e:
-                QMessageBox.critical(
+            sale_id = self.selected_sale_id_for_details
+            self.loader.load(
+                "details",
+                partial(get_sale_items, sale_id),
+                lambda items: SaleDetailsDialog(sale_id, items, self).exec(),
+                lambda e: QMessageBox.critical(
                     self,
                     "Erreur Détails",
                     f"Impossible de charger les détails de la vente: {e}",
-                )
+                ),
+            )
 
     def show_receipt_dialog(self):
 
@@ -533,60 +658,46 @@ class SaleView(QWidget):
             )
 
         if self.selected_sale_id_for_details is not None:
-            try:
-                receipt_text = self.generate_receipt_text(
-                    self.selected_sale_id_for_details
-                )
-                if receipt_text:
-                    dialog = ReceiptDialog(
-                        self.selected_sale_id_for_details, receipt_text, self
-                    )
-                    dialog.exec()
-                else:
-                    QMessageBox.warning(
-                        self,
-                        "Erreur Ticket",
-                        "Impossible de générer les données du ticket.",
-                    )
-            except Exception as e:
-                QMessageBox.critical(
+            # The ticket is read and formatted on the database pool
+            sale_id = self.selected_sale_id_for_details
+            self.loader.load(
+                "receipt",
+                partial(self.generate_receipt_text, sale_id),
+                partial(self._show_receipt, sale_id),
+                lambda e: QMessageBox.critical(
                     self,
                     "Erreur Ticket",
                     f"Erreur lors de la génération du ticket: {e}",
-                )
+                ),
+            )
+
+    def _show_receipt(self, sale_id, receipt_text):
+        if receipt_text:
+            ReceiptDialog(sale_id, receipt_text, self).exec()
+        else:
+            QMessageBox.warning(
+                self,
+                "Erreur Ticket",
+                "Impossible de générer les données du ticket.",
+            )
 
     def generate_receipt_text(self, sale_id):
+        """Reads a sale and returns its ticket text, or None; runs on the database pool."""
 
         try:
 
-            conn = get_db_connection()
-            cursor = conn.cursor()
-            cursor.execute(
-                "SELECT sale_date, customer_id, total_amount FROM Sales WHERE id = ?",
-                (sale_id,),
-            )
-            sale_header = cursor.fetchone()
-            conn.close()
+            sale_header = get_sale_header(sale_id)
 
             if not sale_header:
                 return None
 
             customer_info = "Client: Anonyme"
-            if sale_header["customer_id"]:
-                conn = get_db_connection()
-                cursor = conn.cursor()
-                cursor.execute(
-                    "SELECT name, address, phone FROM Customers WHERE id = ?",
-                    (sale_header["customer_id"],),
-                )
-                cust = cursor.fetchone()
-                conn.close()
-                if cust:
-                    customer_info = f"Client: {cust['name']}\n"
-                    if cust["address"]:
-                        customer_info += f"Adresse: {cust['address']}\n"
-                    if cust["phone"]:
-                        customer_info += f"Tél: {cust['phone']}"
+            if sale_header["customer_name"] is not None:
+                customer_info = f"Client: {sale_header['customer_name']}\n"
+                if sale_header["customer_address"]:
+                    customer_info += f"Adresse: {sale_header['customer_address']}\n"
+                if sale_header["customer_phone"]:
+                    customer_info += f"Tél: {sale_header['customer_phone']}"
 
             items = get_sale_items(sale_id)
             if not items:
@@ -702,7 +813,7 @@ class ReceiptDialog(QDialog):
 
 
 if __name__ == "__main__":
-    from database.database import initialize_database
+    from database.database import initialize_database, get_all_products
     from PyQt6.QtWidgets import QApplication
 
     initialize_database()
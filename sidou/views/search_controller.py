@@ -0,0 +1,80 @@
+import time
+from collections import OrderedDict
+from functools import partial
+
+from PyQt6.QtCore import QObject, QTimer, pyqtSignal
+
+from views.async_loader import AsyncLoader
+
+
+class SearchController(QObject):
+    """Debounces search input and runs the query on the shared database pool.
+
+    request() restarts the debounce timer; the query then runs through an
+    AsyncLoader, so a newer request cancels the previous one (its result is
+    dropped and its running statement interrupted). The last `cache_size`
+    results are kept by key. results_ready(key, rows) is emitted on the GUI
+    thread, only for the latest request; a failed search is printed and the
+    next request runs as usual.
+    """
+
+    results_ready = pyqtSignal(object, object)
+
+    def __init__(self, search, debounce_ms=250, cache_size=32, parent=None):
+        super().__init__(parent)
+        self.search = search
+        self.cache_size = cache_size
+        self.last_latency = None  # Seconds between the last submission and its result
+        self._cache = OrderedDict()
+        self._pending_key = None
+        self._debounce_timer = QTimer(self)
+        self._debounce_timer.setSingleShot(True)
+        self._debounce_timer.setInterval(debounce_ms)
+        self._debounce_timer.timeout.connect(self._submit_pending)
+        self.loader = AsyncLoader(self)
+
+    def request(self, key, immediate=False):
+        """Searches for `key` once typing pauses (or right away when `immediate`)."""
+        self._pending_key = key
+        if immediate:
+            self._debounce_timer.stop()
+            self._submit_pending()
+        else:
+            self._debounce_timer.start()
+
+    def clear_cache(self):
+        """Forgets the cached results, e.g. after the searched data changed."""
+        self._cache.clear()
+
+    def stop(self):
+        self._debounce_timer.stop()
+        self.loader.cancel()
+
+    def _submit_pending(self):
+        key, self._pending_key = self._pending_key, None
+        if key is None:
+            return
+        if key in self._cache:
+            # An older search still running must not overwrite this result.
+            self.loader.cancel("search")
+            self._cache.move_to_end(key)
+            self.last_latency = 0.0
+            self.results_ready.emit(key, self._cache[key])
+            return
+        self.loader.load(
+            "search",
+            partial(self.search, *key),
+            partial(self._on_result, key, time.perf_counter()),
+            partial(self._on_error, key),
+        )
+
+    def _on_result(self, key, submitted_at, rows):
+        self._cache[key] = rows
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        self.last_latency = time.perf_counter() - submitted_at
+        self.results_ready.emit(key, rows)
+
+    def _on_error(self, key, error):
+        print(f"Search {key!r} failed: {error}")
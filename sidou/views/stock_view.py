@@ -6,8 +6,7 @@ from PyQt6.QtWidgets import (
     QLabel,
     QLineEdit,
     QPushButton,
-    QTableWidget,
-    QTableWidgetItem,
+    QTableView,
     QMessageBox,
     QHeaderView,
     QAbstractItemView,
@@ -16,10 +15,24 @@ from PyQt6.QtWidgets import (
     QApplication,
 )
 from PyQt6.QtCore import Qt
-from PyQt6.QtGui import QColor
-
-
-from database.database import search_products, get_all_categories
+from functools import partial
+
+from views.async_loader import AsyncLoader
+from views.search_controller import SearchController
+from views.table_models import StockTableModel
+
+from catalogue import product_catalogue
+from events import (
+    event_bus,
+    product_ids_of,
+    ProductChanged,
+    PurchaseRecorded,
+    SaleRecorded,
+)
+from database.database import (
+    DataVersionTracker,
+    search_products,
+)
 
 LOW_STOCK_THRESHOLD = 5
 
@@ -27,9 +40,16 @@ LOW_STOCK_THRESHOLD = 5
 class StockView(QWidget):
     def __init__(self):
         super().__init__()
+        self.change_tracker = DataVersionTracker("Products")
+        self.stock_model = StockTableModel(LOW_STOCK_THRESHOLD)
+        self.loader = AsyncLoader(self)  # Categories load on the database pool
+        # Searches run debounced on the database pool; results come back here
+        self.search_controller = SearchController(self._search_first_batch, parent=self)
+        self.search_controller.results_ready.connect(self.on_search_results)
         self.init_ui()
-        self.load_categories_filter()
-        self.load_stock_data()
+        self.refresh_if_changed()
+        for event_type in (ProductChanged, PurchaseRecorded, SaleRecorded):
+            event_bus.subscribe(event_type, self.on_products_event)
 
     def init_ui(self):
         main_layout = QVBoxLayout(self)
@@ -48,17 +68,18 @@ class StockView(QWidget):
 
         self.category_filter_combo = QComboBox()
         self.category_filter_combo.addItem("Toutes les catégories")
-        self.category_filter_combo.currentIndexChanged.connect(self.filter_stock_data)
+        self.category_filter_combo.currentIndexChanged.connect(self.load_stock_data)
 
+        # Each entry carries the search_products() stock_level it filters on
         self.stock_level_filter_combo = QComboBox()
-        self.stock_level_filter_combo.addItem("Tous les niveaux")
+        self.stock_level_filter_combo.addItem("Tous les niveaux", None)
         self.stock_level_filter_combo.addItem(
-            f"Stock Faible (<= {LOW_STOCK_THRESHOLD})"
+            f"Stock Faible (<= {LOW_STOCK_THRESHOLD})", "low"
         )
-        self.stock_level_filter_combo.addItem("En Stock (> 0)")
-        self.stock_level_filter_combo.addItem("Hors Stock (0)")
+        self.stock_level_filter_combo.addItem("En Stock (> 0)", "in_stock")
+        self.stock_level_filter_combo.addItem("Hors Stock (0)", "out_of_stock")
         self.stock_level_filter_combo.currentIndexChanged.connect(
-            self.filter_stock_data
+            self.load_stock_data
         )
 
         filter_layout.addWidget(QLabel("Rechercher:"))
@@ -70,11 +91,9 @@ class StockView(QWidget):
 
         main_layout.addLayout(filter_layout)
 
-        self.stock_table = QTableWidget()
-        self.stock_table.setColumnCount(4)
-        self.stock_table.setHorizontalHeaderLabels(
-            ["ID Produit", "Nom", "Catégorie", "Quantité en Stock"]
-        )
+        # Rows are fetched by the model in batches as the table scrolls
+        self.stock_table = QTableView()
+        self.stock_table.setModel(self.stock_model)
         self.stock_table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
         self.stock_table.setSelectionMode(QAbstractItemView.SelectionMode.NoSelection)
         self.stock_table.verticalHeader().setVisible(False)
@@ -91,7 +110,7 @@ class StockView(QWidget):
         main_layout.addWidget(self.stock_table)
 
         refresh_button = QPushButton("Rafraîchir")
-        refresh_button.clicked.connect(self.load_stock_data)
+        refresh_button.clicked.connect(self.reload_stock_data)
         button_layout = QHBoxLayout()
         button_layout.addStretch()
         button_layout.addWidget(refresh_button)
@@ -99,90 +118,125 @@ class StockView(QWidget):
 
         self.setLayout(main_layout)
 
+    def refresh_if_changed(self):
+        """Reloads categories and stock data only if Products changed."""
+        if self.change_tracker.has_changed():
+            self.search_controller.clear_cache()
+            self.load_categories_filter()
+            self.load_stock_data()
+
     def load_categories_filter(self):
-        """Loads categories into the filter combobox."""
+        """Loads categories into the filter combobox.
+
+        Read on the database pool from the shared catalogue, which is
+        reloaded there only if Products changed without an event.
+        """
+        self.loader.load(
+            "categories",
+            product_catalogue.current_categories,
+            self._show_categories,
+            self._on_categories_error,
+        )
 
+    def _show_categories(self, categories):
         current_category = self.category_filter_combo.currentText()
         self.category_filter_combo.blockSignals(True)
         self.category_filter_combo.clear()
         self.category_filter_combo.addItem("Toutes les catégories")
         try:
-            categories = get_all_categories()
             self.category_filter_combo.addItems(categories)
             index = self.category_filter_combo.findText(current_category)
             if index != -1:
                 self.category_filter_combo.setCurrentIndex(index)
-        except Exception as e:
-            QMessageBox.warning(
-                self, "Erreur Catégories", f"Impossible de charger les catégories: {e}"
-            )
         finally:
             self.category_filter_combo.blockSignals(False)
 
-    def load_stock_data(self):
-        """Loads and displays stock data based on current filters."""
+    def _on_categories_error(self, e):
+        QMessageBox.warning(
+            self, "Erreur Catégories", f"Impossible de charger les catégories: {e}"
+        )
+
+    def _current_search_key(self):
         search_query = self.search_input.text().strip()
         category = self.category_filter_combo.currentText()
         if category == "Toutes les catégories":
             category = None
+        return (search_query, category, self.stock_level_filter_combo.currentData())
+
+    def _search_first_batch(self, search_query, category, stock_level):
+        """Runs on the database thread pool: first batch of the table.
+
+        Search, category and stock level are all applied in SQL.
+        """
+        return search_products(
+            search_query,
+            category,
+            limit=self.stock_model.batch_size,
+            stock_level=stock_level,
+            low_stock_threshold=LOW_STOCK_THRESHOLD,
+        )
 
-        stock_level_filter = self.stock_level_filter_combo.currentText()
+    def load_stock_data(self):
+        """Loads stock data right away with the current filters."""
+        self.search_controller.request(self._current_search_key(), immediate=True)
 
-        self.stock_table.setRowCount(0)
-        try:
-            products = search_products(search_query, category)
-            filtered_products = []
-
-            if stock_level_filter == f"Stock Faible (<= {LOW_STOCK_THRESHOLD})":
-                filtered_products = [
-                    p for p in products if p["quantity_in_stock"] <= LOW_STOCK_THRESHOLD
-                ]
-            elif stock_level_filter == "En Stock (> 0)":
-                filtered_products = [p for p in products if p["quantity_in_stock"] > 0]
-            elif stock_level_filter == "Hors Stock (0)":
-                filtered_products = [p for p in products if p["quantity_in_stock"] == 0]
-            else:
-                filtered_products = products
-
-            if filtered_products:
-                self.stock_table.setRowCount(len(filtered_products))
-                for row_idx, product in enumerate(filtered_products):
-                    stock_qty = product["quantity_in_stock"]
-                    item_id = QTableWidgetItem(str(product["id"]))
-                    item_name = QTableWidgetItem(product["name"])
-                    item_category = QTableWidgetItem(product["category"] or "")
-                    item_stock = QTableWidgetItem(str(stock_qty))
-                    item_stock.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
-
-                    # Set background colors based on stock level
-                    if stock_qty <= LOW_STOCK_THRESHOLD:
-                        if stock_qty == 0:
-                            color = QColor("#ff9999")  # Light red for out of stock
-                        else:
-                            color = QColor("#ffcc99")  # Light orange for low stock
-                    else:
-                        color = QColor("#ffffff")  # White for normal stock
-
-                    # Set text colors for better visibility
-                    text_color = QColor("#000000")  # Black text
-                    
-                    for item in [item_id, item_name, item_category, item_stock]:
-                        item.setBackground(color)
-                        item.setForeground(text_color)
-
-                    self.stock_table.setItem(row_idx, 0, item_id)
-                    self.stock_table.setItem(row_idx, 1, item_name)
-                    self.stock_table.setItem(row_idx, 2, item_category)
-                    self.stock_table.setItem(row_idx, 3, item_stock)
+    def reload_stock_data(self):
+        """Refresh button: bypasses the cached search results."""
+        self.search_controller.clear_cache()
+        self.load_stock_data()
 
+    def on_search_results(self, key, rows):
+        """Shows the first batch of a search; further rows are fetched on scroll."""
+        search_query, category, stock_level = key
+        try:
+            self.stock_model.reset(
+                partial(
+                    search_products,
+                    search_query,
+                    category,
+                    stock_level=stock_level,
+                    low_stock_threshold=LOW_STOCK_THRESHOLD,
+                ),
+                first_rows=rows,
+            )
         except Exception as e:
             QMessageBox.critical(
                 self, "Erreur Stock", f"Impossible de charger les données de stock: {e}"
             )
 
+    def _matches_stock_level(self, stock_qty):
+        """Tells whether a stock quantity passes the current stock-level filter."""
+        stock_level = self.stock_level_filter_combo.currentData()
+        if stock_level == "low":
+            return stock_qty <= LOW_STOCK_THRESHOLD
+        if stock_level == "in_stock":
+            return stock_qty > 0
+        if stock_level == "out_of_stock":
+            return stock_qty == 0
+        return True
+
+    def on_products_event(self, event):
+        """Updates the affected rows in place; a hidden view reloads when shown."""
+        if not self.isVisible():
+            return
+        if isinstance(event, ProductChanged):
+            self.refresh_if_changed()
+            return
+        products = product_catalogue.get_many(product_ids_of(event))
+        # Only the rows already fetched by the model are refreshed.
+        not_loaded = set(self.stock_model.update_rows(products))
+        if self.stock_level_filter_combo.currentData() is None:
+            return
+        for product in products:
+            in_filter = self._matches_stock_level(product["quantity_in_stock"])
+            if in_filter == (product["id"] in not_loaded):
+                # The product may enter or leave the filtered list.
+                self.refresh_if_changed()
+                return
+
     def filter_stock_data(self):
-        """Triggered when search or filter controls change."""
-        self.load_stock_data()
+        """Triggered when the search text changes: searches once typing pauses."""
+        self.search_controller.request(self._current_search_key())
 
 
 if __name__ == "__main__":
@@ -0,0 +1,245 @@
+from functools import partial
+
+from PyQt6.QtCore import QAbstractTableModel, QModelIndex, Qt
+from PyQt6.QtGui import QColor
+
+from views.async_loader import AsyncLoader
+
+
+class LazyQueryTableModel(QAbstractTableModel):
+    """Read-only table model that fetches its rows from the database in batches.
+
+    `fetch_batch(limit, offset, after)` is a database function such as
+    search_products() with its filters bound; `after` is the (name_key, id)
+    of the last row fetched, for keyset paging. Rows are kept as plain
+    tuples and are only fetched as the view scrolls (canFetchMore/fetchMore),
+    so a refresh reads a single batch whatever the size of the table.
+    Further batches are read on the database thread pool and appended when
+    they arrive. Subclasses define COLUMNS as (header, index in the row
+    tuple) pairs and format cells in display_value().
+    """
+
+    COLUMNS = ()
+    ID_FIELD = 0
+    NAME_KEY_FIELD = -1  # The search functions return name_key last
+
+    def __init__(self, fetch_batch=None, batch_size=200, parent=None):
+        super().__init__(parent)
+        self.fetch_batch = fetch_batch
+        self.batch_size = batch_size
+        self.loader = AsyncLoader(self)
+        self._rows = []
+        self._row_by_id = {}
+        self._after = None
+        self._exhausted = True
+
+    def reset(self, fetch_batch=None, first_rows=None):
+        """Drops the loaded rows and reads the first batch (optionally of a new query).
+
+        `first_rows` is the first batch when it was already fetched, e.g. by
+        a background search; the database is then not queried here.
+        """
+        if fetch_batch is not None:
+            self.fetch_batch = fetch_batch
+        self.loader.cancel()  # A batch of the previous query must not be appended
+        self.beginResetModel()
+        self._rows = []
+        self._row_by_id = {}
+        self._after = None
+        self._exhausted = self.fetch_batch is None
+        self.endResetModel()
+        if first_rows is None:
+            self.fetchMore(QModelIndex())
+        else:
+            self._append_rows(first_rows)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.COLUMNS)
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self._exhausted and not self.loader.is_loading()
+
+    def fetchMore(self, parent=QModelIndex()):
+        if not self.canFetchMore(parent):
+            return
+        self.loader.load(
+            "batch",
+            partial(
+                self.fetch_batch,
+                limit=self.batch_size,
+                offset=len(self._rows),
+                after=self._after,
+            ),
+            self._append_rows,
+        )
+
+    def _append_rows(self, rows):
+        self._exhausted = self._exhausted or len(rows) < self.batch_size
+        if not rows:
+            return
+        # Kept apart from the rows, which update_rows() may replace.
+        self._after = (rows[-1][self.NAME_KEY_FIELD], rows[-1][self.ID_FIELD])
+        first = len(self._rows)
+        self.beginInsertRows(QModelIndex(), first, first + len(rows) - 1)
+        for row_idx, row in enumerate(rows, first):
+            row = tuple(row)
+            self._rows.append(row)
+            self._row_by_id[row[self.ID_FIELD]] = row_idx
+        self.endInsertRows()
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if (
+            role == Qt.ItemDataRole.DisplayRole
+            and orientation == Qt.Orientation.Horizontal
+        ):
+            return self.COLUMNS[section][0]
+        return None
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        row = self._rows[index.row()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            return self.display_value(row, self.COLUMNS[index.column()][1])
+        if role == Qt.ItemDataRole.BackgroundRole:
+            return self.background(row)
+        if role == Qt.ItemDataRole.ForegroundRole:
+            return self.foreground(row)
+        if role == Qt.ItemDataRole.TextAlignmentRole:
+            return self.alignment(self.COLUMNS[index.column()][1])
+        return None
+
+    def display_value(self, row, field):
+        value = row[field]
+        return "" if value is None else str(value)
+
+    def background(self, row):
+        return None
+
+    def foreground(self, row):
+        return None
+
+    def alignment(self, field):
+        return None
+
+    def row_at(self, row_idx):
+        """Returns the stored tuple of a row, or None if it is not loaded."""
+        if 0 <= row_idx < len(self._rows):
+            return self._rows[row_idx]
+        return None
+
+    def row_of(self, row_id):
+        """Returns the index of the loaded row with this id, or None."""
+        return self._row_by_id.get(row_id)
+
+    def update_rows(self, rows):
+        """Replaces the loaded rows with the same ids; returns the ids not loaded."""
+        missing = []
+        for row in rows:
+            row = tuple(row)
+            row_idx = self._row_by_id.get(row[self.ID_FIELD])
+            if row_idx is None:
+                missing.append(row[self.ID_FIELD])
+                continue
+            self._rows[row_idx] = row
+            self.dataChanged.emit(
+                self.index(row_idx, 0), self.index(row_idx, len(self.COLUMNS) - 1)
+            )
+        return missing
+
+
+class ProductTableModel(LazyQueryTableModel):
+    """Products as returned by search_products(), coloured by stock level."""
+
+    # Fields of the search_products() row tuples
+    (
+        ID,
+        NAME,
+        DESCRIPTION,
+        CATEGORY,
+        PURCHASE_PRICE,
+        SELLING_PRICE,
+        STOCK,
+    ) = range(7)
+
+    COLUMNS = (
+        ("ID", ID),
+        ("Nom", NAME),
+        ("Catégorie", CATEGORY),
+        ("Description", DESCRIPTION),
+        ("Prix Achat", PURCHASE_PRICE),
+        ("Prix Vente", SELLING_PRICE),
+        ("Stock", STOCK),
+    )
+
+    OUT_OF_STOCK_COLOR = QColor(Qt.GlobalColor.red)
+    LOW_STOCK_COLOR = QColor(Qt.GlobalColor.yellow)
+    NORMAL_STOCK_COLOR = QColor(Qt.GlobalColor.white)
+
+    def display_value(self, row, field):
+        if field in (self.PURCHASE_PRICE, self.SELLING_PRICE):
+            return f"{row[field]:.2f} DA"
+        return super().display_value(row, field)
+
+    def background(self, row):
+        # Coloration des lignes selon le stock
+        if row[self.STOCK] == 0:
+            return self.OUT_OF_STOCK_COLOR
+        if row[self.STOCK] <= 5:
+            return self.LOW_STOCK_COLOR
+        return self.NORMAL_STOCK_COLOR
+
+
+class StockTableModel(LazyQueryTableModel):
+    """Stock levels of the products returned by search_products()."""
+
+    ID, NAME, CATEGORY, STOCK = 0, 1, 3, 6  # Fields of the search_products() rows
+
+    COLUMNS = (
+        ("ID Produit", ID),
+        ("Nom", NAME),
+        ("Catégorie", CATEGORY),
+        ("Quantité en Stock", STOCK),
+    )
+
+    OUT_OF_STOCK_COLOR = QColor("#ff9999")  # Light red for out of stock
+    LOW_STOCK_COLOR = QColor("#ffcc99")  # Light orange for low stock
+    NORMAL_STOCK_COLOR = QColor("#ffffff")  # White for normal stock
+    TEXT_COLOR = QColor("#000000")  # Black text for better visibility
+
+    def __init__(self, low_stock_threshold=5, parent=None):
+        super().__init__(parent=parent)
+        self.low_stock_threshold = low_stock_threshold
+
+    def background(self, row):
+        stock_qty = row[self.STOCK]
+        if stock_qty == 0:
+            return self.OUT_OF_STOCK_COLOR
+        if stock_qty <= self.low_stock_threshold:
+            return self.LOW_STOCK_COLOR
+        return self.NORMAL_STOCK_COLOR
+
+    def foreground(self, row):
+        return self.TEXT_COLOR
+
+    def alignment(self, field):
+        if field == self.STOCK:
+            return Qt.AlignmentFlag.AlignCenter
+        return None
+
+
+class CustomerTableModel(LazyQueryTableModel):
+    """Customers as returned by search_customers()."""
+
+    ID, NAME, ADDRESS, PHONE, EMAIL = range(5)  # Fields of the search_customers() rows
+
+    COLUMNS = (
+        ("ID", ID),
+        ("Nom", NAME),
+        ("Adresse", ADDRESS),
+        ("Téléphone", PHONE),
+        ("Email", EMAIL),
+    )
@@ -0,0 +1,35 @@
+import os
+import sys
+
+import pytest
+
+# The application imports its modules from the sidou directory.
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "sidou"))
+
+from database import database as db  # noqa: E402
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch, capsys):
+    """A freshly migrated database file, used by every connection of the test."""
+    monkeypatch.setattr(db, "DATABASE_PATH", str(tmp_path / "test.db"))
+    db.close_all_connections()
+    db.initialize_database()
+    capsys.readouterr()  # Drop the migration messages
+    yield db
+    db.close_all_connections()
+
+
+def query_plans(conn, call):
+    """Runs `call()` and returns {sql: EXPLAIN QUERY PLAN details} for its SELECTs."""
+    statements = []
+    conn.set_trace_callback(statements.append)
+    try:
+        call()
+    finally:
+        conn.set_trace_callback(None)
+    return {
+        sql: [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql)]
+        for sql in statements
+        if sql.lstrip().upper().startswith("SELECT")
+    }
@@ -0,0 +1,96 @@
+"""Set-based bulk writes must leave the same stock as the per-row triggers."""
+
+import sqlite3
+
+import pytest
+
+from database import database as db
+
+PRODUCTS = [("Thé", 10), ("Café", 3), ("Sucre", 0)]
+
+
+def _stock(database):
+    with database.managed_connection() as conn:
+        return {
+            row["name"]: row["quantity_in_stock"]
+            for row in conn.execute("SELECT name, quantity_in_stock FROM Products")
+        }
+
+
+def _switch_database(monkeypatch, path):
+    monkeypatch.setattr(db, "DATABASE_PATH", str(path))
+    db.close_all_connections()
+    db.initialize_database()
+
+
+def _run_workload(database, set_based_stock):
+    ids = [database.add_product(name, initial_stock=stock) for name, stock in PRODUCTS]
+    tea, coffee, sugar = ids
+
+    def item(product_id, quantity):
+        return {"product_id": product_id, "quantity": quantity, "price_at_sale": 1.0}
+
+    purchases = [
+        {"product_id": sugar, "quantity": 4, "cost_per_unit": 0.5},
+        {"product_id": -1, "quantity": 1, "cost_per_unit": 0.5},  # Unknown product
+        {"product_id": coffee, "quantity": 2, "cost_per_unit": 2.0},
+    ]
+    sales = [
+        {"items": [item(tea, 4), item(coffee, 2)]},
+        {"items": [item(coffee, 4)]},  # Only 3 left: rejected
+        {"items": [item(sugar, 3), item(tea, 1)]},
+        {"items": []},  # No items: rejected
+        {"items": [item(tea, 2), item(tea, 3)]},
+        {"items": [item(sugar, 2)]},  # Only 1 left: rejected
+    ]
+    _, purchase_failures = database.add_purchases_bulk(
+        purchases, chunk_size=2, set_based_stock=set_based_stock
+    )
+    sale_ids, sale_failures = database.add_sales_bulk(
+        sales, chunk_size=4, set_based_stock=set_based_stock
+    )
+    return {
+        "stock": _stock(database),
+        "purchase_failures": [position for position, _error in purchase_failures],
+        "sales_recorded": [sale_id is not None for sale_id in sale_ids],
+        "sale_failures": [position for position, _error in sale_failures],
+    }
+
+
+def test_set_based_stock_matches_triggers(database, tmp_path, monkeypatch):
+    with_triggers = _run_workload(database, set_based_stock=False)
+    _switch_database(monkeypatch, tmp_path / "set_based.db")
+    set_based = _run_workload(db, set_based_stock=True)
+
+    assert set_based == with_triggers
+    assert with_triggers["stock"] == {"Thé": 0, "Café": 3, "Sucre": 1}
+    assert with_triggers["sale_failures"] == [1, 3, 5]
+
+
+def test_suspension_is_cleared_before_commit(database):
+    product_id = database.add_product("Thé", initial_stock=1)
+    database.add_purchases_bulk(
+        [{"product_id": product_id, "quantity": 2, "cost_per_unit": 1.0}],
+        set_based_stock=True,
+    )
+    with database.managed_connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM StockTriggerSuspension").fetchone()[0] == 0
+
+    # The triggers work for a connection without the application's functions.
+    conn = sqlite3.connect(database.DATABASE_PATH)
+    try:
+        with conn:
+            conn.execute(
+                """INSERT INTO Purchases (product_id, quantity, purchase_date, cost_per_unit)
+                   VALUES (?, 5, '2026-01-01', 1.0)""",
+                (product_id,),
+            )
+    finally:
+        conn.close()
+    assert _stock(database) == {"Thé": 8}
+
+
+def test_suspension_requires_a_transaction(database):
+    with pytest.raises(ValueError):
+        with database._stock_triggers_suspended(database.get_thread_connection()):
+            pass
@@ -0,0 +1,75 @@
+"""CSV import: barcodes, rows with too many fields, customers without contact."""
+
+import csv
+
+from database.csv_import import import_csv
+
+
+def _write(path, text):
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+def test_barcodes_in_a_semicolon_file(database, tmp_path):
+    path = _write(
+        tmp_path / "products.csv",
+        "name;purchase_price;selling_price;barcodes\n"
+        "Thé;1,5;2;111,222\n"
+        "Café;1,5;2;333|444\n",
+    )
+    result = import_csv("products", path)
+
+    assert result == {"read": 2, "imported": 2, "rejected": 0}
+    tea = database.find_product_by_barcode("222")
+    assert tea["name"] == "Thé"
+    assert database.get_product_barcodes(tea["id"]) == ["111", "222"]
+    coffee = database.find_product_by_barcode("444")
+    assert database.get_product_barcodes(coffee["id"]) == ["333", "444"]
+
+
+def test_rows_with_extra_fields_are_rejected_whole(database, tmp_path):
+    path = _write(
+        tmp_path / "products.csv",
+        "name;purchase_price;selling_price;barcodes\n"
+        "Thé;1,5;2;111\n"
+        "Café;1,5;2;111;222\n",
+    )
+    rejects = str(tmp_path / "rejects.csv")
+    result = import_csv("products", path, rejects)
+
+    assert result == {"read": 2, "imported": 1, "rejected": 1}
+    assert database.find_product_by_barcode("111")["name"] == "Thé"
+    with open(rejects, encoding="utf-8", newline="") as f:
+        header, row = list(csv.reader(f))
+    assert header == ["line", "error", "name", "purchase_price", "selling_price", "barcodes"]
+    assert row[0] == "3"
+    assert row[2:] == ["Café", "1,5", "2", "111", "222"]
+
+
+def test_customers_without_phone_or_email_match_on_name(database, tmp_path):
+    path = _write(
+        tmp_path / "customers.csv",
+        "name,address\n"
+        "Amélie Durand,1 rue Haute\n",
+    )
+    import_csv("customers", path)
+    _write(
+        tmp_path / "customers.csv",
+        "name,address\n"
+        "amelie  durand,2 rue Basse\n",
+    )
+    import_csv("customers", path)
+
+    customers = database.get_all_customers()
+    assert [(c["name"], c["address"]) for c in customers] == [("amelie  durand", "2 rue Basse")]
+
+
+def test_customers_without_contact_and_ambiguous_name_are_rejected(database, tmp_path):
+    database.add_customer("Amélie Durand", phone="0600000001")
+    database.add_customer("Amélie Durand", phone="0600000002")
+    path = _write(tmp_path / "customers.csv", "name\nAmélie Durand\n")
+
+    result = import_csv("customers", path)
+
+    assert result == {"read": 1, "imported": 0, "rejected": 1}
+    assert len(database.get_all_customers()) == 2
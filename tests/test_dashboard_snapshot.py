@@ -0,0 +1,30 @@
+"""The dashboard snapshot fails as a whole instead of showing partial data."""
+
+import sqlite3
+
+import pytest
+
+
+def _deny_table(table):
+    def authorizer(action, arg1, arg2, db_name, trigger):
+        if action == sqlite3.SQLITE_READ and arg1 == table:
+            return sqlite3.SQLITE_DENY
+        return sqlite3.SQLITE_OK
+
+    return authorizer
+
+
+def test_snapshot_raises_when_a_chart_query_fails(database):
+    conn = database.get_thread_connection()
+    conn.set_authorizer(_deny_table("ProductSalesTotals"))
+    try:
+        with pytest.raises(sqlite3.Error):
+            database.get_dashboard_snapshot()
+        # The public helper keeps reporting the error as an empty list.
+        assert database.get_top_selling_products() == []
+    finally:
+        conn.set_authorizer(None)
+
+    snapshot = database.get_dashboard_snapshot()
+    assert snapshot["top_products"] == []
+    assert snapshot["total_products"] == 0
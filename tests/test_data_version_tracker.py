@@ -0,0 +1,79 @@
+"""DataVersionTracker must see every outside write, whichever thread polls it."""
+
+import sqlite3
+import threading
+
+from catalogue import ProductCatalogue
+
+
+def _in_thread(call):
+    result = []
+    thread = threading.Thread(target=lambda: result.append(call()))
+    thread.start()
+    thread.join()
+    return result[0]
+
+
+def _external_insert(database, name):
+    """Adds a product from a connection the application does not know about."""
+    conn = sqlite3.connect(database.DATABASE_PATH)
+    try:
+        with conn:
+            conn.execute(
+                "INSERT INTO Products (name, purchase_price, selling_price) VALUES (?, 0, 0)",
+                (name,),
+            )
+    finally:
+        conn.close()
+
+
+def test_tracker_shared_across_threads_sees_external_writes(database):
+    tracker = database.DataVersionTracker("Products")
+    assert tracker.has_changed()
+    assert not tracker.has_changed()
+
+    _external_insert(database, "Thé")
+    assert _in_thread(tracker.has_changed)
+
+    _external_insert(database, "Café")
+    assert tracker.has_changed()
+    assert not tracker.has_changed()
+    assert not _in_thread(tracker.has_changed)
+
+
+def test_refresh_rows_does_not_hide_concurrent_external_write(database):
+    database.add_product("Thé")
+    catalogue = ProductCatalogue()
+    catalogue.reload()
+    assert not catalogue._tracker.has_changed()
+
+    _external_insert(database, "Café")
+    product_id = database.add_product("Sucre")
+    catalogue.refresh_rows([product_id])
+
+    assert catalogue.get(product_id)["name"] == "Sucre"
+    assert catalogue._tracker.has_changed()
+    catalogue.reload()
+    assert catalogue.get_by_name("Café") is not None
+
+
+def test_refresh_rows_absorbs_the_write_it_applies(database):
+    catalogue = ProductCatalogue()
+    catalogue.reload()
+
+    product_id = database.add_product("Sucre")
+    catalogue.refresh_rows([product_id])
+
+    assert catalogue.get(product_id)["name"] == "Sucre"
+    assert not catalogue._tracker.has_changed()
+
+
+def test_lookups_before_the_first_load_read_single_rows(database):
+    product_id = database.add_product("Thé", category="Boissons")
+    catalogue = ProductCatalogue()
+
+    assert catalogue.get(product_id)["name"] == "Thé"
+    assert [p["id"] for p in catalogue.get_many([product_id, -1])] == [product_id]
+    assert catalogue.get_by_name("Thé")["id"] == product_id
+    assert catalogue.categories() == ["Boissons"]
+    assert catalogue._by_id is None
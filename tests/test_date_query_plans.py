@@ -0,0 +1,57 @@
+"""Date-range queries must range-scan an index, never scan a whole table."""
+
+import datetime
+
+from conftest import query_plans
+
+
+def _details(plans):
+    return [detail for details in plans.values() for detail in details]
+
+
+def test_sales_page_date_range_uses_date_index(database):
+    plans = query_plans(
+        database.get_thread_connection(),
+        lambda: database.get_sales_page(start_date="2026-01-01", end_date="2026-02-01"),
+    )
+    details = _details(plans)
+    assert any("USING INDEX idx_sales_date_id (sale_date>? AND sale_date<?)" in d for d in details)
+    assert not any(d.startswith("SCAN s") or "TEMP B-TREE" in d for d in details)
+
+
+def test_purchase_page_date_range_uses_date_index(database):
+    plans = query_plans(
+        database.get_thread_connection(),
+        lambda: database.get_purchase_page(start_date="2026-01-01", end_date="2026-02-01"),
+    )
+    details = _details(plans)
+    assert any(
+        "USING INDEX idx_purchases_date_id (purchase_date>? AND purchase_date<?)" in d
+        for d in details
+    )
+    assert not any(d.startswith("SCAN p ") or "TEMP B-TREE" in d for d in details)
+
+
+def test_sales_by_customer_uses_customer_date_index(database):
+    plans = query_plans(
+        database.get_thread_connection(), lambda: database.get_sales_by_customer(1)
+    )
+    details = _details(plans)
+    assert any("USING INDEX idx_sales_customer_date (customer_id=?)" in d for d in details)
+    assert not any("TEMP B-TREE" in d for d in details)
+
+
+def test_monthly_trend_and_month_total_search_daily_rollup(database):
+    month_start, month_end = database.month_date_range(datetime.date(2026, 12, 15))
+    assert (month_start, month_end) == ("2026-12-01", "2027-01-01")
+
+    conn = database.get_thread_connection()
+    for call in (
+        lambda: database.get_monthly_sales_trend(12),
+        lambda: database.get_sales_total_between(month_start, month_end),
+        lambda: database.get_dashboard_snapshot(),
+    ):
+        details = _details(query_plans(conn, call))
+        assert any(d.startswith("SEARCH SalesDaily") for d in details)
+        assert not any(d.startswith("SCAN SalesDaily") for d in details)
+        assert not any(d.startswith("SCAN Sales") for d in details)
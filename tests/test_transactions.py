@@ -0,0 +1,31 @@
+"""transaction() must surface the original error when SQLite already rolled back."""
+
+import sqlite3
+
+import pytest
+
+
+@pytest.mark.parametrize("nested", [False, True])
+def test_interrupted_write_keeps_its_error(database, nested):
+    database.add_product("Thé")
+    conn = database.get_thread_connection()
+
+    def interrupted_update():
+        # An interrupted write inside an explicit transaction makes SQLite
+        # roll the whole transaction back on its own.
+        conn.set_progress_handler(lambda: 1, 1)
+        try:
+            conn.execute("UPDATE Products SET description = 'x'")
+        finally:
+            conn.set_progress_handler(None, 0)
+
+    with pytest.raises(sqlite3.OperationalError, match="interrupted"):
+        with database.transaction():
+            if nested:
+                with database.transaction():
+                    interrupted_update()
+            else:
+                interrupted_update()
+
+    assert not conn.in_transaction
+    assert database.get_all_products()[0]["description"] is None